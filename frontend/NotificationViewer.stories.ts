@@ -63,7 +63,9 @@ const mockNotifications : EntriesResponse = {
 };
 
 export const NoNotification: StoryFn<typeof NotificationViewer> = () => {
-  fetchMock.restore().get('/?limit=15', {count: 0, results: []});
+  fetchMock.restore()
+      .get('/counts', {count: 0, unread_count: 0})
+      .get('/?limit=15', {count: 0, results: []});
   return {
     components: {NotificationViewer},
     template: `
@@ -79,6 +81,12 @@ export const NoNotification: StoryFn<typeof NotificationViewer> = () => {
 export const WithNotifications: StoryFn<typeof NotificationViewer> = () => {
   const notifications = structuredClone(mockNotifications);
   fetchMock.restore()
+      .get('/counts', function () {
+        return {
+          count: notifications.results.length,
+          unread_count: notifications.results.filter(n => n.state !== "READ_STATE").length,
+        };
+      })
       .get('/?limit=2', function () {
         const page = structuredClone(notifications);
         page.results = notifications.results.slice(0, 2);
@@ -92,17 +100,21 @@ export const WithNotifications: StoryFn<typeof NotificationViewer> = () => {
         return page;
       })
       .put('/mark_all_as_read', function () {
-        notifications.results.forEach(notification => {
+        const unread = notifications.results.filter(n => n.state !== 'READ_STATE');
+        unread.forEach(notification => {
           notification.state = 'READ_STATE';
           notification.read_at = Date.now().toString();
         });
-        return notifications.results;
+        return {count: unread.length, uuids: unread.map(n => n.uuid)};
       })
-      .patch('*', function (url) {
-        const notification = notifications.results.find(n => url.includes(n.uuid)) as EntryRecord;
-        notification.state = (notification.state === "READ_STATE") ? "SENT_STATE" : "READ_STATE";
-        notification.read_at = (notification.state === "READ_STATE") ? Date.now().toString() : null;
-        return notification;
+      .put('/states', function (url, options) {
+        const {uuids, state} = JSON.parse(options.body as string) as {uuids: string[], state: EntryRecord['state']};
+        const changed = notifications.results.filter(n => uuids.includes(n.uuid) && n.state !== state);
+        changed.forEach(notification => {
+          notification.state = state;
+          notification.read_at = (state === "READ_STATE") ? Date.now().toString() : null;
+        });
+        return {count: changed.length, uuids: changed.map(n => n.uuid)};
       });
 
   return {
@@ -119,9 +131,10 @@ export const WithNotifications: StoryFn<typeof NotificationViewer> = () => {
 
 export const WithErrors: StoryFn<typeof NotificationViewer> = () => {
   fetchMock.restore()
+      .get('/counts', {count: mockNotifications.count, unread_count: mockNotifications.unread_count})
       .get('/?limit=15', mockNotifications)
       .put('/mark_all_as_read', 500)
-      .patch('*', {throws: new Error('Network error')});
+      .put('/states', {throws: new Error('Network error')});
 
   return {
     components: {NotificationViewer},
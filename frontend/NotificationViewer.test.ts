@@ -28,7 +28,7 @@ import {flushPromises, mount} from '@vue/test-utils';
 import NotificationViewer from './NotificationViewer.vue';
 import fetchMock from "fetch-mock";
 import {beforeEach, describe, expect, it, vi, test} from "vitest";
-import type {EntriesResponse, EntryRecord} from "./interfaces";
+import type {CountsResponse, EntriesResponse, EntryRecord} from "./interfaces";
 
 function structuredClone<T>(obj: T): T {
   /** not available in node < 17 */
@@ -77,8 +77,13 @@ beforeEach(() => {
   window.document.cookie = 'csrftoken=1234-5678-9101-1121-3141';
 });
 
+const mockCounts: CountsResponse = {
+  count: 1,
+  unread_count: 1,
+};
+
 test('should mount and unmount', async () => {
-  fetchMock.restore().get('/?limit=15', mockSentNotifications);
+  fetchMock.restore().get('/counts', mockCounts).get('/?limit=15', mockSentNotifications);
   vi.useFakeTimers();
 
   const wrapper = mount(NotificationViewer, {props: {baseUrl: '/'}});
@@ -87,6 +92,11 @@ test('should mount and unmount', async () => {
   expect(wrapper.findAllComponents({name: 'NotificationEntry'})).toHaveLength(0);
   await flushPromises();
   expect(vi.getTimerCount()).toBe(1);
+  // The notifications are only fetched when the dropdown is opened
+  expect(fetchMock.called('/?limit=15')).toBe(false);
+  expect(wrapper.find('.bell').attributes("data-count")).toBe("1");
+  await wrapper.find('.dropdown-toggle').trigger('click');
+  await flushPromises();
   expect(wrapper.findAllComponents({name: 'NotificationEntry'})).toHaveLength(1);
   expect(wrapper.text()).toContain('notification_viewer.mark_all_as_read');
 
@@ -98,7 +108,7 @@ test('should mount and unmount', async () => {
 });
 
 test('should display an error if bd response', async () => {
-  fetchMock.restore().get('/?limit=15', 500);
+  fetchMock.restore().get('/counts', 500);
   const wrapper = mount(NotificationViewer, {props: {baseUrl: '/'}});
   await flushPromises();
   expect(wrapper.text()).toContain('notification_viewer.error');
@@ -107,16 +117,18 @@ test('should display an error if bd response', async () => {
 });
 
 test('should display an error if fetching notifications fail', async () => {
-  fetchMock.restore().get('/?limit=15', {throws: new Error('This is an error')});
+  fetchMock.restore().get('/counts', mockCounts).get('/?limit=15', {throws: new Error('This is an error')});
   const wrapper = mount(NotificationViewer, {props: {baseUrl: '/'}});
   await flushPromises();
+  await wrapper.find('.dropdown-toggle').trigger('click');
+  await flushPromises();
   expect(wrapper.text()).toContain('notification_viewer.error');
   expect(on).toHaveBeenCalled();
   expect(wrapper.findAllComponents({name: 'NotificationEntry'})).toHaveLength(0);
 });
 
 test('should stop animation when clicked', async () => {
-  fetchMock.restore().get('/?limit=15', mockSentNotifications);
+  fetchMock.restore().get('/counts', mockCounts).get('/?limit=15', mockSentNotifications);
   const wrapper = mount(NotificationViewer, {props: {baseUrl: '/'}});
   await flushPromises();
   const bell = wrapper.find('.bell');
@@ -128,11 +140,123 @@ test('should stop animation when clicked', async () => {
 });
 
 
+test('should keep the counts if they have not changed', async () => {
+  fetchMock.restore().get('/counts', {body: mockCounts, headers: {ETag: '"v1"'}});
+  vi.useFakeTimers();
+  const wrapper = mount(NotificationViewer, {props: {baseUrl: '/'}});
+  await flushPromises();
+  expect(wrapper.find('.bell').attributes("data-count")).toBe("1");
+
+  fetchMock.restore().get('/counts', 304);
+  vi.advanceTimersToNextTimer();
+  await flushPromises();
+  expect(fetchMock.lastOptions()?.headers).toMatchObject({'If-None-Match': '"v1"'});
+  expect(wrapper.find('.bell').attributes("data-count")).toBe("1");
+  expect(wrapper.text()).not.toContain('notification_viewer.error');
+  // Polling goes on
+  expect(vi.getTimerCount()).toBe(1);
+  wrapper.unmount();
+  vi.useRealTimers();
+});
+
+test('should keep the notifications if they have not changed', async () => {
+  fetchMock.restore()
+      .get('/counts', mockCounts)
+      .get('/?limit=15', {body: mockSentNotifications, headers: {ETag: '"v1"'}});
+  const wrapper = mount(NotificationViewer, {props: {baseUrl: '/'}});
+  await flushPromises();
+  await wrapper.find('.dropdown-toggle').trigger('click');
+  await flushPromises();
+  expect(wrapper.findAllComponents({name: 'NotificationEntry'})).toHaveLength(1);
+
+  fetchMock.restore().get('/?limit=15', 304);
+  await wrapper.find('.dropdown-toggle').trigger('click');
+  await flushPromises();
+  expect(fetchMock.lastOptions()?.headers).toMatchObject({'If-None-Match': '"v1"'});
+  expect(wrapper.findAllComponents({name: 'NotificationEntry'})).toHaveLength(1);
+  expect(wrapper.text()).not.toContain('notification_viewer.error');
+});
+
+class FakeEventSource extends EventTarget {
+  static CLOSED = 2;
+  static instances: FakeEventSource[] = [];
+  readyState = 1;
+  onerror: (() => void) | null = null;
+  close = vi.fn(() => this.readyState = FakeEventSource.CLOSED);
+
+  constructor(public url: string) {
+    super();
+    FakeEventSource.instances.push(this);
+  }
+
+  push(type: string, data: object) {
+    this.dispatchEvent(new MessageEvent(type, {data: JSON.stringify(data)}));
+  }
+}
+
+describe('notification stream', () => {
+  beforeEach(() => {
+    FakeEventSource.instances = [];
+    vi.stubGlobal('EventSource', FakeEventSource);
+  });
+
+  it('should receive the counts and the notifications from the stream', async () => {
+    fetchMock.restore().get('/?limit=15', mockSentNotifications);
+    const wrapper = mount(NotificationViewer, {props: {baseUrl: '/', streamUrl: '/stream'}});
+    await flushPromises();
+    expect(FakeEventSource.instances[0].url).toBe('/stream');
+    expect(fetchMock.called('/counts')).toBe(false);
+
+    FakeEventSource.instances[0].push('counts', {count: 2, unread_count: 2});
+    await flushPromises();
+    expect(wrapper.find('.bell').attributes("data-count")).toBe("2");
+    expect(wrapper.find('.bell').classes()).toContain('notify');
+
+    await wrapper.find('.dropdown-toggle').trigger('click');
+    await flushPromises();
+    FakeEventSource.instances[0].push('notification', {...mockSentNotifications.results[0], uuid: 'new-uuid'});
+    await flushPromises();
+    expect(wrapper.findAllComponents({name: 'NotificationEntry'})).toHaveLength(2);
+
+    wrapper.unmount();
+    expect(FakeEventSource.instances[0].close).toHaveBeenCalled();
+  });
+
+  it('should poll the counts if the stream is closed', async () => {
+    fetchMock.restore().get('/counts', mockCounts);
+    vi.useFakeTimers();
+    const wrapper = mount(NotificationViewer, {props: {baseUrl: '/', streamUrl: '/stream'}});
+    const eventSource = FakeEventSource.instances[0];
+    eventSource.readyState = FakeEventSource.CLOSED;
+    eventSource.onerror?.();
+    await flushPromises();
+    expect(wrapper.find('.bell').attributes("data-count")).toBe("1");
+    expect(vi.getTimerCount()).toBe(1);
+    wrapper.unmount();
+    vi.useRealTimers();
+  });
+});
+
+// Wait for the grouped state changes to be sent
+async function flushStates(delay = 0) {
+  await new Promise(resolve => setTimeout(resolve, delay));
+  await flushPromises();
+}
+
 describe('interactions with api', () => {
   beforeEach(() => {
     const notifications = structuredClone(mockSentNotifications);
-    notifications.results = [...notifications.results, ...notifications.results, ...notifications.results];
+    notifications.results = [0, 1, 2].map(index => ({
+      ...structuredClone(mockSentNotifications.results[0]),
+      uuid: `uuid-${index}`,
+    }));
     fetchMock.restore()
+        .get('/counts', function () {
+          return {
+            count: notifications.results.length,
+            unread_count: notifications.results.filter(n => n.state !== "READ_STATE").length,
+          };
+        })
         .get('/?limit=2', function () {
           const page = structuredClone(notifications);
           page.next = "/?limit=4";
@@ -147,45 +271,75 @@ describe('interactions with api', () => {
           return page;
         })
         .put('/mark_all_as_read', function () {
-          notifications.results.forEach(notification => {
+          const unread = notifications.results.filter(n => n.state !== 'READ_STATE');
+          unread.forEach(notification => {
             notification.state = 'READ_STATE';
             notification.read_at = Date.now().toString();
           });
-          return notifications.results;
+          return {count: unread.length, uuids: unread.map(n => n.uuid)};
         })
-        .patch('*', function (url) {
-          const notification = notifications.results.find(n => url.includes(n.uuid)) as EntryRecord;
-          notification.state = (notification.state === "READ_STATE") ? "SENT_STATE" : "READ_STATE";
-          notification.read_at = (notification.state === "READ_STATE") ? Date.now().toString() : null;
-          return notification;
-        });
+        .put('/states', function (url, options) {
+          const {uuids, state} = JSON.parse(options.body as string) as {uuids: string[], state: EntryRecord['state']};
+          const changed = notifications.results.filter(n => uuids.includes(n.uuid) && n.state !== state);
+          changed.forEach(notification => {
+            notification.state = state;
+            notification.read_at = (state === "READ_STATE") ? Date.now().toString() : null;
+          });
+          return {count: changed.length, uuids: changed.map(n => n.uuid)};
+        }, {name: 'states'});
   });
 
   it('should update the notifications array', async () => {
-    const wrapper = mount(NotificationViewer, {props: {baseUrl: '/', limit: 2}});
+    const wrapper = mount(NotificationViewer, {props: {baseUrl: '/', limit: 2, coalesceDelay: 0}});
+    await flushPromises();
+    await wrapper.find('.dropdown-toggle').trigger('click');
     await flushPromises();
     const input = wrapper.getComponent({name: 'NotificationEntry'}).get('input');
     expect(input.element.checked).toBe(true); // not read
     await input.trigger('click');
-    await flushPromises();
-    expect(wrapper.find('.bell').attributes("data-count")).toBe("0");
+    await flushStates();
+    expect(wrapper.find('.bell').attributes("data-count")).toBe("2");
     expect(wrapper.getComponent({name: 'NotificationEntry'}).get('input').element.checked).toBe(false);
 
     await input.trigger('click');
-    await flushPromises();
-    expect(wrapper.find('.bell').attributes("data-count")).toBe("1");
+    await flushStates();
+    expect(wrapper.find('.bell').attributes("data-count")).toBe("3");
     expect(wrapper.getComponent({name: 'NotificationEntry'}).get('input').element.checked).toBe(true);
+    expect(fetchMock.calls('states')).toHaveLength(2);
 
     // error
-    fetchMock.restore().patch('*', 500);
+    fetchMock.restore().put('*', 500);
     await input.trigger('click');
-    await flushPromises();
+    await flushStates();
     expect(wrapper.text()).toContain('notification_viewer.error');
   });
 
+  it('should group the state changes', async () => {
+    const wrapper = mount(NotificationViewer, {props: {baseUrl: '/', limit: 2, coalesceDelay: 50}});
+    await flushPromises();
+    await wrapper.find('.dropdown-toggle').trigger('click');
+    await flushPromises();
+    const entries = wrapper.findAllComponents({name: 'NotificationEntry'});
+    await entries[0].get('input').trigger('click');
+    await entries[1].get('input').trigger('click');
+    // Toggled back before being sent
+    await entries[1].get('input').trigger('click');
+    expect(wrapper.find('.bell').attributes("data-count")).toBe("2");
+    expect(fetchMock.calls('states')).toHaveLength(0);
+
+    await flushStates(50);
+    expect(fetchMock.calls('states')).toHaveLength(1);
+    expect(JSON.parse(fetchMock.lastOptions('states')?.body as string)).toEqual({
+      uuids: [entries[0].props('uuid')],
+      state: 'READ_STATE',
+    });
+  });
+
   it('should update the read count when mark all as read clicked', async () => {
     const wrapper = mount(NotificationViewer, {props: {baseUrl: '/', limit: 2}});
     await flushPromises();
+    await wrapper.find('.dropdown-toggle').trigger('click');
+    await flushPromises();
     expect(wrapper.find('.bell').attributes("data-count")).toBe("3");
     await wrapper.get(".dropdown-menu .btn").trigger('click');
     await flushPromises();
@@ -201,6 +355,8 @@ describe('interactions with api', () => {
   it('should load more', async () => {
     const wrapper = mount(NotificationViewer, {props: {baseUrl: '/', limit: 2}});
     await flushPromises();
+    await wrapper.find('.dropdown-toggle').trigger('click');
+    await flushPromises();
     expect(wrapper.findAllComponents({name: 'NotificationEntry'})).toHaveLength(2);
     expect(wrapper.find('.text-center .btn-link').exists()).toBe(true);
     await wrapper.find('.text-center .btn-link').trigger('click');
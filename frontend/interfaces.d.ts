@@ -40,3 +40,13 @@ export interface EntriesResponse {
   count: number;
   unread_count: number;
 }
+
+export interface CountsResponse {
+  count: number;
+  unread_count: number;
+}
+
+export interface ChangedStatesResponse {
+  count: number;
+  uuids: string[];
+}
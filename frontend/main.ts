@@ -30,9 +30,11 @@ import {i18n} from './i18n';
 
 interface Props extends Record<string, unknown> {
   baseUrl: string,
+  streamUrl?: string,
   interval?: number,
   limit?: number,
   truncateLength?: number,
+  coalesceDelay?: number,
 }
 
 document.querySelectorAll<HTMLElement>('#notification-viewer').forEach((elem) => {
@@ -46,5 +48,8 @@ document.querySelectorAll<HTMLElement>('#notification-viewer').forEach((elem) =>
   if (elem.dataset.truncateLength) {
     props.truncateLength = Number.parseInt(elem.dataset.truncateLength);
   }
+  if (elem.dataset.coalesceDelay) {
+    props.coalesceDelay = Number.parseInt(elem.dataset.coalesceDelay);
+  }
   createApp(NotificationViewer, props).use(i18n).mount(elem);
 });
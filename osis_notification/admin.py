@@ -1,4 +1,7 @@
+from django import forms
 from django.contrib import admin
+from django.utils.translation import gettext_lazy as _
+
 from osis_notification.models import Notification
 from osis_notification.models.enums import NotificationTypes, NotificationStates
 from osis_notification.contrib.handlers import EmailNotificationHandler, WebNotificationHandler
@@ -13,17 +16,46 @@ def send_pending_notification(modeladmin, request, queryset):
             EmailNotificationHandler.process(pending_notification)
 
 
+@admin.action(description='Retry selected failed notifications')
+def retry_failed_notification(modeladmin, request, queryset):
+    queryset.filter(state=NotificationStates.FAILED_STATE.name).update(
+        state=NotificationStates.PENDING_STATE.name,
+        attempts=0,
+        next_attempt_at=None,
+    )
+
+
+class NotificationAdminForm(forms.ModelForm):
+    payload = forms.CharField(label=_("Payload"), widget=forms.Textarea)
+
+    class Meta:
+        model = Notification
+        exclude = ('stored_payload',)
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        if self.instance.pk:
+            self.initial['payload'] = self.instance.payload
+
+    def save(self, commit=True):
+        self.instance.payload = self.cleaned_data['payload']
+        return super().save(commit)
+
+
 class NotificationAdmin(admin.ModelAdmin):
+    form = NotificationAdminForm
     list_display = (
         'uuid',
         'type',
         'person',
         'state',
+        'priority',
         'created_at',
     )
     list_filter = (
         'type',
         'state',
+        'priority',
     )
     search_fields = (
         'uuid',
@@ -33,7 +65,7 @@ class NotificationAdmin(admin.ModelAdmin):
     )
     raw_id_fields = ('person',)
     date_hierarchy = 'created_at'
-    actions = [send_pending_notification]
+    actions = [send_pending_notification, retry_failed_notification]
 
 
 admin.site.register(Notification, NotificationAdmin)
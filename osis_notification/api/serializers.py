@@ -1,6 +1,7 @@
 from rest_framework import serializers
 
 from osis_notification.models import WebNotification
+from osis_notification.models.enums import NotificationStates
 
 
 class WebNotificationSerializer(serializers.ModelSerializer):
@@ -18,3 +19,8 @@ class WebNotificationSerializer(serializers.ModelSerializer):
             "sent_at",
             "read_at",
         ]
+
+
+class NotificationStatesSerializer(serializers.Serializer):
+    uuids = serializers.ListField(child=serializers.UUIDField(), allow_empty=False, max_length=1000)
+    state = serializers.ChoiceField(choices=[NotificationStates.SENT_STATE.name, NotificationStates.READ_STATE.name])
@@ -0,0 +1,195 @@
+# ##############################################################################
+#
+#  OSIS stands for Open Student Information System. It's an application
+#  designed to manage the core business of higher education institutions,
+#  such as universities, faculties, institutes and professional schools.
+#  The core business involves the administration of students, teachers,
+#  courses, programs and so on.
+#
+#  Copyright (C) 2015-2026 Université catholique de Louvain (http://www.uclouvain.be)
+#
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  A copy of this license - GNU General Public License - is available
+#  at the root of the source code of this program.  If not,
+#  see http://www.gnu.org/licenses/.
+#
+# ##############################################################################
+import asyncio
+import json
+from functools import wraps
+from http.cookies import SimpleCookie
+from importlib import import_module
+from types import SimpleNamespace
+from typing import Optional
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth import get_user
+from django.db import close_old_connections
+
+from base.models.person import Person
+from osis_notification.contrib.cache import cached_counts
+from osis_notification.contrib.push import COUNTS_EVENT, NOTIFICATION_EVENT, get_broker
+
+# Django 3.2 cannot stream a response asynchronously, so the stream is served by a
+# plain ASGI application, mounted next to the Django one (see `stream_router`).
+KEEPALIVE_SECONDS = 15
+RETRY_MILLISECONDS = 5000
+
+
+def database_sync_to_async(function):
+    """Run the function in a thread, as `sync_to_async`, closing the database
+    connections that are too old or unusable before and after it, as Django does around
+    each request (the stream being served outside of them)."""
+
+    @wraps(function)
+    def wrapper(*args, **kwargs):
+        close_old_connections()
+        try:
+            return function(*args, **kwargs)
+        finally:
+            close_old_connections()
+
+    return sync_to_async(wrapper)
+
+
+def format_event(event: Optional[str], data: Optional[dict] = None) -> bytes:
+    """Format a server-sent event, or a comment without event (to keep the connection
+    alive)."""
+
+    if event is None:
+        return b": keepalive\n\n"
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n".encode()
+
+
+@database_sync_to_async
+def get_person_id(scope) -> Optional[int]:
+    """Return the id of the person authenticated by the session cookie of the request."""
+
+    cookies = SimpleCookie()
+    for name, value in scope.get("headers", []):
+        if name == b"cookie":
+            cookies.load(value.decode("latin-1"))
+    session_cookie = cookies.get(settings.SESSION_COOKIE_NAME)
+    if session_cookie is None:
+        return None
+    session = import_module(settings.SESSION_ENGINE).SessionStore(session_cookie.value)
+    user = get_user(SimpleNamespace(session=session))
+    if not user.is_authenticated:
+        return None
+    return Person.objects.filter(user=user).values_list("pk", flat=True).first()
+
+
+@database_sync_to_async
+def get_counts(person_id: int) -> dict:
+    count, unread_count, _ = cached_counts(person_id)
+    return {"count": count, "unread_count": unread_count}
+
+
+async def send_response(send, status: int, body: bytes = b""):
+    await send(
+        {
+            "type": "http.response.start",
+            "status": status,
+            "headers": [(b"content-type", b"text/plain; charset=utf-8")],
+        }
+    )
+    await send({"type": "http.response.body", "body": body})
+
+
+async def notification_stream(scope, receive, send):
+    """ASGI application streaming the new notifications and the counts of the
+    authenticated person as server-sent events, until the client disconnects.
+
+    The counts are sent on connection and after each change, the changes received
+    in the meantime being coalesced into a single "counts" event."""
+
+    broker = get_broker()
+    if broker is None:
+        await send_response(send, 404, b"Notification stream disabled")
+        return
+    person_id = await get_person_id(scope)
+    if person_id is None:
+        await send_response(send, 403, b"Authentication required")
+        return
+
+    disconnected = asyncio.Event()
+
+    async def watch_disconnect():
+        while (await receive())["type"] != "http.disconnect":
+            pass
+        disconnected.set()
+
+    watcher = asyncio.ensure_future(watch_disconnect())
+    async with broker.subscribe(person_id) as queue:
+        await send(
+            {
+                "type": "http.response.start",
+                "status": 200,
+                "headers": [
+                    (b"content-type", b"text/event-stream"),
+                    (b"cache-control", b"no-cache"),
+                    # Do not let the reverse proxies buffer the events
+                    (b"x-accel-buffering", b"no"),
+                ],
+            }
+        )
+        await send(
+            {
+                "type": "http.response.body",
+                "body": f"retry: {RETRY_MILLISECONDS}\n\n".encode()
+                + format_event(COUNTS_EVENT, await get_counts(person_id)),
+                "more_body": True,
+            }
+        )
+        try:
+            while not disconnected.is_set():
+                getter = asyncio.ensure_future(queue.get())
+                done, _ = await asyncio.wait(
+                    [getter, watcher],
+                    timeout=KEEPALIVE_SECONDS,
+                    return_when=asyncio.FIRST_COMPLETED,
+                )
+                if getter not in done:
+                    getter.cancel()
+                    if not disconnected.is_set():
+                        await send({"type": "http.response.body", "body": format_event(None), "more_body": True})
+                    continue
+
+                events = [getter.result()]
+                while not queue.empty():
+                    events.append(queue.get_nowait())
+                body = b"".join(format_event(event, data) for event, data in events if event == NOTIFICATION_EVENT)
+                body += format_event(COUNTS_EVENT, await get_counts(person_id))
+                await send({"type": "http.response.body", "body": body, "more_body": True})
+        finally:
+            watcher.cancel()
+    if not disconnected.is_set():
+        await send({"type": "http.response.body", "body": b""})
+
+
+def stream_router(django_application, path: Optional[str] = None):
+    """Return an ASGI application serving the notification stream at the given path
+    (`settings.OSIS_NOTIFICATION_STREAM_URL` by default) and forwarding the other
+    requests to the Django application, e.g. in the asgi.py of the project:
+
+        application = stream_router(get_asgi_application())
+    """
+
+    path = path or settings.OSIS_NOTIFICATION_STREAM_URL
+
+    async def application(scope, receive, send):
+        if scope["type"] == "http" and scope["path"] == path:
+            return await notification_stream(scope, receive, send)
+        return await django_application(scope, receive, send)
+
+    return application
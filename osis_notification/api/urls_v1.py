@@ -29,16 +29,20 @@ from django.urls import path
 from osis_notification.api.views import (
     MarkAllNotificationsAsReadView,
     MarkNotificationAsReadView,
+    NotificationCountsView,
+    NotificationStatesView,
     SentNotificationListView,
 )
 
 urlpatterns = [
     path("", SentNotificationListView.as_view(), name=SentNotificationListView.name),
+    path("counts", NotificationCountsView.as_view(), name=NotificationCountsView.name),
     path(
         "mark_all_as_read",
         MarkAllNotificationsAsReadView.as_view(),
         name=MarkAllNotificationsAsReadView.name,
     ),
+    path("states", NotificationStatesView.as_view(), name=NotificationStatesView.name),
     path(
         "<uuid:notification_uuid>",
         MarkNotificationAsReadView.as_view(),
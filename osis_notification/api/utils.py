@@ -60,7 +60,17 @@ def proxy_view(view_cls):
             'x-user-globalid': request.user.person.global_id,
             'authorization': f"ESB {settings.REST_FRAMEWORK_ESB_AUTHENTICATION_SECRET_KEY}",
         }
-        response = requests.request(request.method, url, params=request.GET.copy(), headers=headers)
+        if 'HTTP_IF_NONE_MATCH' in request.META:
+            headers['if-none-match'] = request.META['HTTP_IF_NONE_MATCH']
+        if request.body:
+            headers['content-type'] = request.content_type
+        response = requests.request(
+            request.method,
+            url,
+            params=request.GET.copy(),
+            headers=headers,
+            data=request.body or None,
+        )
 
         proxy_response = HttpResponse(response.content, status=response.status_code)
 
@@ -139,12 +149,14 @@ class CorsAllowOriginMixin:
     ACCESS_CONTROL_ALLOW_ORIGIN = "Access-Control-Allow-Origin"
     ACCESS_CONTROL_ALLOW_METHODS = "Access-Control-Allow-Methods"
     ACCESS_CONTROL_ALLOW_HEADERS = "Access-Control-Allow-Headers"
+    ACCESS_CONTROL_EXPOSE_HEADERS = "Access-Control-Expose-Headers"
 
     def finalize_response(self, request, response, *args, **kwargs):
         response = super().finalize_response(request, response, *args, **kwargs)
 
         response[self.ACCESS_CONTROL_ALLOW_METHODS] = "GET, POST"
-        response[self.ACCESS_CONTROL_ALLOW_HEADERS] = "Content-Type"
+        response[self.ACCESS_CONTROL_ALLOW_HEADERS] = "Content-Type, If-None-Match"
+        response[self.ACCESS_CONTROL_EXPOSE_HEADERS] = "ETag"
 
         origin = request.META.get("HTTP_ORIGIN")
         if not origin:
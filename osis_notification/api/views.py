@@ -24,55 +24,109 @@
 #
 # ##############################################################################
 
+import hashlib
+from base64 import urlsafe_b64decode, urlsafe_b64encode
 from collections import OrderedDict
 
-from django.db.models import Count, Q
+from django.db.models import Q
 from django.shortcuts import get_object_or_404
-from rest_framework import generics, views
+from django.utils.dateparse import parse_datetime
+from django.utils.http import parse_etags, quote_etag
+from django.utils.translation import gettext_lazy as _
+from rest_framework import generics, status, views
 from rest_framework.authentication import SessionAuthentication
+from rest_framework.exceptions import NotFound
 from rest_framework.pagination import LimitOffsetPagination
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
 from rest_framework.settings import api_settings
+from rest_framework.utils.urls import remove_query_param, replace_query_param
 
-from osis_notification.api.serializers import WebNotificationSerializer
+from osis_notification.api.serializers import NotificationStatesSerializer, WebNotificationSerializer
 from osis_notification.api.utils import CorsAllowOriginMixin
+from osis_notification.contrib.cache import cached, cached_counts
 from osis_notification.contrib.handlers import WebNotificationHandler
 from osis_notification.models import WebNotification
-from osis_notification.models.enums import NotificationStates
+
+
+def make_etag(*parts):
+    return quote_etag(hashlib.sha256("|".join(str(part) for part in parts).encode()).hexdigest())
 
 
 class NotificationPagination(LimitOffsetPagination):
+    """Paginate the notifications by limit and offset, or, when the `cursor` query
+    parameter is given (empty for the first page), by cursor: the next pages are
+    fetched after the last notification of the current page, by (created_at, id), so
+    that each page has the same cost and no notification is shifted by the new ones."""
+
     default_limit = 15
+    cursor_query_param = 'cursor'
 
     def paginate_queryset(self, queryset, request, view=None):
         self.limit = self.get_limit(request)
+        self.count, self.unread_count, _ = self.get_counts(request)
+        self.request = request
 
-        # Use a single queryset for both counts
-        count_queryset = (
-            WebNotification.objects.sent()
-            .filter(person_id=request.user.person.pk)
-            .values('person_id')
-            .annotate(
-                count=Count('id'),
-                unread_count=Count('id', filter=Q(state=NotificationStates.SENT_STATE.name)),
-            )
-            .order_by()
-            .values('count', 'unread_count')
-        )
-        self.unread_count = 0
-        self.count = 0
-        if count_queryset:
-            self.unread_count = count_queryset[0]['unread_count']
-            self.count = count_queryset[0]['count']
+        self.cursor_mode = self.cursor_query_param in request.query_params
+        if self.cursor_mode:
+            return self.paginate_queryset_by_cursor(queryset, request.query_params[self.cursor_query_param])
 
         self.offset = self.get_offset(request)
-        self.request = request
-
         if self.count == 0 or self.offset > self.count:
             return []
         return list(queryset[self.offset : self.offset + self.limit])
 
+    def paginate_queryset_by_cursor(self, queryset, cursor):
+        queryset = queryset.order_by('-created_at', '-id')
+        if cursor:
+            created_at, pk = self.decode_cursor(cursor)
+            queryset = queryset.filter(Q(created_at__lt=created_at) | Q(created_at=created_at, id__lt=pk))
+        # Fetch one more notification to know whether there is a next page
+        page = list(queryset[: self.limit + 1])
+        self.next_cursor = None
+        if len(page) > self.limit:
+            page = page[: self.limit]
+            self.next_cursor = self.encode_cursor(page[-1])
+        return page
+
+    @staticmethod
+    def encode_cursor(notification):
+        position = f"{notification.created_at.isoformat()}|{notification.pk}"
+        return urlsafe_b64encode(position.encode()).decode()
+
+    @staticmethod
+    def decode_cursor(cursor):
+        try:
+            created_at, pk = urlsafe_b64decode(cursor.encode()).decode().split('|')
+            created_at = parse_datetime(created_at)
+            if created_at is None:
+                raise ValueError
+            return created_at, int(pk)
+        except ValueError:
+            raise NotFound(_("Invalid cursor"))
+
+    def get_next_link(self):
+        if not self.cursor_mode:
+            return super().get_next_link()
+        if self.next_cursor is None:
+            return None
+        url = remove_query_param(self.request.build_absolute_uri(), self.offset_query_param)
+        return replace_query_param(url, self.cursor_query_param, self.next_cursor)
+
+    def get_previous_link(self):
+        if self.cursor_mode:
+            # The cursor pages are only meant to be loaded one after the other
+            return None
+        return super().get_previous_link()
+
+    def get_counts(self, request):
+        """Return the number of sent notifications of the current user, how many are
+        unread, and a version of the notifications which changes whenever one of them
+        is sent, read or deleted."""
+        if not hasattr(self, '_counts'):
+            self._counts = cached_counts(request.user.person.pk)
+        return self._counts
+
     def get_paginated_response(self, data):
         return Response(
             OrderedDict(
@@ -99,6 +153,54 @@ class SentNotificationListView(CorsAllowOriginMixin, generics.ListAPIView):
     def get_queryset(self):
         return WebNotification.objects.sent().filter(person_id=self.request.user.person.pk)
 
+    def list(self, request, *args, **kwargs):
+        etag = self.get_etag(request)
+        if etag in parse_etags(request.META.get('HTTP_IF_NONE_MATCH', '')):
+            return Response(status=status.HTTP_304_NOT_MODIFIED, headers={'ETag': etag})
+        if self.is_first_page(request):
+            # By far the most requested page, cached until the notifications of the user change
+            url_digest = hashlib.sha256(request.build_absolute_uri().encode()).hexdigest()
+            response = Response(
+                cached(request.user.person.pk, f"page:{url_digest}", lambda: self.get_page_data(request)),
+            )
+        else:
+            response = super().list(request, *args, **kwargs)
+        response['ETag'] = etag
+        return response
+
+    def is_first_page(self, request):
+        return self.paginator.get_offset(request) == 0 and not request.query_params.get(
+            self.paginator.cursor_query_param
+        )
+
+    def get_page_data(self, request):
+        data = super().list(request).data
+        # Only keep plain data, to be pickled
+        data['results'] = list(data['results'])
+        return data
+
+    def get_etag(self, request):
+        """The notifications of a page only change with the counts and the version of
+        the notifications of the user."""
+        count, unread_count, version = self.paginator.get_counts(request)
+        return make_etag(request.user.person.pk, count, unread_count, version, request.get_full_path())
+
+
+class NotificationCountsView(CorsAllowOriginMixin, views.APIView):
+    """Return the number of sent notifications of the current user and how many are
+    unread, to be polled instead of the notification list."""
+
+    name = "notification-counts"
+    permission_classes = (IsAuthenticated,)
+    authentication_classes = api_settings.DEFAULT_AUTHENTICATION_CLASSES + [SessionAuthentication]
+
+    def get(self, request, *args, **kwargs):
+        count, unread_count, version = cached_counts(request.user.person.pk)
+        etag = make_etag(request.user.person.pk, count, unread_count, version)
+        if etag in parse_etags(request.META.get('HTTP_IF_NONE_MATCH', '')):
+            return Response(status=status.HTTP_304_NOT_MODIFIED, headers={'ETag': etag})
+        return Response({"count": count, "unread_count": unread_count}, headers={'ETag': etag})
+
 
 class MarkNotificationAsReadView(CorsAllowOriginMixin, generics.UpdateAPIView):
     """Mark a single given notification as read if the notification is sent. If the
@@ -122,7 +224,8 @@ class MarkNotificationAsReadView(CorsAllowOriginMixin, generics.UpdateAPIView):
 
 
 class MarkAllNotificationsAsReadView(CorsAllowOriginMixin, views.APIView):
-    """Mark all the current user sent notifications as read."""
+    """Mark all the current user sent notifications as read, and return their number
+    and uuids (or the marked notifications with `?full=true`)."""
 
     name = "notification-mark-all-as-read"
     queryset = WebNotification.objects.sent()
@@ -130,14 +233,30 @@ class MarkAllNotificationsAsReadView(CorsAllowOriginMixin, views.APIView):
     permission_classes = (IsAuthenticated,)
     authentication_classes = api_settings.DEFAULT_AUTHENTICATION_CLASSES + [SessionAuthentication]
 
-    def get_queryset(self):
-        return self.queryset.filter(
-            state=NotificationStates.SENT_STATE.name,
-            person__uuid=self.request.user.person.uuid,
-        )
+    def put(self, request, *args, **kwargs):
+        uuids = WebNotificationHandler.mark_all_as_read_of_person(request.user.person.pk)
+        if request.query_params.get('full') in ('1', 'true'):
+            serializer = self.serializer_class(self.queryset.filter(uuid__in=uuids), many=True)
+            return Response(serializer.data)
+        # Without loading the marked notifications
+        return Response({"count": len(uuids), "uuids": uuids})
+
+
+class NotificationStatesView(CorsAllowOriginMixin, views.APIView):
+    """Mark the given notifications of the current user as read (`READ_STATE`) or
+    unread (`SENT_STATE`) at once, and return the number and uuids of the changed
+    notifications (the other ones being already in this state)."""
+
+    name = "notification-states"
+    permission_classes = (IsAuthenticated,)
+    authentication_classes = api_settings.DEFAULT_AUTHENTICATION_CLASSES + [SessionAuthentication]
 
     def put(self, request, *args, **kwargs):
-        notifications = list(self.get_queryset())
-        WebNotificationHandler.mark_all_as_read(notifications)
-        serializer = self.serializer_class(notifications, many=True)
-        return Response(serializer.data)
+        serializer = NotificationStatesSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        uuids = WebNotificationHandler.change_state_of_person(
+            request.user.person.pk,
+            serializer.validated_data["state"],
+            serializer.validated_data["uuids"],
+        )
+        return Response({"count": len(uuids), "uuids": uuids})
@@ -28,3 +28,21 @@ from django.apps import AppConfig
 
 class NotificationConfig(AppConfig):
     name = "osis_notification"
+
+    def ready(self):
+        from django.conf import settings
+        from django.core.signals import setting_changed
+
+        from osis_notification.contrib.handlers import (
+            clear_mail_sender_classes_cache,
+            get_mail_sender_classes,
+        )
+        from osis_notification.contrib.push import clear_broker_cache
+        from osis_notification.contrib.rate_limit import clear_rate_limiter_cache
+
+        setting_changed.connect(clear_mail_sender_classes_cache)
+        setting_changed.connect(clear_rate_limiter_cache)
+        setting_changed.connect(clear_broker_cache)
+        # Resolve the mail sender classes once, at startup
+        if hasattr(settings, "MAIL_SENDER_CLASSES"):
+            get_mail_sender_classes()
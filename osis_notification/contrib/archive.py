@@ -0,0 +1,178 @@
+import gzip
+import json
+import os
+from itertools import islice
+from typing import IO, Iterable, Iterator, Tuple
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+from django.db.models import Case, DateTimeField, F, Value, When
+from django.utils.dateparse import parse_datetime
+from django.utils.timezone import now
+
+from base.models.person import Person
+from osis_notification.contrib.cache import invalidate_cache
+from osis_notification.models import Notification, NotificationCounter, NotificationPayload
+from osis_notification.models.enums import NotificationTypes
+from osis_notification.models.notification_counter import SHOWN_STATES
+
+# The notifications are archived as gzip compressed JSON lines, one notification per
+# line, with its payload content.
+ARCHIVED_FIELDS = [
+    "uuid",
+    "type",
+    "person_id",
+    "state",
+    "priority",
+    "created_at",
+    "send_after",
+    "digest",
+    "grouped_in",
+    "sent_at",
+    "read_at",
+    "claimed_at",
+    "attempts",
+    "next_attempt_at",
+]
+DATETIME_FIELDS = ["created_at", "send_after", "sent_at", "read_at", "claimed_at", "next_attempt_at"]
+
+
+def open_archive(path: str, mode: str = "rt") -> IO:
+    return gzip.open(path, mode, encoding="utf-8")
+
+
+def write_archive(archive: IO, notifications) -> int:
+    """Write the given notifications to the archive, streaming them from the database,
+    and return the number of archived notifications."""
+
+    archived = 0
+    for notification in (
+        notifications.order_by("pk").values(*ARCHIVED_FIELDS, payload=F("stored_payload__content")).iterator()
+    ):
+        archive.write(json.dumps(notification, cls=DjangoJSONEncoder) + "\n")
+        archived += 1
+    return archived
+
+
+def sync_archive(archive: IO):
+    """Write what was written to the archive so far to the disk, so that it is not lost
+    if the process stops (e.g. before deleting the archived notifications)."""
+
+    archive.flush()
+    os.fsync(archive.fileno())
+
+
+def read_archive(archive: IO) -> Iterator[dict]:
+    """Yield the notifications of the archive."""
+
+    for line in archive:
+        if line.strip():
+            notification = json.loads(line)
+            for field in DATETIME_FIELDS:
+                # The archives written before a field was added do not have it
+                if notification.get(field):
+                    notification[field] = parse_datetime(notification[field])
+            yield notification
+
+
+def restore(notifications: Iterable[dict], batch_size: int, redate: bool = False) -> Tuple[int, int]:
+    """Load the given archived notifications back, by batches, and return the number of
+    restored notifications and the number of skipped notifications (already existing,
+    or whose person does not exist anymore).
+
+    A notification may be archived twice (e.g. when its partition was archived but not
+    dropped, the notification being deleted by batch afterwards): only its first copy
+    is restored.
+
+    The restored notifications keep their dates, so the next cleaning deletes them
+    again unless the retention durations were increased in the meantime. With
+    `redate`, their sending and reading dates are set to the current date instead, so
+    that they are kept for the whole retention durations."""
+
+    notifications = iter(notifications)
+    restored = skipped = 0
+    while True:
+        batch = list(islice(notifications, batch_size))
+        if not batch:
+            break
+        if redate:
+            current_time = now()
+            for notification in batch:
+                for field in ["sent_at", "read_at"]:
+                    if notification.get(field) is not None:
+                        notification[field] = current_time
+        batch_restored = _restore_batch(batch, batch_size)
+        restored += batch_restored
+        skipped += len(batch) - batch_restored
+    return restored, skipped
+
+
+def _restore_batch(batch, batch_size) -> int:
+    unique_batch = {}
+    for notification in batch:
+        unique_batch.setdefault(notification["uuid"], notification)
+    batch = list(unique_batch.values())
+    existing_uuids = {
+        str(uuid)
+        for uuid in Notification.objects.filter(
+            uuid__in=[notification["uuid"] for notification in batch]
+        ).values_list("uuid", flat=True)
+    }
+    existing_persons = set(
+        Person.objects.filter(
+            pk__in={notification["person_id"] for notification in batch if notification["person_id"]}
+        ).values_list("pk", flat=True)
+    )
+    batch = [
+        notification
+        for notification in batch
+        if notification["uuid"] not in existing_uuids
+        and (
+            notification["person_id"] in existing_persons
+            or (notification["person_id"] is None and notification["type"] != NotificationTypes.WEB_TYPE.name)
+        )
+    ]
+    if not batch:
+        return 0
+
+    with transaction.atomic():
+        payloads = NotificationPayload.objects.get_or_create_many(
+            (notification["payload"] for notification in batch),
+            batch_size=batch_size,
+        )
+        Notification.objects.bulk_create(
+            [
+                Notification(
+                    stored_payload=payloads[notification["payload"]],
+                    # The archives written before a field was added do not have it
+                    **{
+                        field: notification[field] if field in notification else _get_default(field)
+                        for field in ARCHIVED_FIELDS
+                    },
+                )
+                for notification in batch
+            ],
+            batch_size=batch_size,
+        )
+        # The creation date is always set to the current date on creation
+        Notification.objects.filter(uuid__in=[notification["uuid"] for notification in batch]).update(
+            created_at=Case(
+                *[When(uuid=notification["uuid"], then=Value(notification["created_at"])) for notification in batch],
+                output_field=DateTimeField(),
+            )
+        )
+        # The restored web notifications are shown again
+        person_ids = {
+            notification["person_id"]
+            for notification in batch
+            if notification["type"] == NotificationTypes.WEB_TYPE.name and notification["state"] in SHOWN_STATES
+        }
+        if person_ids and NotificationCounter.objects.enabled():
+            NotificationCounter.objects.recount(person_ids)
+        invalidate_cache(person_ids)
+    return len(batch)
+
+
+def _get_default(field: str):
+    """Returns the default value of the given notification field."""
+    return Notification._meta.get_field(field).get_default()
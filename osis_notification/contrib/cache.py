@@ -0,0 +1,148 @@
+# ##############################################################################
+#
+#  OSIS stands for Open Student Information System. It's an application
+#  designed to manage the core business of higher education institutions,
+#  such as universities, faculties, institutes and professional schools.
+#  The core business involves the administration of students, teachers,
+#  courses, programs and so on.
+#
+#  Copyright (C) 2015-2026 Université catholique de Louvain (http://www.uclouvain.be)
+#
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  A copy of this license - GNU General Public License - is available
+#  at the root of the source code of this program.  If not,
+#  see http://www.gnu.org/licenses/.
+#
+# ##############################################################################
+import threading
+import uuid
+from typing import Any, Callable, Iterable, Optional, Tuple
+
+from django.conf import settings
+from django.core.cache import BaseCache, caches
+from django.db import transaction
+
+# The cached values of a person are stored under a generation of the person, which is
+# replaced whenever their notifications change: the values of the previous generations
+# are then never read again, and expire. A value computed while the generation is being
+# replaced is stored under the previous one, so it cannot be read either.
+PREFIX = "osis_notification"
+HITS_KEY = f"{PREFIX}:hits"
+MISSES_KEY = f"{PREFIX}:misses"
+MISSING = object()
+
+
+def get_cache() -> Optional[BaseCache]:
+    """Return the cache configured by `settings.OSIS_NOTIFICATION_CACHE` (the alias of
+    one of the `settings.CACHES`), or None if nothing is cached."""
+
+    alias = getattr(settings, "OSIS_NOTIFICATION_CACHE", None)
+    return caches[alias] if alias else None
+
+
+def generation_key(person_id: int) -> str:
+    return f"{PREFIX}:generation:{person_id}"
+
+
+def get_generation(cache: BaseCache, person_id: int) -> str:
+    generation = cache.get(generation_key(person_id))
+    if generation is None:
+        generation = uuid.uuid4().hex
+        if not cache.add(generation_key(person_id), generation, timeout=None):
+            # Set by another process in the meantime
+            generation = cache.get(generation_key(person_id), generation)
+    return generation
+
+
+def cached(person_id: int, name: str, compute: Callable[[], Any]) -> Any:
+    """Return the value of the person with the given name from the cache, computing and
+    storing it if needed. Only computes it if the cache is disabled."""
+
+    cache = get_cache()
+    if cache is None:
+        return compute()
+    key = f"{PREFIX}:{person_id}:{get_generation(cache, person_id)}:{name}"
+    value = cache.get(key, MISSING)
+    stats.record(cache, hit=value is not MISSING)
+    if value is MISSING:
+        value = compute()
+        cache.set(key, value, timeout=getattr(settings, "OSIS_NOTIFICATION_CACHE_TIMEOUT", 300))
+    return value
+
+
+def cached_counts(person_id: int) -> Tuple[int, int, Optional[str]]:
+    """Return the (cached) counts and version of the notifications of the person, see
+    `WebNotificationManager.counts`."""
+
+    from osis_notification.models import WebNotification
+
+    return cached(person_id, "counts", lambda: WebNotification.objects.counts(person_id))
+
+
+def invalidate_cache(person_ids: Iterable[int]):
+    """Forget the cached values of the given persons once the current transaction is
+    committed (before, they could be computed again from the old notifications). Does
+    nothing if the cache is disabled."""
+
+    cache = get_cache()
+    if cache is None:
+        return
+    person_ids = {person_id for person_id in person_ids if person_id is not None}
+    if person_ids:
+        transaction.on_commit(
+            lambda: cache.set_many(
+                {generation_key(person_id): uuid.uuid4().hex for person_id in person_ids},
+                timeout=None,
+            )
+        )
+
+
+class CacheStats:
+    """Count the cache hits and misses of the process, added to the totals shared by all
+    the processes in the cache itself every `flush_interval` lookups."""
+
+    def __init__(self, flush_interval: int = 100):
+        self.flush_interval = flush_interval
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    def record(self, cache: BaseCache, hit: bool):
+        with self._lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+            if self.hits + self.misses < self.flush_interval:
+                return
+        self.flush(cache)
+
+    def flush(self, cache: BaseCache):
+        with self._lock:
+            hits, misses, self.hits, self.misses = self.hits, self.misses, 0, 0
+        for key, delta in ((HITS_KEY, hits), (MISSES_KEY, misses)):
+            if delta:
+                cache.add(key, 0, timeout=None)
+                cache.incr(key, delta)
+
+    @staticmethod
+    def totals(cache: BaseCache) -> Tuple[int, int]:
+        """Return the hits and misses of all the processes, since the last reset."""
+        totals = cache.get_many([HITS_KEY, MISSES_KEY])
+        return totals.get(HITS_KEY, 0), totals.get(MISSES_KEY, 0)
+
+    @staticmethod
+    def reset(cache: BaseCache):
+        cache.delete_many([HITS_KEY, MISSES_KEY])
+
+
+stats = CacheStats()
@@ -24,30 +24,65 @@
 #
 # ##############################################################################
 
-import email
+import json
+import uuid
+from collections import Counter
+from datetime import datetime, timedelta
 from email.header import decode_header, make_header
 from email.message import EmailMessage
 from email.policy import default as default_policy
+from functools import lru_cache
 from html import unescape
-from typing import List, Optional
+from typing import Dict, Iterable, List, Optional, Tuple
 
 from django.conf import settings
-from django.utils.html import strip_tags
+from django.db import transaction
+from django.utils.html import escape, strip_tags
 from django.utils.module_loading import import_string
 from django.utils.timezone import now
+from django.utils.translation import ngettext, override
 
 from base.models.person import Person
 from osis_common.messaging.message_config import create_receiver
+from osis_notification.contrib.cache import get_cache, invalidate_cache
+from osis_notification.contrib.mail_backends import persistent_connection
 from osis_notification.contrib.notification import (
     EmailNotification as EmailNotificationType,
     WebNotification as WebNotificationType,
 )
-from osis_notification.models import EmailNotification, WebNotification
-from osis_notification.models.enums import NotificationStates
+from osis_notification.contrib.push import get_broker, publish_counts, publish_notifications
+from osis_notification.contrib.rate_limit import get_rate_limiter
+from osis_notification.models import EmailNotification, NotificationCounter, WebNotification
+from osis_notification.models.enums import NotificationPriorities, NotificationStates
+from osis_notification.models.notification_counter import SHOWN_STATES
 
 UNKNOWN_PERSON = object()
 
 
+@lru_cache(maxsize=None)
+def get_mail_sender_classes() -> Tuple[Tuple[str, type], ...]:
+    """Return the classes listed in `settings.MAIL_SENDER_CLASSES` along with their
+    dotted path, imported only once."""
+
+    return tuple(
+        (mail_sender_class, import_string(mail_sender_class)) for mail_sender_class in settings.MAIL_SENDER_CLASSES
+    )
+
+
+def clear_mail_sender_classes_cache(setting, **kwargs):
+    """Clear the mail sender classes cache when `settings.MAIL_SENDER_CLASSES` changes."""
+
+    if setting == "MAIL_SENDER_CLASSES":
+        get_mail_sender_classes.cache_clear()
+
+
+def _state_counts(state: str) -> Tuple[int, int]:
+    """Returns what a web notification in the given state adds to the (total, unread)
+    counts of its person."""
+
+    return int(state in SHOWN_STATES), int(state == NotificationStates.SENT_STATE.name)
+
+
 class EmailNotificationHandler:
     @staticmethod
     def build(notification: EmailNotificationType) -> EmailMessage:
@@ -75,11 +110,18 @@ class EmailNotificationHandler:
     def create(
         mail: EmailMessage,
         person: Optional[Person] = UNKNOWN_PERSON,
+        priority: int = NotificationPriorities.NORMAL,
+        send_after: Optional[datetime] = None,
+        digest: bool = False,
     ) -> EmailNotification:
         """Create an email notification from a python object and save it in the database.
 
         :param mail: The email message to be sent as a notification.
         :param person: The recipient of the notification.
+        :param priority: The priority of the notification, higher priorities are sent first.
+        :param send_after: The date from which the notification can be sent (default to now).
+        :param digest: Whether the notification can be grouped with the other pending
+            notifications of the person in a digest email (only if the person is known).
         :return: The created EmailNotification."""
 
         if person is UNKNOWN_PERSON:
@@ -87,97 +129,521 @@ class EmailNotificationHandler:
 
         return EmailNotification.objects.create(
             person=person,
-            payload=str(mail),
+            payload=EmailNotificationHandler.serialize(mail),
+            priority=priority,
+            send_after=send_after,
+            digest=digest and person is not None,
         )
 
     @staticmethod
-    def process(notification: EmailNotification):
-        """Process the notification by sending the email.
+    def create_digests(notifications: List[EmailNotification]) -> List[EmailNotification]:
+        """Group the pending digest notifications by person and recipients (To and Cc),
+        in a digest email notification per group (see `create_digest`).
 
-        :param notification: The notification to be sent."""
+        :param notifications: The pending digest notifications.
+        :return: The digest EmailNotification objects."""
 
-        email_message = email.message_from_string(notification.payload, policy=default_policy)
-        receiver = create_receiver(
-            notification.person_id,
-            email_message.get("to"),
-            settings.LANGUAGE_CODE,
+        groups = {}
+        for notification in notifications:
+            content = json.loads(notification.payload)
+            groups.setdefault((notification.person_id, content["to"], content["cc"]), []).append(notification)
+        return [EmailNotificationHandler.create_digest(group) for group in groups.values()]
+
+    @staticmethod
+    def create_digest(notifications: List[EmailNotification]) -> EmailNotification:
+        """Group the pending notifications of a person in a single digest email
+        notification. The grouped notifications stay pending, with the uuid of the
+        digest notification in `grouped_in`, until it is sent (or fails) with them.
+
+        :param notifications: The pending digest notifications of the same person, sent
+            to the same recipients (To and Cc).
+        :return: The digest EmailNotification, or the notification itself if there is
+            only one (it is then sent as is)."""
+
+        if len(notifications) == 1:
+            notification = notifications[0]
+            notification.digest = False
+            notification.save(update_fields=["digest"])
+            return notification
+
+        person = notifications[0].person
+        contents = [json.loads(notification.payload) for notification in notifications]
+        recipients = {
+            (notification.person_id, content["to"], content["cc"])
+            for notification, content in zip(notifications, contents)
+        }
+        if len(recipients) > 1:
+            raise ValueError("Cannot group in a digest notifications sent to different recipients")
+        with override(person.language or settings.LANGUAGE_CODE):
+            subject = ngettext(
+                "%(count)d new notification",
+                "%(count)d new notifications",
+                len(contents),
+            ) % {"count": len(contents)}
+        mail = EmailNotificationHandler.build(
+            EmailNotificationType(
+                recipient=contents[0]["to"],
+                subject=subject,
+                plain_text_content="\n\n".join(
+                    f"{content['subject']}\n\n{content['plain_text_content']}" for content in contents
+                ),
+                html_content="<hr>".join(
+                    f"<h3>{escape(content['subject'])}</h3>{content['html_content']}" for content in contents
+                ),
+            )
+        )
+        if contents[0]["cc"]:
+            mail["Cc"] = contents[0]["cc"]
+        digest_notification = EmailNotificationHandler.create(
+            mail,
+            person,
+            priority=max(notification.priority for notification in notifications),
+        )
+        EmailNotification.objects.filter(pk__in=[notification.pk for notification in notifications]).update(
+            grouped_in=digest_notification.uuid,
         )
+        return digest_notification
+
+    @staticmethod
+    def create_many(
+        mails: List[EmailMessage],
+        persons: Optional[List[Optional[Person]]] = None,
+        batch_size: Optional[int] = None,
+        priority: int = NotificationPriorities.NORMAL,
+        send_after: Optional[datetime] = None,
+        digest: bool = False,
+    ) -> List[EmailNotification]:
+        """Create several email notifications at once. The recipients are resolved with a
+        single query and the notifications are inserted by batches.
+
+        :param mails: The email messages to be sent as notifications.
+        :param persons: The recipients of the notifications, in the same order as the
+            mails (as many as the mails). If not given, they are looked up from the `To`
+            of the mails.
+        :param batch_size: The number of notifications inserted per query.
+        :param priority: The priority of the notifications.
+        :param send_after: The date from which the notifications can be sent (default to now).
+        :param digest: Whether the notifications can be grouped with the other pending
+            notifications of their person in a digest email (only if the person is known).
+        :return: The created EmailNotification objects."""
+
+        if persons is not None and len(persons) != len(mails):
+            raise ValueError(f"Got {len(persons)} persons for {len(mails)} mails")
+        if persons is None:
+            persons_by_email = {}
+            queryset = Person.objects.filter(email__in={str(mail["To"]) for mail in mails})
+            # Keep the same person as `create` when several persons share the same email
+            for person in queryset if queryset.ordered else queryset.order_by("pk"):
+                persons_by_email.setdefault(person.email, person)
+            persons = [persons_by_email.get(str(mail["To"])) for mail in mails]
+
+        return EmailNotification.objects.create_many(
+            [
+                {
+                    "person": person,
+                    "payload": EmailNotificationHandler.serialize(mail),
+                    "priority": priority,
+                    "send_after": send_after,
+                    "digest": digest and person is not None,
+                }
+                for mail, person in zip(mails, persons)
+            ],
+            batch_size=batch_size or getattr(settings, "OSIS_NOTIFICATION_BULK_CREATE_BATCH_SIZE", 1000),
+        )
+
+    @staticmethod
+    def serialize(mail: EmailMessage) -> str:
+        """Extract the content of an email message, so that it can be sent later
+        without having to parse it again.
+
+        :param mail: The email message to be serialized.
+        :return: A JSON document containing the subject, recipient, cc, sender, plain
+            text and html content of the message."""
+
         plain_text_content = ''
         html_content = ''
-        for part in email_message.walk():
+        for part in mail.walk():
             # Mail payload is decoded to bytes then decode to utf8
             if part.get_content_type() == "text/plain":
                 plain_text_content = part.get_payload(decode=True).decode(settings.DEFAULT_CHARSET)
             elif part.get_content_type() == "text/html":
                 html_content = part.get_payload(decode=True).decode(settings.DEFAULT_CHARSET)
 
-        subject = make_header(decode_header(email_message.get("subject")))
-        cc = email_message.get("Cc")
-        from_email = email_message.get('from', settings.DEFAULT_FROM_EMAIL)
+        subject = make_header(decode_header(str(mail.get("subject", ""))))
+        cc = mail.get("Cc")
+        return json.dumps(
+            {
+                "subject": unescape(strip_tags(str(subject))),
+                "to": str(mail.get("to", "")),
+                "cc": str(cc) if cc else None,
+                "from": str(mail.get("from", settings.DEFAULT_FROM_EMAIL)),
+                "plain_text_content": plain_text_content.rstrip(),
+                "html_content": html_content.rstrip(),
+            }
+        )
+
+    @staticmethod
+    def process(notification: EmailNotification):
+        """Process the notification by sending the email.
+
+        A claimed notification is only sent if its claim is still held once the rate
+        limits allow it, its claim being renewed then: waiting for the rate limiter
+        may take longer than the lease, after which another worker may have claimed it
+        again.
+
+        :param notification: The notification to be sent."""
+
+        content = json.loads(notification.payload)
+        receiver = create_receiver(
+            notification.person_id,
+            content["to"],
+            settings.LANGUAGE_CODE,
+        )
+        cc = content["cc"]
         if cc:
             cc = [Person(email=cc_email) for cc_email in cc.split(',')]
-        for mail_sender_class in settings.MAIL_SENDER_CLASSES:
-            MailSenderClass = import_string(mail_sender_class)
+        rate_limiter = get_rate_limiter()
+        rate_limiter.wait_for_recipients(content["to"], content["cc"])
+        for mail_sender_class, _ in get_mail_sender_classes():
+            rate_limiter.wait_for_sender(mail_sender_class)
+        if notification.state == NotificationStates.PROCESSING_STATE.name:
+            if not EmailNotification.objects.renew_claim(notification):
+                # Sent by the worker which claimed it again
+                return
+        for _, MailSenderClass in get_mail_sender_classes():
             mail_sender = MailSenderClass(
                 receivers=[receiver],
                 reference=None,
                 connected_user=None,
-                subject=unescape(strip_tags(str(subject))),
-                message=plain_text_content.rstrip(),
-                html_message=html_content.rstrip(),
-                from_email=from_email,
+                subject=content["subject"],
+                message=content["plain_text_content"],
+                html_message=content["html_content"],
+                from_email=content["from"],
                 attachment=None,
                 cc=cc,
             )
             mail_sender.send_mail()
         notification.state = NotificationStates.SENT_STATE.name
         notification.sent_at = now()
-        notification.save()
+        with transaction.atomic(savepoint=False):
+            notification.save()
+            # The notifications grouped in it are sent with it, if it is a digest
+            EmailNotification.objects.grouped_in(notification).update(
+                state=NotificationStates.SENT_STATE.name,
+                sent_at=notification.sent_at,
+            )
+
+    @staticmethod
+    def process_many(notifications: Iterable[EmailNotification]) -> Dict[uuid.UUID, Exception]:
+        """Process the notifications by sending the emails, reusing the same SMTP
+        connection for the whole batch (see `PersistentSMTPEmailBackend`).
+
+        :param notifications: The notifications to be sent.
+        :return: The exceptions raised while sending the notifications, by uuid."""
+
+        exceptions = {}
+        with persistent_connection():
+            for notification in notifications:
+                try:
+                    EmailNotificationHandler.process(notification)
+                except Exception as exception:
+                    exceptions[notification.uuid] = exception
+                    EmailNotificationHandler.reschedule(notification)
+        return exceptions
+
+    @staticmethod
+    def reschedule(notification: EmailNotification):
+        """Schedule a new attempt to send the notification after a failure, with an
+        exponential backoff, or mark it as failed once the maximum number of attempts
+        (`settings.EMAIL_NOTIFICATIONS_MAX_ATTEMPTS`) has been reached.
+
+        :param notification: The notification that could not be sent."""
+
+        notification.attempts += 1
+        if notification.attempts >= getattr(settings, "EMAIL_NOTIFICATIONS_MAX_ATTEMPTS", 5):
+            notification.state = NotificationStates.FAILED_STATE.name
+            notification.next_attempt_at = None
+        else:
+            delay = getattr(settings, "EMAIL_NOTIFICATIONS_RETRY_DELAY_SECONDS", 60) * 2 ** (notification.attempts - 1)
+            notification.state = NotificationStates.PENDING_STATE.name
+            notification.next_attempt_at = now() + timedelta(seconds=delay)
+        # Not sent, even if the sending date was set before the failure
+        notification.sent_at = None
+        # Do not save the whole notification, as saving it may be what failed
+        EmailNotification.objects.filter(pk=notification.pk).update(
+            state=notification.state,
+            sent_at=None,
+            attempts=notification.attempts,
+            next_attempt_at=notification.next_attempt_at,
+        )
+        if notification.state == NotificationStates.FAILED_STATE.name:
+            # So do the notifications grouped in it, if it is a digest
+            EmailNotification.objects.grouped_in(notification).update(state=NotificationStates.FAILED_STATE.name)
 
 
 class WebNotificationHandler:
     @staticmethod
-    def create(notification: WebNotificationType):
+    def create(
+        notification: WebNotificationType,
+        priority: int = NotificationPriorities.NORMAL,
+        send_after: Optional[datetime] = None,
+        deliver_immediately: bool = False,
+    ):
         """Create a web notification from a python object and save it in the database.
 
         :param notification: An object containing the notification's content and the
-            person to send it to."""
+            person to send it to.
+        :param priority: The priority of the notification, higher priorities are sent first.
+        :param send_after: The date from which the notification can be sent (default to now).
+        :param deliver_immediately: Whether the notification is created already sent,
+            instead of waiting for the send_web_notifications command. Cannot be used
+            with a future send_after date."""
 
-        return WebNotification.objects.create(
+        web_notification = WebNotification.objects.create(
             person=notification.recipient,
             payload=notification.content,
+            priority=priority,
+            send_after=send_after,
+            **WebNotificationHandler._delivery_fields(deliver_immediately, send_after),
+        )
+        if deliver_immediately:
+            NotificationCounter.objects.add({web_notification.person_id: (1, 1)})
+            invalidate_cache([web_notification.person_id])
+            publish_notifications([web_notification])
+        return web_notification
+
+    @staticmethod
+    def create_many(
+        notifications: List[WebNotificationType],
+        batch_size: Optional[int] = None,
+        priority: int = NotificationPriorities.NORMAL,
+        send_after: Optional[datetime] = None,
+        deliver_immediately: bool = False,
+    ) -> List[WebNotification]:
+        """Create several web notifications at once, inserted by batches.
+
+        :param notifications: The objects containing the notifications' content and the
+            persons to send them to.
+        :param batch_size: The number of notifications inserted per query.
+        :param priority: The priority of the notifications.
+        :param send_after: The date from which the notifications can be sent (default to now).
+        :param deliver_immediately: Whether the notifications are created already sent.
+            Cannot be used with a future send_after date.
+        :return: The created WebNotification objects."""
+
+        delivery_fields = WebNotificationHandler._delivery_fields(deliver_immediately, send_after)
+        web_notifications = WebNotification.objects.create_many(
+            [
+                {
+                    "person": notification.recipient,
+                    "payload": notification.content,
+                    "priority": priority,
+                    "send_after": send_after,
+                    **delivery_fields,
+                }
+                for notification in notifications
+            ],
+            batch_size=batch_size or getattr(settings, "OSIS_NOTIFICATION_BULK_CREATE_BATCH_SIZE", 1000),
         )
+        if deliver_immediately:
+            NotificationCounter.objects.add(
+                {
+                    person_id: (count, count)
+                    for person_id, count in Counter(
+                        notification.person_id for notification in web_notifications
+                    ).items()
+                }
+            )
+            invalidate_cache(notification.person_id for notification in web_notifications)
+            publish_notifications(web_notifications)
+        return web_notifications
+
+    @staticmethod
+    def _delivery_fields(deliver_immediately: bool, send_after: Optional[datetime]) -> dict:
+        if not deliver_immediately:
+            return {}
+        sent_at = now()
+        if send_after is not None and send_after > sent_at:
+            raise ValueError(f"Cannot deliver immediately a notification to send after {send_after}")
+        return {"state": NotificationStates.SENT_STATE.name, "sent_at": sent_at}
 
     @staticmethod
     def process(notification: WebNotification):
-        """Process the notification by sending the web notification."""
+        """Process the notification by sending the web notification, if it is still
+        pending."""
 
-        notification.state = NotificationStates.SENT_STATE.name
-        notification.sent_at = now()
-        notification.save()
+        if WebNotificationHandler._transition(
+            notification,
+            NotificationStates.PENDING_STATE.name,
+            NotificationStates.SENT_STATE.name,
+            sent_at=now(),
+        ):
+            publish_notifications([notification])
+
+    @staticmethod
+    def process_pending(batch_size: int) -> int:
+        """Send all the due pending web notifications, by priority, with one UPDATE
+        statement per batch, and return the number of sent notifications."""
+
+        # The persons of the notifications are only needed to update their counters,
+        # their cache, and to tell them about their new notifications
+        with_persons = (
+            NotificationCounter.objects.enabled() or get_cache() is not None or get_broker() is not None
+        )
+        sent = 0
+        while True:
+            if with_persons:
+                count = WebNotificationHandler._process_pending_batch(batch_size)
+            else:
+                count = WebNotification.objects.filter(
+                    pk__in=WebNotification.objects.pending().values("pk")[:batch_size],
+                    state=NotificationStates.PENDING_STATE.name,
+                ).update(state=NotificationStates.SENT_STATE.name, sent_at=now())
+            sent += count
+            if count < batch_size:
+                return sent
+
+    @staticmethod
+    @transaction.atomic
+    def _process_pending_batch(batch_size: int) -> int:
+        notifications = list(
+            WebNotification.objects.pending()
+            .select_for_update(skip_locked=True, of=("self",))
+            .values_list("pk", "person_id")[:batch_size]
+        )
+        count = WebNotification.objects.filter(
+            pk__in=[pk for pk, _ in notifications],
+            state=NotificationStates.PENDING_STATE.name,
+        ).update(state=NotificationStates.SENT_STATE.name, sent_at=now())
+        NotificationCounter.objects.add(
+            {
+                person_id: (person_count, person_count)
+                for person_id, person_count in Counter(person_id for _, person_id in notifications).items()
+            }
+        )
+        invalidate_cache(person_id for _, person_id in notifications)
+        publish_counts(person_id for _, person_id in notifications)
+        return count
+
+    @staticmethod
+    def _transition(notification: WebNotification, from_state: str, to_state: str, **fields) -> bool:
+        """Move the notification from one state to another in the database, only if it
+        is still in the first one, and update the counters of its person in the same
+        transaction.
+
+        :param fields: The other fields to update.
+        :return: Whether the notification has been changed. If not, it is reloaded from
+            the database."""
+
+        with transaction.atomic(savepoint=False):
+            updated = WebNotification.objects.filter(pk=notification.pk, state=from_state).update(
+                state=to_state,
+                **fields,
+            )
+            if updated == 1:
+                (to_total, to_unread), (from_total, from_unread) = _state_counts(to_state), _state_counts(from_state)
+                NotificationCounter.objects.add(
+                    {notification.person_id: (to_total - from_total, to_unread - from_unread)}
+                )
+        if updated != 1:
+            notification.refresh_from_db(fields=["state", "sent_at", "read_at"])
+            return False
+        notification.state = to_state
+        for field, value in fields.items():
+            setattr(notification, field, value)
+        invalidate_cache([notification.person_id])
+        return True
 
     @staticmethod
     def toggle_state(notification: WebNotification):
-        """Toggle the notification state between `SENT_STATE` and `READ_STATE`."""
+        """Toggle the notification state between `SENT_STATE` and `READ_STATE`: mark it
+        as unread if it is read, as read otherwise."""
 
         if notification.state == NotificationStates.READ_STATE.name:
-            notification.state = NotificationStates.SENT_STATE.name
-            notification.read_at = None
+            WebNotificationHandler.mark_as_unread(notification)
         else:
-            notification.state = NotificationStates.READ_STATE.name
-            notification.read_at = now()
-        notification.save()
+            WebNotificationHandler.mark_as_read(notification)
 
     @staticmethod
     def mark_as_read(notification: WebNotification):
-        notification.state = NotificationStates.READ_STATE.name
-        notification.read_at = now()
-        notification.save()
+        """Mark the notification as read, whatever its state (e.g. still pending), from
+        the state it has in the database so that the counters stay right."""
+
+        while not WebNotificationHandler._transition(
+            notification,
+            notification.state,
+            NotificationStates.READ_STATE.name,
+            read_at=now(),
+        ):
+            # Changed in the meantime, and reloaded
+            continue
+        publish_counts([notification.person_id])
+
+    @staticmethod
+    def mark_as_unread(notification: WebNotification):
+        """Mark the notification as unread, only if it is read."""
+
+        if WebNotificationHandler._transition(
+            notification,
+            NotificationStates.READ_STATE.name,
+            NotificationStates.SENT_STATE.name,
+            read_at=None,
+        ):
+            publish_counts([notification.person_id])
+
+    @staticmethod
+    def mark_all_as_read_of_person(person_id: int) -> List[uuid.UUID]:
+        """Mark all the unread notifications of the person as read, without loading
+        them, and return their uuids."""
+
+        return WebNotificationHandler.change_state_of_person(person_id, NotificationStates.READ_STATE.name)
+
+    @staticmethod
+    def change_state_of_person(
+        person_id: int,
+        state: str,
+        uuids: Optional[Iterable[uuid.UUID]] = None,
+    ) -> List[uuid.UUID]:
+        """Mark the given notifications of the person (all of them by default) as read
+        (`READ_STATE`) or unread (`SENT_STATE`), without loading them, and return the
+        uuids of the changed notifications."""
+
+        with transaction.atomic(savepoint=False):
+            changed_uuids = WebNotification.objects.change_state(person_id, state, uuids)
+            if changed_uuids:
+                unread_delta = len(changed_uuids)
+                if state == NotificationStates.READ_STATE.name:
+                    unread_delta = -unread_delta
+                NotificationCounter.objects.add({person_id: (0, unread_delta)})
+        if changed_uuids:
+            invalidate_cache([person_id])
+            publish_counts([person_id])
+        return changed_uuids
 
     @staticmethod
     def mark_all_as_read(notifications: List["WebNotification"]):
-        for notification in notifications:
-            notification.state = NotificationStates.READ_STATE.name
-            notification.read_at = now()
+        """Mark the given notifications as read, the ones that are still unread in the
+        database being counted as read."""
 
-        WebNotification.objects.bulk_update(notifications, ["state", "read_at"])
+        read_at = now()
+        with transaction.atomic():
+            unread = dict(
+                WebNotification.objects.filter(
+                    pk__in=[notification.pk for notification in notifications],
+                    state=NotificationStates.SENT_STATE.name,
+                )
+                .select_for_update(of=("self",))
+                .values_list("pk", "person_id")
+            )
+            WebNotification.objects.filter(pk__in=unread).update(
+                state=NotificationStates.READ_STATE.name,
+                read_at=read_at,
+            )
+            unread_counts = Counter(unread.values())
+            NotificationCounter.objects.add({person_id: (0, -count) for person_id, count in unread_counts.items()})
+        for notification in notifications:
+            if notification.pk in unread:
+                notification.state = NotificationStates.READ_STATE.name
+                notification.read_at = read_at
+        invalidate_cache(unread_counts)
+        publish_counts(unread_counts)
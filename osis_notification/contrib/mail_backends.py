@@ -0,0 +1,96 @@
+# ##############################################################################
+#
+#  OSIS stands for Open Student Information System. It's an application
+#  designed to manage the core business of higher education institutions,
+#  such as universities, faculties, institutes and professional schools.
+#  The core business involves the administration of students, teachers,
+#  courses, programs and so on.
+#
+#  Copyright (C) 2015-2026 Université catholique de Louvain (http://www.uclouvain.be)
+#
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  A copy of this license - GNU General Public License - is available
+#  at the root of the source code of this program.  If not,
+#  see http://www.gnu.org/licenses/.
+#
+# ##############################################################################
+import smtplib
+import threading
+from contextlib import contextmanager
+
+from django.core.mail.backends.smtp import EmailBackend
+
+_local = threading.local()
+
+
+@contextmanager
+def persistent_connection():
+    """Keep the SMTP connections opened by `PersistentSMTPEmailBackend` alive until the
+    end of the block, so that all the emails sent from the current thread inside it
+    share the same SMTP session."""
+
+    if getattr(_local, "connections", None) is not None:
+        # Nested block, the outermost one is responsible for the connections
+        yield
+        return
+
+    _local.connections = {}
+    try:
+        yield
+    finally:
+        connections, _local.connections = _local.connections, None
+        for connection in connections.values():
+            try:
+                connection.quit()
+            except (smtplib.SMTPException, OSError):
+                connection.close()
+
+
+class PersistentSMTPEmailBackend(EmailBackend):
+    """SMTP email backend reusing the connection opened inside a `persistent_connection()`
+    block instead of opening a new SMTP session for each email. Outside of such a
+    block, it behaves exactly like the Django SMTP email backend."""
+
+    def open(self):
+        connections = getattr(_local, "connections", None)
+        if connections is None or self.connection:
+            return super().open()
+
+        key = (self.host, self.port, self.username, self.use_tls, self.use_ssl)
+        connection = connections.get(key)
+        if connection is not None and self._is_alive(connection):
+            self.connection = connection
+            # The connection must not be closed after sending the messages
+            return False
+        if connection is not None:
+            connection.close()
+
+        if super().open() is None:
+            # The connection failed silently
+            return None
+        connections[key] = self.connection
+        return False
+
+    def close(self):
+        connections = getattr(_local, "connections", None)
+        if connections is not None and self.connection in connections.values():
+            # The connection will be closed at the end of the persistent_connection block
+            self.connection = None
+            return
+        super().close()
+
+    @staticmethod
+    def _is_alive(connection) -> bool:
+        try:
+            return connection.noop()[0] == 250
+        except (smtplib.SMTPException, OSError):
+            return False
@@ -0,0 +1,279 @@
+import re
+from datetime import datetime, timedelta, timezone
+from typing import Callable, Iterator, List, Optional, Tuple
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections, transaction
+from django.db.models import Max, Q, QuerySet
+from django.utils.timezone import now
+
+from osis_notification.models import Notification
+from osis_notification.models.enums import NotificationStates, NotificationTypes
+
+# The notification table can be range partitioned by month on its creation date
+# (PostgreSQL only). Each partition is named after its month, e.g.
+# osis_notification_notification_p202610, rows out of the created partitions go to
+# the default partition.
+TABLE = Notification._meta.db_table
+UNPARTITIONED_TABLE = f"{TABLE}_unpartitioned"
+DEFAULT_PARTITION = f"{TABLE}_default"
+PARTITION_NAME_RE = re.compile(rf"^{TABLE}_p(\d{{4}})(\d{{2}})$")
+# The method and columns of an index definition
+INDEX_COLUMNS_RE = re.compile(r"(USING \w+ \()([^()]*)\)")
+
+
+def month_start(date: datetime) -> datetime:
+    """Returns the beginning of the month (UTC) of the given date."""
+    date = date.astimezone(timezone.utc)
+    return datetime(date.year, date.month, 1, tzinfo=timezone.utc)
+
+
+def next_month_start(date: datetime) -> datetime:
+    return month_start(month_start(date) + timedelta(days=32))
+
+
+def month_ranges(start: datetime, end: datetime) -> Iterator[Tuple[datetime, datetime]]:
+    """Yields the (beginning, end) of each month from the month of start to the month
+    of end, included."""
+    month = month_start(start)
+    while month <= end:
+        yield month, next_month_start(month)
+        month = next_month_start(month)
+
+
+def partition_name(month: datetime) -> str:
+    return f"{TABLE}_p{month.year}{month.month:02d}"
+
+
+def is_partitioned(using: str = DEFAULT_DB_ALIAS) -> bool:
+    """Whether the notification table is partitioned."""
+    connection = connections[using]
+    if connection.vendor != "postgresql":
+        return False
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT EXISTS (SELECT 1 FROM pg_partitioned_table WHERE partrelid = to_regclass(%s))",
+            [TABLE],
+        )
+        return cursor.fetchone()[0]
+
+
+def get_partitions(using: str = DEFAULT_DB_ALIAS) -> List[Tuple[str, datetime, datetime]]:
+    """Returns the name, beginning and end of the monthly partitions, by month."""
+    with connections[using].cursor() as cursor:
+        cursor.execute(
+            "SELECT child.relname FROM pg_inherits "
+            "JOIN pg_class child ON child.oid = pg_inherits.inhrelid "
+            "WHERE pg_inherits.inhparent = to_regclass(%s)",
+            [TABLE],
+        )
+        names = [row[0] for row in cursor.fetchall()]
+
+    partitions = []
+    for name in names:
+        match = PARTITION_NAME_RE.match(name)
+        if match:
+            start = datetime(int(match.group(1)), int(match.group(2)), 1, tzinfo=timezone.utc)
+            partitions.append((name, start, next_month_start(start)))
+    return sorted(partitions, key=lambda partition: partition[1])
+
+
+def create_partitions(start: datetime, end: datetime, using: str = DEFAULT_DB_ALIAS) -> List[str]:
+    """Create the missing monthly partitions from the month of start to the month of
+    end and return their names.
+
+    PostgreSQL refuses to create a partition while the default partition holds rows
+    of its month: the default partition is then detached meanwhile, and these rows
+    are moved to the new partition.
+    """
+    connection = connections[using]
+    quote_name = connection.ops.quote_name
+    existing = {name for name, _, _ in get_partitions(using)}
+    created = []
+    for month, next_month in month_ranges(start, end):
+        name = partition_name(month)
+        if name in existing:
+            continue
+        with transaction.atomic(using=using), connection.cursor() as cursor:
+            cursor.execute(f"LOCK TABLE {quote_name(TABLE)} IN ACCESS EXCLUSIVE MODE")
+            cursor.execute("SELECT to_regclass(%s) IS NOT NULL", [DEFAULT_PARTITION])
+            has_default = cursor.fetchone()[0]
+            if has_default:
+                cursor.execute(
+                    f"SELECT EXISTS (SELECT 1 FROM {quote_name(DEFAULT_PARTITION)} "
+                    f"WHERE created_at >= %s AND created_at < %s)",
+                    [month, next_month],
+                )
+                has_default = cursor.fetchone()[0]
+            if has_default:
+                cursor.execute(f"ALTER TABLE {quote_name(TABLE)} DETACH PARTITION {quote_name(DEFAULT_PARTITION)}")
+            cursor.execute(
+                f"CREATE TABLE {quote_name(name)} PARTITION OF {quote_name(TABLE)} FOR VALUES FROM (%s) TO (%s)",
+                [month, next_month],
+            )
+            if has_default:
+                cursor.execute(
+                    f"WITH moved AS (DELETE FROM {quote_name(DEFAULT_PARTITION)} "
+                    f"WHERE created_at >= %s AND created_at < %s RETURNING *) "
+                    f"INSERT INTO {quote_name(TABLE)} SELECT * FROM moved",
+                    [month, next_month],
+                )
+                cursor.execute(
+                    f"ALTER TABLE {quote_name(TABLE)} ATTACH PARTITION {quote_name(DEFAULT_PARTITION)} DEFAULT"
+                )
+        created.append(name)
+    return created
+
+
+def expired_notifications_filter() -> Q:
+    """Returns the filter of the notifications that can be deleted (see the
+    clean_email_notifications and clean_web_notifications commands)."""
+    current_time = now()
+    return Q(
+        type=NotificationTypes.EMAIL_TYPE.name,
+        state=NotificationStates.SENT_STATE.name,
+        sent_at__lte=current_time - timedelta(days=settings.EMAIL_NOTIFICATIONS_RETENTION_DAYS),
+    ) | Q(
+        type=NotificationTypes.WEB_TYPE.name,
+        state=NotificationStates.READ_STATE.name,
+        read_at__lte=current_time - timedelta(days=settings.WEB_NOTIFICATIONS_RETENTION_DAYS),
+    )
+
+
+def is_expired(start: datetime, end: datetime, using: str = DEFAULT_DB_ALIAS) -> bool:
+    """Whether all the notifications created between start and end can be deleted."""
+    return (
+        not Notification.objects.using(using)
+        .filter(created_at__gte=start, created_at__lt=end)
+        .exclude(expired_notifications_filter())
+        .exists()
+    )
+
+
+def get_expired_partitions(using: str = DEFAULT_DB_ALIAS) -> List[Tuple[str, datetime, datetime]]:
+    """Returns the partitions whose notifications can all be deleted."""
+    oldest_retention_date = now() - timedelta(
+        days=min(settings.EMAIL_NOTIFICATIONS_RETENTION_DAYS, settings.WEB_NOTIFICATIONS_RETENTION_DAYS)
+    )
+    return [
+        (name, start, end)
+        for name, start, end in get_partitions(using)
+        # A notification is sent or read after its creation
+        if end <= oldest_retention_date and is_expired(start, end, using)
+    ]
+
+
+def drop_expired_partitions(
+    before_drop: Optional[Callable[[QuerySet], None]] = None,
+    before_lock: Optional[Callable[[QuerySet], None]] = None,
+    using: str = DEFAULT_DB_ALIAS,
+) -> List[str]:
+    """Detach and drop the partitions whose notifications can all be deleted, and
+    return their names.
+
+    The partition is locked before checking it again, so that no notification can be
+    modified between the check and the drop. The notification table is locked first,
+    as the detaching does and as the queries on the notifications do, so that they
+    cannot deadlock with each other.
+
+    :param before_drop: Called with the notifications of each partition before it is
+        dropped, while it is locked.
+    :param before_lock: Called with the notifications of each partition before it is
+        locked (e.g. to archive them without blocking the notifications meanwhile). The
+        partition is not dropped if notifications were added to it in the meantime.
+    """
+    connection = connections[using]
+    quote_name = connection.ops.quote_name
+    dropped = []
+    for name, start, end in get_expired_partitions(using):
+        notifications = Notification.objects.using(using).filter(created_at__gte=start, created_at__lt=end)
+        last_pk = notifications.aggregate(last_pk=Max("pk"))["last_pk"] or 0
+        if before_lock is not None:
+            before_lock(notifications)
+        with transaction.atomic(using=using), connection.cursor() as cursor:
+            # In this order, as a lock on the partition only would have to be upgraded by
+            # the detaching while other transactions wait for it
+            cursor.execute(f"LOCK TABLE {quote_name(TABLE)}, {quote_name(name)} IN ACCESS EXCLUSIVE MODE")
+            # The restored notifications get new primary keys
+            if not is_expired(start, end, using) or notifications.filter(pk__gt=last_pk).exists():
+                continue
+            if before_drop is not None:
+                before_drop(notifications)
+            cursor.execute(f"ALTER TABLE {quote_name(TABLE)} DETACH PARTITION {quote_name(name)}")
+            cursor.execute(f"DROP TABLE {quote_name(name)}")
+        dropped.append(name)
+    return dropped
+
+
+def partition_table(months_ahead: int, using: str = DEFAULT_DB_ALIAS) -> None:
+    """Convert the notification table to a table partitioned by month on the creation
+    date, keeping all its rows, constraints and indexes.
+
+    As PostgreSQL requires the partition key in the unique constraints of a
+    partitioned table, the primary key becomes (id, created_at) and the unique indexes
+    (e.g. on the uuid) get the creation date too. The database then no longer enforces
+    the uniqueness of the uuid on its own, even though the model still declares it:
+    the uuids are random, but a notification must not be inserted with the uuid of an
+    existing one (as restore_notifications checks).
+
+    The whole table is copied in a single transaction: this should be done during a
+    maintenance window.
+    """
+    connection = connections[using]
+    quote_name = connection.ops.quote_name
+    with transaction.atomic(using=using), connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT conname FROM pg_constraint WHERE confrelid = to_regclass(%s) AND contype = 'f'",
+            [TABLE],
+        )
+        referencing = [row[0] for row in cursor.fetchall()]
+        if referencing:
+            raise ValueError(f"The notification table is referenced by foreign keys: {', '.join(referencing)}")
+
+        cursor.execute("SELECT min(created_at) FROM " + quote_name(TABLE))
+        oldest = cursor.fetchone()[0] or now()
+        cursor.execute("SELECT pg_get_serial_sequence(%s, 'id')", [TABLE])
+        sequence = cursor.fetchone()[0]
+        cursor.execute(
+            "SELECT conname, pg_get_constraintdef(oid) FROM pg_constraint WHERE conrelid = to_regclass(%s) "
+            "AND contype = 'f'",
+            [TABLE],
+        )
+        foreign_keys = cursor.fetchall()
+        cursor.execute(
+            "SELECT indexdef FROM pg_indexes WHERE tablename = %s AND indexname NOT IN "
+            "(SELECT conname FROM pg_constraint WHERE conrelid = to_regclass(%s) AND contype = 'p')",
+            [TABLE, TABLE],
+        )
+        indexes = [row[0] for row in cursor.fetchall()]
+
+        cursor.execute(f"ALTER TABLE {quote_name(TABLE)} RENAME TO {quote_name(UNPARTITIONED_TABLE)}")
+        cursor.execute(
+            f"CREATE TABLE {quote_name(TABLE)} (LIKE {quote_name(UNPARTITIONED_TABLE)} "
+            f"INCLUDING DEFAULTS INCLUDING CONSTRAINTS INCLUDING IDENTITY) PARTITION BY RANGE (created_at)"
+        )
+        cursor.execute(f"ALTER TABLE {quote_name(TABLE)} ADD PRIMARY KEY (id, created_at)")
+        cursor.execute(f"CREATE TABLE {quote_name(DEFAULT_PARTITION)} PARTITION OF {quote_name(TABLE)} DEFAULT")
+        create_partitions(oldest, now() + timedelta(days=31 * months_ahead), using)
+        cursor.execute(f"INSERT INTO {quote_name(TABLE)} SELECT * FROM {quote_name(UNPARTITIONED_TABLE)}")
+
+        cursor.execute("SELECT pg_get_serial_sequence(%s, 'id')", [TABLE])
+        if cursor.fetchone()[0] is None and sequence:
+            # Serial column: keep the sequence of the original table
+            cursor.execute(f"ALTER SEQUENCE {sequence} OWNED BY {quote_name(TABLE)}.id")
+        else:
+            # Identity column: the new sequence goes on from the last identifier
+            cursor.execute(
+                f"SELECT setval(pg_get_serial_sequence(%s, 'id'), COALESCE(max(id), 0) + 1, false) "
+                f"FROM {quote_name(TABLE)}",
+                [TABLE],
+            )
+
+        cursor.execute(f"DROP TABLE {quote_name(UNPARTITIONED_TABLE)}")
+        for constraint_name, definition in foreign_keys:
+            cursor.execute(f"ALTER TABLE {quote_name(TABLE)} ADD CONSTRAINT {quote_name(constraint_name)} {definition}")
+        for definition in indexes:
+            # The definitions were read before renaming the table
+            if definition.startswith("CREATE UNIQUE INDEX") and "created_at" not in definition:
+                definition = INDEX_COLUMNS_RE.sub(r"\1\2, created_at)", definition, count=1)
+            cursor.execute(definition)
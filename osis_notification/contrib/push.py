@@ -0,0 +1,183 @@
+# ##############################################################################
+#
+#  OSIS stands for Open Student Information System. It's an application
+#  designed to manage the core business of higher education institutions,
+#  such as universities, faculties, institutes and professional schools.
+#  The core business involves the administration of students, teachers,
+#  courses, programs and so on.
+#
+#  Copyright (C) 2015-2026 Université catholique de Louvain (http://www.uclouvain.be)
+#
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  A copy of this license - GNU General Public License - is available
+#  at the root of the source code of this program.  If not,
+#  see http://www.gnu.org/licenses/.
+#
+# ##############################################################################
+import asyncio
+import json
+import logging
+import threading
+from collections import defaultdict
+from contextlib import asynccontextmanager
+from functools import lru_cache
+from typing import Iterable, Optional
+
+from django.conf import settings
+from django.db import transaction
+from django.utils.module_loading import import_string
+
+# The events pushed to the persons connected to the notification stream:
+# - "notification", with the serialized notification, when a notification is sent;
+# - "counts", without data, when the counts of the person change.
+NOTIFICATION_EVENT = "notification"
+COUNTS_EVENT = "counts"
+
+logger = logging.getLogger(__name__)
+
+
+class InProcessBroker:
+    """Fan out the events to the subscribers of the current process only. Suitable for
+    the tests and for a single process serving both the notifications and the stream."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._subscribers = defaultdict(set)
+
+    def publish(self, person_id: int, event: str, data: Optional[dict] = None):
+        """Push the event to the subscribers of the person, from any thread."""
+
+        with self._lock:
+            subscribers = list(self._subscribers.get(person_id, ()))
+        for queue, loop in subscribers:
+            loop.call_soon_threadsafe(queue.put_nowait, (event, data))
+
+    @asynccontextmanager
+    async def subscribe(self, person_id: int):
+        """Yield a queue receiving the (event, data) pushed to the person."""
+
+        subscriber = (asyncio.Queue(), asyncio.get_running_loop())
+        with self._lock:
+            self._subscribers[person_id].add(subscriber)
+        try:
+            yield subscriber[0]
+        finally:
+            with self._lock:
+                self._subscribers[person_id].discard(subscriber)
+                if not self._subscribers[person_id]:
+                    del self._subscribers[person_id]
+
+
+class RedisBroker:
+    """Fan out the events through Redis publish/subscribe, so that the notifications
+    sent by any process (e.g. the celery workers) reach the stream served by another.
+    Requires the `redis` package and `settings.OSIS_NOTIFICATION_PUSH_REDIS_URL`."""
+
+    def __init__(self, url: Optional[str] = None):
+        import redis
+
+        self.url = url or settings.OSIS_NOTIFICATION_PUSH_REDIS_URL
+        self.client = redis.Redis.from_url(self.url)
+
+    @staticmethod
+    def channel(person_id: int) -> str:
+        return f"osis_notification:{person_id}"
+
+    def publish(self, person_id: int, event: str, data: Optional[dict] = None):
+        self.client.publish(self.channel(person_id), json.dumps({"event": event, "data": data}))
+
+    @asynccontextmanager
+    async def subscribe(self, person_id: int):
+        import redis.asyncio
+
+        client = redis.asyncio.Redis.from_url(self.url)
+        pubsub = client.pubsub()
+        await pubsub.subscribe(self.channel(person_id))
+        queue = asyncio.Queue()
+
+        async def forward():
+            async for message in pubsub.listen():
+                if message["type"] == "message":
+                    message = json.loads(message["data"])
+                    queue.put_nowait((message["event"], message["data"]))
+
+        forwarder = asyncio.ensure_future(forward())
+        try:
+            yield queue
+        finally:
+            forwarder.cancel()
+            await pubsub.unsubscribe()
+            await pubsub.close()
+            await client.close()
+
+
+@lru_cache(maxsize=None)
+def get_broker():
+    """Return the broker configured by `settings.OSIS_NOTIFICATION_PUSH_BROKER` (the
+    dotted path of its class), or None if the notifications are not pushed."""
+
+    broker_class = getattr(settings, "OSIS_NOTIFICATION_PUSH_BROKER", None)
+    return import_string(broker_class)() if broker_class else None
+
+
+def clear_broker_cache(setting, **kwargs):
+    """Clear the broker cache when `settings.OSIS_NOTIFICATION_PUSH_BROKER` changes."""
+
+    if setting == "OSIS_NOTIFICATION_PUSH_BROKER":
+        get_broker.cache_clear()
+
+
+def publish_notifications(notifications: Iterable):
+    """Push the given sent web notifications to their persons, once the current
+    transaction is committed. Does nothing unless a broker is configured. The errors of
+    the broker are logged, not raised, as the transaction is already committed."""
+
+    broker = get_broker()
+    if broker is None:
+        return
+    from osis_notification.api.serializers import WebNotificationSerializer
+
+    events = [
+        (notification.person_id, WebNotificationSerializer(notification).data) for notification in notifications
+    ]
+
+    def publish():
+        try:
+            for person_id, data in events:
+                # Through json, to get the same data from all the brokers
+                broker.publish(person_id, NOTIFICATION_EVENT, json.loads(json.dumps(data, default=str)))
+        except Exception:
+            # The notifications are sent anyway, the stream only misses them
+            logger.exception("Could not push the sent notifications")
+
+    transaction.on_commit(publish)
+
+
+def publish_counts(person_ids: Iterable[int]):
+    """Tell the given persons that their counts changed, once the current transaction
+    is committed. Does nothing unless a broker is configured. The errors of the broker
+    are logged, not raised."""
+
+    broker = get_broker()
+    if broker is None:
+        return
+    person_ids = {person_id for person_id in person_ids if person_id is not None}
+
+    def publish():
+        try:
+            for person_id in person_ids:
+                broker.publish(person_id, COUNTS_EVENT)
+        except Exception:
+            # The counts are changed anyway, the stream only misses it
+            logger.exception("Could not push the changed counts")
+
+    transaction.on_commit(publish)
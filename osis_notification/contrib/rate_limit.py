@@ -0,0 +1,181 @@
+# ##############################################################################
+#
+#  OSIS stands for Open Student Information System. It's an application
+#  designed to manage the core business of higher education institutions,
+#  such as universities, faculties, institutes and professional schools.
+#  The core business involves the administration of students, teachers,
+#  courses, programs and so on.
+#
+#  Copyright (C) 2015-2026 Université catholique de Louvain (http://www.uclouvain.be)
+#
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  A copy of this license - GNU General Public License - is available
+#  at the root of the source code of this program.  If not,
+#  see http://www.gnu.org/licenses/.
+#
+# ##############################################################################
+import threading
+import time
+from email.utils import getaddresses
+from functools import lru_cache
+from typing import Callable, Dict, Optional
+
+from django.conf import settings
+from django.core.cache import BaseCache, caches
+
+
+class TokenBucket:
+    """Thread-safe token bucket allowing `rate` acquisitions per second on average, with
+    bursts of up to `capacity` acquisitions."""
+
+    def __init__(
+        self,
+        rate: float,
+        capacity: Optional[float] = None,
+        clock: Optional[Callable[[], float]] = None,
+        sleep: Optional[Callable[[float], None]] = None,
+    ):
+        self.rate = rate
+        self.capacity = capacity or max(rate, 1)
+        self._clock = clock or time.monotonic
+        self._sleep = sleep or time.sleep
+        self._tokens = self.capacity
+        self._updated_at = self._clock()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """Take a token, waiting until one is available."""
+
+        with self._lock:
+            current_time = self._clock()
+            self._tokens = min(self.capacity, self._tokens + (current_time - self._updated_at) * self.rate)
+            self._updated_at = current_time
+            # The token is reserved right away, so that the other threads wait after us
+            self._tokens -= 1
+            wait = -self._tokens / self.rate if self._tokens < 0 else 0
+        if wait:
+            self._sleep(wait)
+
+
+class CacheBucket:
+    """Bucket allowing `rate` acquisitions per second on average to all the processes
+    sharing the given cache, by counting the acquisitions of fixed windows (of one
+    second, or more for the rates below one per second) in the cache. Up to twice the
+    acquisitions of a window are allowed across the boundary of two windows."""
+
+    def __init__(
+        self,
+        cache: BaseCache,
+        key: str,
+        rate: float,
+        clock: Optional[Callable[[], float]] = None,
+        sleep: Optional[Callable[[float], None]] = None,
+    ):
+        self.cache = cache
+        self.key = key
+        self.window = max(1.0, 1 / rate)
+        self.limit = max(1, int(rate * self.window))
+        # Wall clock time, shared by the processes
+        self._clock = clock or time.time
+        self._sleep = sleep or time.sleep
+
+    def acquire(self):
+        """Take a token, waiting until one is available."""
+
+        while True:
+            current_time = self._clock()
+            window = int(current_time // self.window)
+            key = f"{self.key}:{window}"
+            self.cache.add(key, 0, timeout=int(self.window) + 60)
+            try:
+                count = self.cache.incr(key)
+            except ValueError:
+                # Expired in the meantime
+                continue
+            if count <= self.limit:
+                return
+            self._sleep((window + 1) * self.window - current_time)
+
+
+class RateLimiter:
+    """Throttle the sending of the email notifications, with a token bucket per mail
+    sender class and per recipient domain.
+
+    Without cache, the buckets are only shared by the threads of the current process:
+    each process sending emails gets the whole rates. A rate of 0 (or less) disables
+    the limit."""
+
+    def __init__(
+        self,
+        sender_rates: Dict[str, float],
+        domain_rates: Dict[str, float],
+        cache: Optional[BaseCache] = None,
+    ):
+        """
+        :param sender_rates: The maximum number of messages per second, by mail sender class.
+        :param domain_rates: The maximum number of messages per second, by recipient domain.
+        :param cache: The cache where the buckets are shared by all the processes."""
+
+        def bucket(name, rate):
+            if cache is None:
+                return TokenBucket(rate)
+            return CacheBucket(cache, f"osis_notification:rate_limit:{name}", rate)
+
+        self.sender_buckets = {sender: bucket(sender, rate) for sender, rate in sender_rates.items() if rate > 0}
+        self.domain_buckets = {
+            domain.lower(): bucket(domain.lower(), rate) for domain, rate in domain_rates.items() if rate > 0
+        }
+
+    def wait_for_sender(self, mail_sender_class: str):
+        """Wait until a message can be sent with the given mail sender class."""
+
+        bucket = self.sender_buckets.get(mail_sender_class)
+        if bucket is not None:
+            bucket.acquire()
+
+    def wait_for_recipients(self, *addresses: Optional[str]):
+        """Wait until a message can be sent to the domains of the given addresses (the
+        values of the To and Cc headers, with one or more addresses each)."""
+
+        domains = {
+            email.rpartition("@")[2].lower() for _, email in getaddresses([address for address in addresses if address])
+        }
+        for domain in sorted(domains):
+            bucket = self.domain_buckets.get(domain)
+            if bucket is not None:
+                bucket.acquire()
+
+
+@lru_cache(maxsize=None)
+def get_rate_limiter() -> RateLimiter:
+    """Return the rate limiter configured by `settings.EMAIL_NOTIFICATIONS_RATE_LIMITS` and
+    `settings.EMAIL_NOTIFICATIONS_DOMAIN_RATE_LIMITS`, shared by all the threads, and by
+    all the processes through the cache `settings.EMAIL_NOTIFICATIONS_RATE_LIMITS_CACHE`
+    (the alias of one of the `settings.CACHES`) if set."""
+
+    alias = getattr(settings, "EMAIL_NOTIFICATIONS_RATE_LIMITS_CACHE", None)
+    return RateLimiter(
+        getattr(settings, "EMAIL_NOTIFICATIONS_RATE_LIMITS", {}),
+        getattr(settings, "EMAIL_NOTIFICATIONS_DOMAIN_RATE_LIMITS", {}),
+        cache=caches[alias] if alias else None,
+    )
+
+
+def clear_rate_limiter_cache(setting, **kwargs):
+    """Clear the rate limiter cache when its settings change."""
+
+    if setting in (
+        "EMAIL_NOTIFICATIONS_RATE_LIMITS",
+        "EMAIL_NOTIFICATIONS_DOMAIN_RATE_LIMITS",
+        "EMAIL_NOTIFICATIONS_RATE_LIMITS_CACHE",
+    ):
+        get_rate_limiter.cache_clear()
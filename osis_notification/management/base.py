@@ -0,0 +1,155 @@
+import os
+import time
+from contextlib import ExitStack
+from functools import partial
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils.timezone import now
+
+from osis_notification.contrib import archive, partitioning
+from osis_notification.contrib.cache import invalidate_cache
+from osis_notification.models import Notification, NotificationCounter, NotificationPayload
+
+
+class CleanNotificationsCommand(BaseCommand):
+    """Base command deleting the notifications returned by `get_queryset` in batches.
+
+    Each batch is deleted with a single short `DELETE ... WHERE id IN (...)` statement
+    so that the table is never locked for long and the replicas can keep up. An
+    optional pause between the batches and a time budget allow to run the cleaning
+    during business hours.
+
+    If `OSIS_NOTIFICATION_PARTITIONING` is set and the notification table is
+    partitioned, the monthly partitions whose notifications can all be deleted are
+    dropped first.
+
+    With an archive directory, the notifications are written to a compressed JSON
+    lines file before being deleted (see the restore_notifications command).
+    """
+
+    # Prefix of the archive file names
+    archive_name = "notifications"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=getattr(settings, "OSIS_NOTIFICATION_CLEANING_BATCH_SIZE", 1000),
+            help="Number of notifications deleted per query.",
+        )
+        parser.add_argument(
+            "--sleep",
+            type=float,
+            default=getattr(settings, "OSIS_NOTIFICATION_CLEANING_SLEEP_SECONDS", 0),
+            help="Number of seconds to wait between two batches.",
+        )
+        parser.add_argument(
+            "--time-budget",
+            type=float,
+            default=getattr(settings, "OSIS_NOTIFICATION_CLEANING_TIME_BUDGET_SECONDS", None),
+            help="Stop after this number of seconds, the next run will go on with the remaining notifications.",
+        )
+        parser.add_argument(
+            "--archive-dir",
+            default=getattr(settings, "OSIS_NOTIFICATION_ARCHIVE_DIR", None),
+            help="Directory where the notifications are archived before being deleted.",
+        )
+        parser.add_argument(
+            "--dry-run",
+            action="store_true",
+            help="Only count the notifications that would be deleted.",
+        )
+
+    def get_queryset(self):
+        """Returns the notifications to delete."""
+        raise NotImplementedError
+
+    def handle(self, *args, **options):
+        queryset = self.get_queryset()
+        partitioned = getattr(settings, "OSIS_NOTIFICATION_PARTITIONING", False) and partitioning.is_partitioned()
+        if options["dry_run"]:
+            if partitioned:
+                for name, _, _ in partitioning.get_expired_partitions():
+                    self.stdout.write(f"Partition {name} would be dropped.")
+            self.stdout.write(f"{queryset.count()} notifications would be deleted.")
+            return
+
+        with ExitStack() as stack:
+            archive_file = None
+            if options["archive_dir"]:
+                archive_file = stack.enter_context(self.open_archive(options["archive_dir"]))
+            if partitioned:
+                for name in partitioning.drop_expired_partitions(
+                    before_drop=self.before_partition_drop,
+                    before_lock=partial(self.archive_notifications, archive_file) if archive_file is not None else None,
+                ):
+                    self.stdout.write(f"Partition {name} dropped.")
+
+            deadline = None
+            if options["time_budget"] is not None:
+                deadline = time.monotonic() + options["time_budget"]
+            deleted = self.delete_in_batches(queryset, options, deadline, archive_file)
+        self.stdout.write(f"{deleted} notifications deleted.")
+        # Remove the payloads that are not used by any notification anymore
+        self.delete_in_batches(NotificationPayload.objects.unused(), options, deadline)
+
+    def before_delete(self, notifications):
+        """Called with each batch of notifications before deleting it."""
+
+    def before_partition_drop(self, notifications):
+        """Called with the notifications of a partition before dropping it."""
+        NotificationCounter.objects.discount(notifications)
+        invalidate_cache(notifications.values_list("person_id", flat=True).order_by().distinct())
+
+    def archive_notifications(self, archive_file, notifications):
+        """Write the given notifications to the archive file, and to the disk before
+        they are deleted."""
+        archive.write_archive(archive_file, notifications)
+        archive.sync_archive(archive_file)
+
+    def open_archive(self, archive_dir):
+        os.makedirs(archive_dir, exist_ok=True)
+        path = os.path.join(archive_dir, f"{self.archive_name}-{now():%Y%m%d%H%M%S}.jsonl.gz")
+        self.stdout.write(f"Archiving the notifications to {path}.")
+        return archive.open_archive(path, "wt")
+
+    def delete_in_batches(self, queryset, options, deadline=None, archive_file=None):
+        """Delete the rows of the given queryset in batches and return the number of
+        deleted rows. Stop when the deadline is exceeded. The notifications of each
+        batch are written to the archive file, if any, before being deleted.
+
+        The notifications of each batch that still match the queryset are locked, then
+        archived, passed to `before_delete` and deleted in the same transaction, so that
+        the counters only lose the notifications that are actually deleted."""
+
+        batch_size = options["batch_size"]
+        model = queryset.model
+        deleted = 0
+        while deadline is None or time.monotonic() < deadline:
+            pks = list(queryset.order_by("pk").values_list("pk", flat=True)[:batch_size])
+            if not pks:
+                break
+            if model is NotificationPayload:
+                # Some of them may have been used again in the meantime
+                deleted += NotificationPayload.objects.delete_unused(pks)
+            else:
+                with transaction.atomic():
+                    # Some of them may have been changed (e.g. marked as unread) in the meantime
+                    locked_pks = list(
+                        queryset.filter(pk__in=pks).select_for_update(of=("self",)).values_list("pk", flat=True)
+                    )
+                    notifications = Notification.objects.filter(pk__in=locked_pks)
+                    if archive_file is not None:
+                        self.archive_notifications(archive_file, notifications)
+                    self.before_delete(notifications)
+                    model._base_manager.filter(pk__in=locked_pks).delete()
+                deleted += len(locked_pks)
+            if options["verbosity"] > 1:
+                self.stdout.write(f"{deleted} {model._meta.verbose_name_plural} deleted...")
+            if len(pks) < batch_size:
+                break
+            if options["sleep"]:
+                time.sleep(options["sleep"])
+        return deleted
@@ -0,0 +1,58 @@
+import time
+import zlib
+
+from django.core.management.base import BaseCommand
+
+from osis_notification.models import NotificationPayload
+
+
+class Command(BaseCommand):
+    help = (
+        "Measure the size and CPU trade-offs of the payload compression on a sample of "
+        "the existing notification payloads."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--sample",
+            type=int,
+            default=1000,
+            help="Number of the most recent payloads to measure.",
+        )
+        parser.add_argument(
+            "--levels",
+            type=int,
+            nargs="+",
+            default=[1, 6, 9],
+            help="zlib compression levels to compare.",
+        )
+
+    def handle(self, *args, **options):
+        payloads = [
+            payload.encode("utf-8")
+            for payload in NotificationPayload.objects.order_by("-pk").values_list("content", flat=True)[
+                : options["sample"]
+            ]
+        ]
+        if not payloads:
+            self.stdout.write("No payload to measure.")
+            return
+
+        raw_size = sum(len(payload) for payload in payloads)
+        self.stdout.write(f"{len(payloads)} payloads, {raw_size} bytes uncompressed")
+        for level in options["levels"]:
+            start = time.perf_counter()
+            compressed = [zlib.compress(payload, level) for payload in payloads]
+            compression_time = time.perf_counter() - start
+
+            start = time.perf_counter()
+            for payload in compressed:
+                zlib.decompress(payload)
+            decompression_time = time.perf_counter() - start
+
+            compressed_size = sum(len(payload) for payload in compressed)
+            self.stdout.write(
+                f"level {level}: {compressed_size} bytes ({compressed_size / raw_size:.1%}), "
+                f"compression {compression_time / len(payloads) * 1e6:.1f} µs/payload, "
+                f"decompression {decompression_time / len(payloads) * 1e6:.1f} µs/payload"
+            )
@@ -0,0 +1,35 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils.timezone import now
+
+from osis_notification.contrib.handlers import EmailNotificationHandler
+from osis_notification.models import EmailNotification
+
+
+class Command(BaseCommand):
+    help = (
+        "Group the pending digest email notifications of each person in a single email "
+        "notification (per recipients), once the oldest one has been waiting for the defined window."
+    )
+
+    def handle(self, *args, **options):
+        window = timedelta(minutes=getattr(settings, "EMAIL_NOTIFICATIONS_DIGEST_WINDOW_MINUTES", 60))
+        person_ids = list(
+            EmailNotification.objects.pending_digests()
+            .filter(created_at__lte=now() - window)
+            .order_by()
+            .values_list("person_id", flat=True)
+            .distinct()
+        )
+        for person_id in person_ids:
+            with transaction.atomic():
+                notifications = list(
+                    EmailNotification.objects.pending_digests()
+                    .filter(person_id=person_id)
+                    .select_for_update(skip_locked=True, of=("self",))
+                )
+                if notifications:
+                    EmailNotificationHandler.create_digests(notifications)
@@ -1,24 +1,30 @@
 from datetime import timedelta
 
 from django.conf import settings
-from django.core.management.base import BaseCommand
 from django.utils.timezone import now
 
-from osis_notification.models import WebNotification
+from osis_notification.contrib.cache import invalidate_cache
+from osis_notification.management.base import CleanNotificationsCommand
+from osis_notification.models import NotificationCounter, WebNotification
 from osis_notification.models.enums import NotificationStates
 
 
-class Command(BaseCommand):
+class Command(CleanNotificationsCommand):
     help = (
         "Clean all the read web notifications that are older than the defined "
         "retention duration. "
     )
+    archive_name = "web_notifications"
 
-    def handle(self, *args, **options):
+    def get_queryset(self):
         maximum_retention_date = now() - timedelta(
             days=settings.WEB_NOTIFICATIONS_RETENTION_DAYS
         )
-        WebNotification.objects.filter(
+        return WebNotification.objects.filter(
             state=NotificationStates.READ_STATE.name,
             read_at__lte=maximum_retention_date,
-        ).delete()
+        )
+
+    def before_delete(self, notifications):
+        NotificationCounter.objects.discount(notifications)
+        invalidate_cache(notifications.values_list("person_id", flat=True).order_by().distinct())
@@ -0,0 +1,46 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.timezone import now
+
+from osis_notification.contrib import partitioning
+
+
+class Command(BaseCommand):
+    help = (
+        "Create the monthly partitions of the notification table for the coming months "
+        "(PostgreSQL only). With --convert, convert the notification table to a "
+        "partitioned table first."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--months-ahead",
+            type=int,
+            default=getattr(settings, "OSIS_NOTIFICATION_PARTITIONS_MONTHS_AHEAD", 3),
+            help="Number of months to create partitions for, after the current one.",
+        )
+        parser.add_argument(
+            "--convert",
+            action="store_true",
+            help="Convert the notification table to a partitioned table, copying all its rows.",
+        )
+
+    def handle(self, *args, **options):
+        if options["convert"]:
+            if partitioning.is_partitioned():
+                raise CommandError("The notification table is already partitioned.")
+            try:
+                partitioning.partition_table(options["months_ahead"])
+            except ValueError as e:
+                raise CommandError(str(e))
+            self.stdout.write("The notification table has been partitioned.")
+        elif not partitioning.is_partitioned():
+            raise CommandError("The notification table is not partitioned, use --convert to partition it.")
+
+        current_time = now()
+        for name in partitioning.create_partitions(
+            current_time, current_time + timedelta(days=31 * options["months_ahead"])
+        ):
+            self.stdout.write(f"Partition {name} created.")
@@ -0,0 +1,84 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count, Q
+from django.utils.timezone import now
+
+from osis_notification.models import EmailNotification, WebNotification
+from osis_notification.models.enums import NotificationStates
+
+
+class Command(BaseCommand):
+    help = (
+        "Print the query plans of the hot notification queries (sending, listing and "
+        "cleaning), to check that they use the notification indexes."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--analyze",
+            action="store_true",
+            help="Execute the queries to report the actual timings (PostgreSQL only).",
+        )
+        parser.add_argument(
+            "--person-id",
+            type=int,
+            help="Person whose web notifications are listed (defaults to the most notified one).",
+        )
+
+    def get_queries(self, person_id):
+        current_time = now()
+        sent_web_notifications = WebNotification.objects.sent().filter(person_id=person_id)
+        lease = timedelta(seconds=getattr(settings, "EMAIL_NOTIFICATIONS_LEASE_SECONDS", 600))
+        return {
+            # The queries of EmailNotification.objects.claim()
+            "abandoned email notifications claim": (
+                EmailNotification.objects.abandoned(current_time - lease)
+                .select_for_update(skip_locked=True, of=("self",))[:100]
+            ),
+            "pending email notifications claim": (
+                EmailNotification.objects.pending().select_for_update(skip_locked=True, of=("self",))[:100]
+            ),
+            "pending web notifications": WebNotification.objects.pending(),
+            "web notification list": sent_web_notifications[:15],
+            "web notification counts": (
+                sent_web_notifications.values("person_id")
+                .annotate(
+                    count=Count("id"),
+                    unread_count=Count("id", filter=Q(state=NotificationStates.SENT_STATE.name)),
+                )
+                .order_by()
+                .values("count", "unread_count")
+            ),
+            "email notifications cleaning": EmailNotification.objects.filter(
+                state=NotificationStates.SENT_STATE.name,
+                sent_at__lte=current_time - timedelta(days=settings.EMAIL_NOTIFICATIONS_RETENTION_DAYS),
+            ),
+            "web notifications cleaning": WebNotification.objects.filter(
+                state=NotificationStates.READ_STATE.name,
+                read_at__lte=current_time - timedelta(days=settings.WEB_NOTIFICATIONS_RETENTION_DAYS),
+            ),
+        }
+
+    def handle(self, *args, **options):
+        person_id = options["person_id"]
+        if person_id is None:
+            person_id = (
+                WebNotification.objects.filter(person__isnull=False)
+                .values("person_id")
+                .annotate(count=Count("id"))
+                .order_by("-count")
+                .values_list("person_id", flat=True)
+                .first()
+            )
+
+        explain_options = {"analyze": True} if options["analyze"] else {}
+        for name, queryset in self.get_queries(person_id).items():
+            self.stdout.write(self.style.MIGRATE_HEADING(name))
+            # Rolled back, as the analyzed queries are executed (and lock the claimed rows)
+            with transaction.atomic():
+                self.stdout.write(queryset.explain(**explain_options))
+                transaction.set_rollback(True)
+            self.stdout.write("")
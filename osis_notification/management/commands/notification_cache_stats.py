@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from osis_notification.contrib.cache import CacheStats, get_cache
+
+
+class Command(BaseCommand):
+    help = (
+        "Show the hits, misses and hit rate of the notification cache, for all the processes, "
+        "since the last reset (each process reports its lookups every 100 lookups)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--reset",
+            action="store_true",
+            help="Reset the statistics after showing them.",
+        )
+
+    def handle(self, *args, **options):
+        cache = get_cache()
+        if cache is None:
+            raise CommandError("The notification cache is disabled (settings.OSIS_NOTIFICATION_CACHE).")
+        hits, misses = CacheStats.totals(cache)
+        hit_rate = hits / (hits + misses) if hits + misses else 0
+        self.stdout.write(f"{hits} hits, {misses} misses, hit rate: {hit_rate:.1%}")
+        if options["reset"]:
+            CacheStats.reset(cache)
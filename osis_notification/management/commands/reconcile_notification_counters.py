@@ -0,0 +1,29 @@
+from django.core.management.base import BaseCommand
+
+from osis_notification.models import NotificationCounter
+
+
+class Command(BaseCommand):
+    help = (
+        "Compute the web notification counters of the persons from their notifications, "
+        "fixing the counters that drifted."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--person-id",
+            type=int,
+            nargs="+",
+            dest="person_ids",
+            help="Persons whose counters are computed (default to all the persons).",
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=1000,
+            help="Number of persons whose counters are computed per query.",
+        )
+
+    def handle(self, *args, **options):
+        fixed = NotificationCounter.objects.recount(options["person_ids"], batch_size=options["batch_size"])
+        self.stdout.write(f"{fixed} notification counters fixed.")
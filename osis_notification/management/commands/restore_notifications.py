@@ -0,0 +1,38 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from osis_notification.contrib import archive
+
+
+class Command(BaseCommand):
+    help = (
+        "Load back the notifications of the archives written by the cleaning commands. "
+        "The notifications that already exist or whose person does not exist anymore are "
+        "skipped. The restored notifications are deleted again by the next cleaning, "
+        "unless the retention durations were increased or --redate is given."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("archives", nargs="+", help="Paths of the archive files.")
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=getattr(settings, "OSIS_NOTIFICATION_BULK_CREATE_BATCH_SIZE", 1000),
+            help="Number of notifications inserted per query.",
+        )
+        parser.add_argument(
+            "--redate",
+            action="store_true",
+            help="Set the sending and reading dates of the restored notifications to now, "
+            "to keep them for the whole retention durations.",
+        )
+
+    def handle(self, *args, **options):
+        for path in options["archives"]:
+            with archive.open_archive(path) as archive_file:
+                restored, skipped = archive.restore(
+                    archive.read_archive(archive_file),
+                    options["batch_size"],
+                    redate=options["redate"],
+                )
+            self.stdout.write(f"{path}: {restored} notifications restored, {skipped} skipped.")
@@ -1,4 +1,9 @@
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.conf import settings
 from django.core.management.base import BaseCommand
+from django.db import connections
 
 from osis_notification.contrib.handlers import EmailNotificationHandler
 from osis_notification.contrib.exceptions import EmailNotificationSendingException
@@ -6,16 +11,63 @@ from osis_notification.models import EmailNotification
 
 
 class Command(BaseCommand):
-    help = "Send all the email notifications."
+    help = (
+        "Send all the email notifications. Several instances of this command can run "
+        "at the same time, each one claiming its own batches of notifications."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=getattr(settings, "EMAIL_NOTIFICATIONS_BATCH_SIZE", 100),
+            help="Number of notifications claimed at once.",
+        )
+        parser.add_argument(
+            "--concurrency",
+            type=int,
+            default=getattr(settings, "EMAIL_NOTIFICATIONS_SENDING_CONCURRENCY", 1),
+            help="Number of threads sending the notifications.",
+        )
 
     def handle(self, *args, **options):
-        exceptions = {}
+        batch_size = options["batch_size"]
+        concurrency = options["concurrency"]
+        lease = timedelta(seconds=getattr(settings, "EMAIL_NOTIFICATIONS_LEASE_SECONDS", 600))
 
-        for notification in EmailNotification.objects.pending():
-            try:
-                EmailNotificationHandler.process(notification)
-            except Exception as exception:
-                exceptions[notification.uuid] = exception
+        if concurrency > 1:
+            exceptions = {}
+            with ThreadPoolExecutor(max_workers=concurrency) as executor:
+                futures = [
+                    executor.submit(self.send_in_thread, batch_size, lease)
+                    for _ in range(concurrency)
+                ]
+                for future in futures:
+                    exceptions.update(future.result())
+        else:
+            exceptions = self.send(batch_size, lease)
 
         if exceptions:
             raise EmailNotificationSendingException(exceptions)
+
+    def send_in_thread(self, batch_size, lease):
+        try:
+            return self.send(batch_size, lease)
+        finally:
+            # Each thread has its own database connection, close it once done
+            connections.close_all()
+
+    @staticmethod
+    def send(batch_size, lease):
+        """Claim and send batches of notifications until there is none left.
+
+        :return: The exceptions raised while sending the notifications, by uuid."""
+
+        exceptions = {}
+        while True:
+            # Notifications failing to be sent are rescheduled with a backoff, so they
+            # will not be claimed again during this run
+            notifications = EmailNotification.objects.claim(batch_size, lease)
+            exceptions.update(EmailNotificationHandler.process_many(notifications))
+            if len(notifications) < batch_size:
+                return exceptions
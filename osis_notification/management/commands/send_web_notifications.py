@@ -1,12 +1,19 @@
+from django.conf import settings
 from django.core.management.base import BaseCommand
 
 from osis_notification.contrib.handlers import WebNotificationHandler
-from osis_notification.models import WebNotification
 
 
 class Command(BaseCommand):
     help = "Send all the web notifications."
 
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=getattr(settings, "WEB_NOTIFICATIONS_BATCH_SIZE", 1000),
+            help="Number of web notifications sent per query.",
+        )
+
     def handle(self, *args, **options):
-        for notification in WebNotification.objects.pending():
-            WebNotificationHandler.process(notification)
+        WebNotificationHandler.process_pending(options["batch_size"])
@@ -0,0 +1,23 @@
+# Generated by Django 3.2.16 on 2026-10-17 09:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('osis_notification', '0002_person_optional'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='notification',
+            name='claimed_at',
+            field=models.DateTimeField(editable=False, null=True, verbose_name='Claimed at'),
+        ),
+        migrations.AlterField(
+            model_name='notification',
+            name='state',
+            field=models.CharField(choices=[('PENDING_STATE', 'Pending'), ('PROCESSING_STATE', 'Processing'), ('SENT_STATE', 'Sent'), ('READ_STATE', 'Read')], default='PENDING_STATE', max_length=25, verbose_name='State'),
+        ),
+    ]
@@ -0,0 +1,92 @@
+# Generated by Django 3.2.16 on 2026-10-17 10:03
+
+import email
+import json
+from email.header import decode_header, make_header
+from email.message import EmailMessage
+from email.policy import default as default_policy
+from html import unescape
+
+from django.conf import settings
+from django.db import migrations
+from django.utils.html import strip_tags
+
+BATCH_SIZE = 1000
+
+
+def _serialize(payload):
+    message = email.message_from_string(payload, policy=default_policy)
+    plain_text_content = ''
+    html_content = ''
+    for part in message.walk():
+        if part.get_content_type() == "text/plain":
+            plain_text_content = part.get_payload(decode=True).decode(settings.DEFAULT_CHARSET)
+        elif part.get_content_type() == "text/html":
+            html_content = part.get_payload(decode=True).decode(settings.DEFAULT_CHARSET)
+    cc = message.get("Cc")
+    return json.dumps(
+        {
+            "subject": unescape(strip_tags(str(make_header(decode_header(str(message.get("subject", ""))))))),
+            "to": str(message.get("to", "")),
+            "cc": str(cc) if cc else None,
+            "from": str(message.get("from", settings.DEFAULT_FROM_EMAIL)),
+            "plain_text_content": plain_text_content.rstrip(),
+            "html_content": html_content.rstrip(),
+        }
+    )
+
+
+def _deserialize(payload):
+    content = json.loads(payload)
+    message = EmailMessage(policy=default_policy)
+    message.set_charset(settings.DEFAULT_CHARSET)
+    message.set_content(content["plain_text_content"])
+    if content["html_content"]:
+        message.add_alternative(content["html_content"], subtype="html")
+    message["Subject"] = content["subject"]
+    message["From"] = content["from"]
+    message["To"] = content["to"]
+    if content["cc"]:
+        message["Cc"] = content["cc"]
+    return str(message)
+
+
+def _convert_payloads(apps, convert, is_converted):
+    # Each batch is committed on its own, the converted payloads are skipped when the
+    # migration is run again after an interruption
+    Notification = apps.get_model('osis_notification', 'Notification')
+    last_pk = 0
+    while True:
+        batch = list(
+            Notification.objects.filter(type='EMAIL_TYPE', pk__gt=last_pk).only('pk', 'payload').order_by('pk')[
+                :BATCH_SIZE
+            ]
+        )
+        if not batch:
+            break
+        last_pk = batch[-1].pk
+        converted = [notification for notification in batch if not is_converted(notification.payload)]
+        for notification in converted:
+            notification.payload = convert(notification.payload)
+        Notification.objects.bulk_update(converted, ['payload'])
+
+
+def serialize_email_payloads(apps, schema_editor):
+    _convert_payloads(apps, _serialize, lambda payload: payload.startswith('{'))
+
+
+def deserialize_email_payloads(apps, schema_editor):
+    _convert_payloads(apps, _deserialize, lambda payload: not payload.startswith('{'))
+
+
+class Migration(migrations.Migration):
+    # Not to lock the whole notification table until all the payloads are converted
+    atomic = False
+
+    dependencies = [
+        ('osis_notification', '0003_notification_claimed_at'),
+    ]
+
+    operations = [
+        migrations.RunPython(serialize_email_payloads, deserialize_email_payloads),
+    ]
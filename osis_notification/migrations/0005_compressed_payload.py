@@ -0,0 +1,69 @@
+# Generated by Django 3.2.16 on 2026-10-17 10:41
+
+from django.db import migrations, models
+
+import osis_notification.models.fields
+
+BATCH_SIZE = 1000
+
+
+def _copy_payloads(apps, from_field, to_field):
+    # Each batch is committed on its own, the copied payloads are skipped when the
+    # migration is run again after an interruption
+    Notification = apps.get_model('osis_notification', 'Notification')
+    while True:
+        batch = list(
+            Notification.objects.filter(**{f'{to_field}__isnull': True})
+            .only('pk', from_field)
+            .order_by('pk')[:BATCH_SIZE]
+        )
+        if not batch:
+            break
+        for notification in batch:
+            setattr(notification, to_field, getattr(notification, from_field))
+        Notification.objects.bulk_update(batch, [to_field])
+
+
+def compress_payloads(apps, schema_editor):
+    _copy_payloads(apps, 'payload', 'compressed_payload')
+
+
+def decompress_payloads(apps, schema_editor):
+    _copy_payloads(apps, 'compressed_payload', 'payload')
+
+
+class Migration(migrations.Migration):
+    # Not to lock the whole notification table until all the payloads are copied
+    atomic = False
+
+    dependencies = [
+        ('osis_notification', '0004_email_notification_structured_payload'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='notification',
+            name='compressed_payload',
+            field=osis_notification.models.fields.CompressedTextField(null=True, verbose_name='Payload'),
+        ),
+        migrations.AlterField(
+            model_name='notification',
+            name='payload',
+            field=models.TextField(null=True, verbose_name='Payload'),
+        ),
+        migrations.RunPython(compress_payloads, decompress_payloads),
+        migrations.RemoveField(
+            model_name='notification',
+            name='payload',
+        ),
+        migrations.RenameField(
+            model_name='notification',
+            old_name='compressed_payload',
+            new_name='payload',
+        ),
+        migrations.AlterField(
+            model_name='notification',
+            name='payload',
+            field=osis_notification.models.fields.CompressedTextField(verbose_name='Payload'),
+        ),
+    ]
@@ -0,0 +1,91 @@
+# Generated by Django 3.2.16 on 2026-10-17 11:27
+
+import hashlib
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+import osis_notification.models.fields
+
+BATCH_SIZE = 1000
+
+
+def _store_batch(NotificationPayload, Notification, batch):
+    contents = {hashlib.sha256(n.payload.encode('utf-8')).hexdigest(): n.payload for n in batch}
+    NotificationPayload.objects.bulk_create(
+        [NotificationPayload(digest=digest, content=content) for digest, content in contents.items()],
+        ignore_conflicts=True,
+    )
+    payload_ids = dict(NotificationPayload.objects.filter(digest__in=contents).values_list('digest', 'pk'))
+    for notification in batch:
+        notification.stored_payload_id = payload_ids[hashlib.sha256(notification.payload.encode('utf-8')).hexdigest()]
+    Notification.objects.bulk_update(batch, ['stored_payload'])
+
+
+def deduplicate_payloads(apps, schema_editor):
+    # Each batch is committed on its own, the stored payloads are skipped when the
+    # migration is run again after an interruption
+    Notification = apps.get_model('osis_notification', 'Notification')
+    NotificationPayload = apps.get_model('osis_notification', 'NotificationPayload')
+    while True:
+        batch = list(
+            Notification.objects.filter(stored_payload__isnull=True).only('pk', 'payload').order_by('pk')[:BATCH_SIZE]
+        )
+        if not batch:
+            break
+        _store_batch(NotificationPayload, Notification, batch)
+
+
+def restore_payloads(apps, schema_editor):
+    Notification = apps.get_model('osis_notification', 'Notification')
+    while True:
+        batch = list(
+            Notification.objects.filter(payload__isnull=True).select_related('stored_payload').order_by('pk')[
+                :BATCH_SIZE
+            ]
+        )
+        if not batch:
+            break
+        for notification in batch:
+            notification.payload = notification.stored_payload.content
+        Notification.objects.bulk_update(batch, ['payload'])
+
+
+class Migration(migrations.Migration):
+    # Not to lock the whole notification table until all the payloads are stored
+    atomic = False
+
+    dependencies = [
+        ('osis_notification', '0005_compressed_payload'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='NotificationPayload',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('digest', models.CharField(editable=False, max_length=64, unique=True)),
+                ('content', osis_notification.models.fields.CompressedTextField(verbose_name='Content')),
+            ],
+        ),
+        migrations.AddField(
+            model_name='notification',
+            name='stored_payload',
+            field=models.ForeignKey(null=True, on_delete=django.db.models.deletion.PROTECT, related_name='notifications', to='osis_notification.notificationpayload', verbose_name='Payload'),
+        ),
+        migrations.AlterField(
+            model_name='notification',
+            name='payload',
+            field=osis_notification.models.fields.CompressedTextField(null=True, verbose_name='Payload'),
+        ),
+        migrations.RunPython(deduplicate_payloads, restore_payloads),
+        migrations.RemoveField(
+            model_name='notification',
+            name='payload',
+        ),
+        migrations.AlterField(
+            model_name='notification',
+            name='stored_payload',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='notifications', to='osis_notification.notificationpayload', verbose_name='Payload'),
+        ),
+    ]
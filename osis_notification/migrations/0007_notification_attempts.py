@@ -0,0 +1,28 @@
+# Generated by Django 3.2.16 on 2026-10-17 13:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('osis_notification', '0006_notification_payload'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='notification',
+            name='attempts',
+            field=models.PositiveSmallIntegerField(default=0, editable=False, verbose_name='Attempts'),
+        ),
+        migrations.AddField(
+            model_name='notification',
+            name='next_attempt_at',
+            field=models.DateTimeField(editable=False, null=True, verbose_name='Next attempt at'),
+        ),
+        migrations.AlterField(
+            model_name='notification',
+            name='state',
+            field=models.CharField(choices=[('PENDING_STATE', 'Pending'), ('PROCESSING_STATE', 'Processing'), ('SENT_STATE', 'Sent'), ('READ_STATE', 'Read'), ('FAILED_STATE', 'Failed')], default='PENDING_STATE', max_length=25, verbose_name='State'),
+        ),
+    ]
@@ -0,0 +1,22 @@
+# Generated by Django 3.2.16 on 2026-10-17 14:22
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('osis_notification', '0007_notification_attempts'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='notification',
+            name='priority',
+            field=models.PositiveSmallIntegerField(choices=[(0, 'Low'), (50, 'Normal'), (100, 'High')], default=50, verbose_name='Priority'),
+        ),
+        migrations.AddIndex(
+            model_name='notification',
+            index=models.Index(fields=['state', '-priority', 'created_at'], name='notification_priority_idx'),
+        ),
+    ]
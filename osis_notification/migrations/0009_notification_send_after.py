@@ -0,0 +1,23 @@
+# Generated by Django 3.2.16 on 2026-10-17 15:01
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('osis_notification', '0008_notification_priority'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='notification',
+            name='send_after',
+            field=models.DateTimeField(default=django.utils.timezone.now, verbose_name='Send after'),
+        ),
+        migrations.AddIndex(
+            model_name='notification',
+            index=models.Index(condition=models.Q(('state', 'PENDING_STATE')), fields=['send_after'], name='notification_due_idx'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 3.2.16 on 2026-10-17 15:48
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('osis_notification', '0009_notification_send_after'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='notification',
+            name='digest',
+            field=models.BooleanField(default=False, help_text='Whether the notification can be grouped with others in a digest', verbose_name='Digest'),
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 3.2.16 on 2026-10-17 16:30
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('osis_notification', '0010_notification_digest'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='notification',
+            name='notification_priority_idx',
+        ),
+        migrations.AddIndex(
+            model_name='notification',
+            index=models.Index(condition=models.Q(('state', 'PENDING_STATE')), fields=['type', '-priority', 'created_at'], name='notification_pending_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='notification',
+            index=models.Index(condition=models.Q(('state__in', ['SENT_STATE', 'READ_STATE']), ('type', 'WEB_TYPE')), fields=['person', '-created_at'], name='notification_web_list_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='notification',
+            index=models.Index(condition=models.Q(('state', 'SENT_STATE'), ('type', 'EMAIL_TYPE')), fields=['sent_at'], name='notification_email_clean_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='notification',
+            index=models.Index(condition=models.Q(('state', 'READ_STATE'), ('type', 'WEB_TYPE')), fields=['read_at'], name='notification_web_clean_idx'),
+        ),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 3.2.16 on 2026-10-17 17:10
+
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('base', '0001_initial'),
+        ('osis_notification', '0011_notification_query_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='NotificationCounter',
+            fields=[
+                ('person', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='+', serialize=False, to='base.person')),
+                ('total', models.IntegerField(default=0, verbose_name='Total')),
+                ('unread', models.IntegerField(default=0, verbose_name='Unread')),
+                ('updated_at', models.DateTimeField(default=django.utils.timezone.now, verbose_name='Updated at')),
+            ],
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 3.2.16 on 2026-10-17 18:02
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('osis_notification', '0012_notificationcounter'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='notification',
+            name='grouped_in',
+            field=models.UUIDField(editable=False, help_text='The uuid of the digest notification in which the notification was sent', null=True, verbose_name='Grouped in'),
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 3.2.16 on 2026-10-17 19:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('osis_notification', '0013_notification_grouped_in'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='notification',
+            index=models.Index(condition=models.Q(('state', 'PROCESSING_STATE')), fields=['claimed_at'], name='notification_processing_idx'),
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 3.2.16 on 2026-10-17 21:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('osis_notification', '0014_notification_processing_idx'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='notification',
+            index=models.Index(condition=models.Q(('grouped_in__isnull', False), ('state', 'PENDING_STATE')), fields=['grouped_in'], name='notification_grouped_idx'),
+        ),
+    ]
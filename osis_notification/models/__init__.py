@@ -1,7 +1,9 @@
 try:
+    from .notification_payload import NotificationPayload
     from .notification import Notification
     from .email_notification import EmailNotification
     from .web_notification import WebNotification
+    from .notification_counter import NotificationCounter
 except RuntimeError as e:  # pragma: no cover
     # There's a weird bug when running tests, the test runner seeing a models
     # package tries to import it directly, failing to do so
@@ -13,5 +15,7 @@ except RuntimeError as e:  # pragma: no cover
 __all__ = [
     "EmailNotification",
     "Notification",
+    "NotificationCounter",
+    "NotificationPayload",
     "WebNotification",
 ]
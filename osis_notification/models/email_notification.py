@@ -1,29 +1,192 @@
-from django.db import models
+import math
+from datetime import timedelta
+from typing import List, Optional
+
+from django.conf import settings
+from django.db import models, transaction
+from django.db.models import F, Q
+from django.utils.timezone import now
 from django.utils.translation import gettext_lazy as _
 
-from osis_notification.models import Notification
-from osis_notification.models.enums import NotificationStates, NotificationTypes
+from osis_notification.models import Notification, NotificationPayload
+from osis_notification.models.enums import NotificationPriorities, NotificationStates, NotificationTypes
 
 
 class EmailNotificationManager(models.Manager):
     def get_queryset(self):
-        return super().get_queryset().filter(type=NotificationTypes.EMAIL_TYPE.name)
+        return (
+            super()
+            .get_queryset()
+            .filter(type=NotificationTypes.EMAIL_TYPE.name)
+            .select_related("stored_payload")
+        )
 
     def pending(self):
-        """Returns all the pending email notifications."""
+        """Returns all the pending email notifications that are due to be sent (i.e. not
+        scheduled later nor waiting for a new attempt after a failure), by priority."""
 
+        current_time = now()
         return (
             self.get_queryset()
-            .filter(state=NotificationStates.PENDING_STATE.name)
+            .filter(
+                Q(next_attempt_at__isnull=True) | Q(next_attempt_at__lte=current_time),
+                state=NotificationStates.PENDING_STATE.name,
+                send_after__lte=current_time,
+                digest=False,
+            )
+            .order_by("-priority", "created_at")
+        )
+
+    def pending_digests(self):
+        """Returns all the pending email notifications waiting to be grouped in a digest."""
+
+        return (
+            self.get_queryset()
+            .filter(
+                state=NotificationStates.PENDING_STATE.name,
+                send_after__lte=now(),
+                digest=True,
+                grouped_in__isnull=True,
+            )
             .order_by("created_at")
         )
 
+    def grouped_in(self, digest_notification: "EmailNotification"):
+        """Returns the notifications grouped in the given digest notification, waiting
+        for it to be sent."""
+
+        return self.get_queryset().filter(
+            state=NotificationStates.PENDING_STATE.name,
+            grouped_in=digest_notification.uuid,
+        )
+
+    def abandoned(self, claimed_before):
+        """Returns the notifications being processed whose claim is older than the given
+        date, i.e. abandoned by their worker (e.g. crashed), oldest claim first."""
+
+        return (
+            self.get_queryset()
+            .filter(state=NotificationStates.PROCESSING_STATE.name, claimed_at__lt=claimed_before)
+            .order_by("claimed_at")
+        )
+
+    def claim(self, batch_size: int, lease: timedelta) -> List["EmailNotification"]:
+        """Claim a batch of due email notifications to be sent by the current worker.
+
+        The rows are locked with `SELECT ... FOR UPDATE SKIP LOCKED` so that concurrent
+        workers never claim the same notification, then moved to the processing state.
+        A processing notification whose claim is older than the lease is considered
+        abandoned (e.g. by a crashed worker) and is claimed again first, as a new
+        attempt (marked as failed once `EMAIL_NOTIFICATIONS_MAX_ATTEMPTS` is reached).
+
+        The pending notifications are claimed by priority. If
+        `EMAIL_NOTIFICATIONS_HIGH_PRIORITY_SHARE` is set, only this share of the batch is
+        reserved to the high priority notifications and the rest of the batch goes to
+        the other notifications first (still by priority), so that they are not starved.
+
+        :param batch_size: The maximum number of notifications to claim.
+        :param lease: How long a claim is held before it expires.
+        :return: The claimed EmailNotification objects.
+        """
+
+        claimed_at = now()
+        with transaction.atomic():
+            # The abandoned and the pending notifications are looked up separately, so
+            # that each query uses its own partial index
+            abandoned = list(
+                self.abandoned(claimed_at - lease).select_for_update(skip_locked=True, of=("self",))[:batch_size]
+            )
+            notifications = self._count_abandoned_attempts(abandoned)
+            if len(notifications) < batch_size:
+                notifications += self._claim_pending(
+                    self.pending().select_for_update(skip_locked=True, of=("self",)),
+                    batch_size - len(notifications),
+                )
+            if notifications:
+                self.get_queryset().filter(pk__in=[n.pk for n in notifications]).update(
+                    state=NotificationStates.PROCESSING_STATE.name,
+                    claimed_at=claimed_at,
+                )
+
+        for notification in notifications:
+            notification.state = NotificationStates.PROCESSING_STATE.name
+            notification.claimed_at = claimed_at
+        return notifications
+
+    def renew_claim(self, notification: "EmailNotification") -> bool:
+        """Renew the claim of the given notification, e.g. right before sending it, and
+        return whether it was still held by the current worker (it is not if its lease
+        expired and another worker claimed it again in the meantime).
+
+        :param notification: The claimed notification.
+        :return: Whether the claim was renewed."""
+
+        claimed_at = now()
+        renewed = (
+            self.get_queryset()
+            .filter(
+                pk=notification.pk,
+                state=NotificationStates.PROCESSING_STATE.name,
+                claimed_at=notification.claimed_at,
+            )
+            .update(claimed_at=claimed_at)
+        )
+        if renewed:
+            notification.claimed_at = claimed_at
+        return bool(renewed)
+
+    def _count_abandoned_attempts(self, notifications: List["EmailNotification"]) -> List["EmailNotification"]:
+        """Count an attempt for each abandoned notification, as sending it may be what
+        made its worker crash, and return the ones that can be attempted again (the
+        others are marked as failed, see `EmailNotificationHandler.reschedule`)."""
+
+        if not notifications:
+            return []
+        max_attempts = getattr(settings, "EMAIL_NOTIFICATIONS_MAX_ATTEMPTS", 5)
+        self.get_queryset().filter(pk__in=[n.pk for n in notifications]).update(attempts=F("attempts") + 1)
+        for notification in notifications:
+            notification.attempts += 1
+        failed = [notification for notification in notifications if notification.attempts >= max_attempts]
+        if failed:
+            self.get_queryset().filter(pk__in=[n.pk for n in failed]).update(
+                state=NotificationStates.FAILED_STATE.name,
+                next_attempt_at=None,
+            )
+            for notification in failed:
+                notification.state = NotificationStates.FAILED_STATE.name
+                notification.next_attempt_at = None
+        return [notification for notification in notifications if notification not in failed]
+
+    @staticmethod
+    def _claim_pending(queryset, batch_size: int) -> List["EmailNotification"]:
+        high_priority_share = getattr(settings, "EMAIL_NOTIFICATIONS_HIGH_PRIORITY_SHARE", None)
+        if high_priority_share is None:
+            return list(queryset[:batch_size])
+
+        notifications = list(
+            queryset.filter(priority=NotificationPriorities.HIGH)[: math.ceil(batch_size * high_priority_share)]
+        )
+        # The rest of the batch for the other notifications, by priority, then for the
+        # remaining high priority ones if there are not enough
+        notifications += list(
+            queryset.exclude(priority=NotificationPriorities.HIGH)[: batch_size - len(notifications)]
+        )
+        if len(notifications) < batch_size:
+            notifications += list(
+                queryset.filter(priority=NotificationPriorities.HIGH)
+                .exclude(pk__in=[n.pk for n in notifications])[: batch_size - len(notifications)]
+            )
+        return notifications
+
     def create(self, **kwargs):
         """Create the Email Notification with the given person and payload.
 
         :param kwargs: See below ;
             person (Person): The Person object to send the notification to.
             payload (str): The payload of the notification.
+            priority (int): The priority of the notification (see NotificationPriorities).
+            send_after (datetime): The date from which the notification can be sent.
+            digest (bool): Whether the notification can be grouped in a digest.
 
         :return: The newly created EmailNotification object.
         """
@@ -32,6 +195,38 @@ class EmailNotificationManager(models.Manager):
             type=NotificationTypes.EMAIL_TYPE.name,
             person=kwargs.get("person"),
             payload=kwargs.get("payload"),
+            priority=kwargs.get("priority", NotificationPriorities.NORMAL),
+            send_after=kwargs.get("send_after") or now(),
+            digest=kwargs.get("digest", False),
+        )
+
+    def create_many(self, notifications: List[dict], batch_size: Optional[int] = None):
+        """Create several Email Notifications at once, with one query per batch.
+
+        :param notifications: The notifications to create, each one described by a
+            dictionary with the same keys as the `create` kwargs.
+        :param batch_size: The number of notifications inserted per query.
+
+        :return: The newly created EmailNotification objects.
+        """
+
+        payloads = NotificationPayload.objects.get_or_create_many(
+            (notification["payload"] for notification in notifications),
+            batch_size=batch_size,
+        )
+        return self.bulk_create(
+            [
+                self.model(
+                    type=NotificationTypes.EMAIL_TYPE.name,
+                    person=notification.get("person"),
+                    stored_payload=payloads[notification["payload"]],
+                    priority=notification.get("priority", NotificationPriorities.NORMAL),
+                    send_after=notification.get("send_after") or now(),
+                    digest=notification.get("digest", False),
+                )
+                for notification in notifications
+            ],
+            batch_size=batch_size,
         )
 
 
@@ -1,9 +1,11 @@
 from .notifications import (
+    NotificationPriorities,
     NotificationStates,
     NotificationTypes,
 )
 
 __all__ = [
+    "NotificationPriorities",
     "NotificationStates",
     "NotificationTypes",
 ]
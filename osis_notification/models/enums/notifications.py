@@ -1,3 +1,4 @@
+from django.db import models
 from django.utils.translation import gettext_lazy as _
 
 from base.models.utils.utils import ChoiceEnum
@@ -5,10 +6,18 @@ from base.models.utils.utils import ChoiceEnum
 
 class NotificationStates(ChoiceEnum):
     PENDING_STATE = _("Pending")
+    PROCESSING_STATE = _("Processing")
     SENT_STATE = _("Sent")
     READ_STATE = _("Read")
+    FAILED_STATE = _("Failed")
 
 
 class NotificationTypes(ChoiceEnum):
     EMAIL_TYPE = _("Email notification")
     WEB_TYPE = _("Web notification")
+
+
+class NotificationPriorities(models.IntegerChoices):
+    LOW = 0, _("Low")
+    NORMAL = 50, _("Normal")
+    HIGH = 100, _("High")
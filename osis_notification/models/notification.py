@@ -26,13 +26,16 @@
 
 import uuid
 from django.db import models
+from django.utils.timezone import now
 from django.utils.translation import gettext_lazy as _
 
 from base.models.person import Person
 from osis_notification.models.enums import (
+    NotificationPriorities,
     NotificationStates,
     NotificationTypes,
 )
+from osis_notification.models.notification_payload import NotificationPayload
 
 
 class Notification(models.Model):
@@ -51,17 +54,42 @@ class Notification(models.Model):
         null=True,
         blank=True,
     )
-    payload = models.TextField(_("Payload"))
+    stored_payload = models.ForeignKey(
+        NotificationPayload,
+        on_delete=models.PROTECT,
+        related_name="notifications",
+        verbose_name=_("Payload"),
+    )
     state = models.CharField(
         _("State"),
         choices=NotificationStates.choices(),
         default=NotificationStates.PENDING_STATE.name,
         max_length=25,
     )
+    priority = models.PositiveSmallIntegerField(
+        _("Priority"),
+        choices=NotificationPriorities.choices,
+        default=NotificationPriorities.NORMAL,
+    )
 
     created_at = models.DateTimeField(verbose_name=_("Created at"), auto_now_add=True)
+    send_after = models.DateTimeField(verbose_name=_("Send after"), default=now)
+    digest = models.BooleanField(
+        _("Digest"),
+        default=False,
+        help_text=_("Whether the notification can be grouped with others in a digest"),
+    )
+    grouped_in = models.UUIDField(
+        _("Grouped in"),
+        editable=False,
+        null=True,
+        help_text=_("The uuid of the digest notification in which the notification was sent"),
+    )
     sent_at = models.DateTimeField(verbose_name=_("Sent at"), editable=False, null=True)
     read_at = models.DateTimeField(verbose_name=_("Read at"), editable=False, null=True)
+    claimed_at = models.DateTimeField(verbose_name=_("Claimed at"), editable=False, null=True)
+    attempts = models.PositiveSmallIntegerField(verbose_name=_("Attempts"), default=0, editable=False)
+    next_attempt_at = models.DateTimeField(verbose_name=_("Next attempt at"), editable=False, null=True)
 
     class Meta:
         constraints = [
@@ -74,4 +102,73 @@ class Notification(models.Model):
                 name='person_required_for_web',
             ),
         ]
+        indexes = [
+            # Pending notifications are sent by type, by priority, then by creation date
+            models.Index(
+                fields=["type", "-priority", "created_at"],
+                condition=models.Q(state=NotificationStates.PENDING_STATE.name),
+                name="notification_pending_idx",
+            ),
+            # Only the pending notifications are indexed, so that looking for the due ones
+            # does not depend on the size of the whole table
+            models.Index(
+                fields=["send_after"],
+                condition=models.Q(state=NotificationStates.PENDING_STATE.name),
+                name="notification_due_idx",
+            ),
+            # Notifications being processed, to reclaim the ones whose lease expired
+            models.Index(
+                fields=["claimed_at"],
+                condition=models.Q(state=NotificationStates.PROCESSING_STATE.name),
+                name="notification_processing_idx",
+            ),
+            # Notifications grouped in a digest, sent along with it
+            models.Index(
+                fields=["grouped_in"],
+                condition=models.Q(
+                    state=NotificationStates.PENDING_STATE.name,
+                    grouped_in__isnull=False,
+                ),
+                name="notification_grouped_idx",
+            ),
+            # Sent web notifications of a person, by creation date (notification list API)
+            models.Index(
+                fields=["person", "-created_at"],
+                condition=models.Q(
+                    type=NotificationTypes.WEB_TYPE.name,
+                    state__in=[NotificationStates.SENT_STATE.name, NotificationStates.READ_STATE.name],
+                ),
+                name="notification_web_list_idx",
+            ),
+            # Retention of the sent email notifications and of the read web notifications
+            models.Index(
+                fields=["sent_at"],
+                condition=models.Q(type=NotificationTypes.EMAIL_TYPE.name, state=NotificationStates.SENT_STATE.name),
+                name="notification_email_clean_idx",
+            ),
+            models.Index(
+                fields=["read_at"],
+                condition=models.Q(type=NotificationTypes.WEB_TYPE.name, state=NotificationStates.READ_STATE.name),
+                name="notification_web_clean_idx",
+            ),
+        ]
         ordering = ["-created_at"]
+
+    @property
+    def payload(self) -> str:
+        """The content of the notification, shared by all the notifications having the
+        same content."""
+
+        stored_payload = getattr(self, "stored_payload", None)
+        return stored_payload.content if stored_payload is not None else None
+
+    @payload.setter
+    def payload(self, content: str):
+        # The payload is looked up (or created) when the notification is saved
+        self.stored_payload = NotificationPayload(content=content) if content is not None else None
+
+    def save(self, *args, **kwargs):
+        stored_payload = getattr(self, "stored_payload", None)
+        if stored_payload is not None and stored_payload.pk is None:
+            self.stored_payload = NotificationPayload.objects.get_or_create_for(stored_payload.content)
+        super().save(*args, **kwargs)
@@ -0,0 +1,152 @@
+from collections import defaultdict
+from datetime import datetime
+from typing import Dict, Iterable, Optional, Tuple
+
+from django.conf import settings
+from django.db import models
+from django.db.models import Count, F, Q
+from django.utils.timezone import now
+from django.utils.translation import gettext_lazy as _
+
+from base.models.person import Person
+from osis_notification.models.enums import NotificationStates, NotificationTypes
+from osis_notification.models.notification import Notification
+
+SHOWN_STATES = [NotificationStates.SENT_STATE.name, NotificationStates.READ_STATE.name]
+
+
+class NotificationCounterManager(models.Manager):
+    @staticmethod
+    def enabled() -> bool:
+        """Whether the counters are maintained (`settings.OSIS_NOTIFICATION_COUNTERS`)."""
+        return getattr(settings, "OSIS_NOTIFICATION_COUNTERS", False)
+
+    def add(self, deltas: Dict[int, Tuple[int, int]]):
+        """Add the given (total, unread) deltas to the counters of the persons, by person
+        id. Does nothing unless the counters are enabled.
+
+        The persons with the same deltas are updated with a single query. The missing
+        counters are computed from the notifications, which already include the change.
+        """
+
+        if not self.enabled():
+            return
+        persons_by_delta = defaultdict(list)
+        for person_id, delta in deltas.items():
+            if person_id is not None and delta != (0, 0):
+                persons_by_delta[delta].append(person_id)
+
+        missing_person_ids = set()
+        for (total, unread), person_ids in persons_by_delta.items():
+            updated = self.filter(person_id__in=person_ids).update(
+                total=F("total") + total,
+                unread=F("unread") + unread,
+                updated_at=now(),
+            )
+            if updated < len(person_ids):
+                missing_person_ids.update(
+                    set(person_ids) - set(self.filter(person_id__in=person_ids).values_list("person_id", flat=True))
+                )
+        if missing_person_ids:
+            self.recount(missing_person_ids)
+
+    def discount(self, notifications: models.QuerySet):
+        """Remove the given notifications, about to be deleted, from the counters. Does
+        nothing unless the counters are enabled."""
+
+        if not self.enabled():
+            return
+        counts = (
+            notifications.filter(type=NotificationTypes.WEB_TYPE.name, state__in=SHOWN_STATES)
+            .values("person_id")
+            .annotate(
+                total=Count("id"),
+                unread=Count("id", filter=Q(state=NotificationStates.SENT_STATE.name)),
+            )
+            .order_by()
+        )
+        self.add({count["person_id"]: (-count["total"], -count["unread"]) for count in counts})
+
+    def recount(self, person_ids: Optional[Iterable[int]] = None, batch_size: int = 1000) -> int:
+        """Compute the counters of the given persons (of all the persons having web
+        notifications or counters by default) from their notifications, and return the
+        number of fixed counters."""
+
+        if person_ids is None:
+            person_ids = (
+                Notification.objects.filter(type=NotificationTypes.WEB_TYPE.name, state__in=SHOWN_STATES)
+                .values_list("person_id", flat=True)
+                .order_by()
+                .union(self.values_list("person_id", flat=True).order_by())
+            )
+        person_ids = list(person_ids)
+        fixed = 0
+        for start in range(0, len(person_ids), batch_size):
+            fixed += self._recount_batch(person_ids[start : start + batch_size])
+        return fixed
+
+    def _recount_batch(self, person_ids) -> int:
+        counts = {
+            count["person_id"]: (count["total"], count["unread"])
+            for count in Notification.objects.filter(
+                type=NotificationTypes.WEB_TYPE.name,
+                state__in=SHOWN_STATES,
+                person_id__in=person_ids,
+            )
+            .values("person_id")
+            .annotate(
+                total=Count("id"),
+                unread=Count("id", filter=Q(state=NotificationStates.SENT_STATE.name)),
+            )
+            .order_by()
+        }
+        counters = self.in_bulk(person_ids)
+        current_time = now()
+        wrong_counters = []
+        for person_id, counter in counters.items():
+            total, unread = counts.get(person_id, (0, 0))
+            if (counter.total, counter.unread) != (total, unread):
+                counter.total, counter.unread, counter.updated_at = total, unread, current_time
+                wrong_counters.append(counter)
+        self.bulk_update(wrong_counters, ["total", "unread", "updated_at"])
+        missing_counters = [
+            NotificationCounter(
+                person_id=person_id,
+                total=counts.get(person_id, (0, 0))[0],
+                unread=counts.get(person_id, (0, 0))[1],
+                updated_at=current_time,
+            )
+            for person_id in person_ids
+            if person_id not in counters
+        ]
+        # Another process may have created some of them in the meantime
+        self.bulk_create(missing_counters, ignore_conflicts=True)
+        return len(wrong_counters) + len(missing_counters)
+
+    def get_counts(self, person_id: int) -> Tuple[int, int, datetime]:
+        """Return the (total, unread) counts of the shown web notifications of the person,
+        and the date of their last change."""
+
+        counts = self.filter(person_id=person_id).values_list("total", "unread", "updated_at").first()
+        if counts is None:
+            self.recount([person_id])
+            counts = self.filter(person_id=person_id).values_list("total", "unread", "updated_at").get()
+        return counts
+
+
+class NotificationCounter(models.Model):
+    """Number of shown (sent or read) and unread web notifications of a person, kept
+    up to date by the web notification handlers and the cleaning commands when
+    `settings.OSIS_NOTIFICATION_COUNTERS` is set."""
+
+    person = models.OneToOneField(
+        Person,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name="+",
+    )
+    total = models.IntegerField(_("Total"), default=0)
+    unread = models.IntegerField(_("Unread"), default=0)
+    updated_at = models.DateTimeField(_("Updated at"), default=now)
+
+    objects = NotificationCounterManager()
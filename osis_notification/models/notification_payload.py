@@ -0,0 +1,118 @@
+# ##############################################################################
+#
+#  OSIS stands for Open Student Information System. It's an application
+#  designed to manage the core business of higher education institutions,
+#  such as universities, faculties, institutes and professional schools.
+#  The core business involves the administration of students, teachers,
+#  courses, programs and so on.
+#
+#  Copyright (C) 2015-2026 Université catholique de Louvain (http://www.uclouvain.be)
+#
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  A copy of this license - GNU General Public License - is available
+#  at the root of the source code of this program.  If not,
+#  see http://www.gnu.org/licenses/.
+#
+# ##############################################################################
+import hashlib
+from typing import Dict, Iterable, Optional
+
+from django.db import IntegrityError, models
+from django.db.models import Exists, OuterRef
+from django.utils.translation import gettext_lazy as _
+
+from osis_notification.models.fields import CompressedTextField
+
+
+class NotificationPayloadManager(models.Manager):
+    def get_or_create_for(self, content: str) -> "NotificationPayload":
+        """Return the stored payload having the given content, creating it if needed.
+
+        :param content: The content of the payload.
+        :return: The NotificationPayload object."""
+
+        digest = NotificationPayload.digest_for(content)
+        try:
+            payload, _ = self.get_or_create(digest=digest, defaults={"content": content})
+        except IntegrityError:
+            # Created by another process, then deleted as unused before it could be
+            # looked up again: the next attempt creates it.
+            payload, _ = self.get_or_create(digest=digest, defaults={"content": content})
+        return payload
+
+    def get_or_create_many(
+        self,
+        contents: Iterable[str],
+        batch_size: Optional[int] = None,
+    ) -> Dict[str, "NotificationPayload"]:
+        """Return the stored payloads having the given contents, creating the missing
+        ones with a single bulk insert.
+
+        :param contents: The contents of the payloads.
+        :param batch_size: The number of payloads inserted per query.
+        :return: The NotificationPayload objects, by content."""
+
+        contents_by_digest = {NotificationPayload.digest_for(content): content for content in contents}
+        payloads = self.defer("content").in_bulk(list(contents_by_digest), field_name="digest")
+        missing_payloads = [
+            NotificationPayload(digest=digest, content=content)
+            for digest, content in contents_by_digest.items()
+            if digest not in payloads
+        ]
+        if missing_payloads:
+            # Another process may have created some of them in the meantime
+            self.bulk_create(missing_payloads, batch_size=batch_size, ignore_conflicts=True)
+            payloads.update(
+                self.defer("content").in_bulk(
+                    [payload.digest for payload in missing_payloads],
+                    field_name="digest",
+                )
+            )
+        for digest, payload in payloads.items():
+            payload.content = contents_by_digest[digest]
+        return {content: payloads[digest] for digest, content in contents_by_digest.items()}
+
+    def unused(self):
+        """Return the payloads that are not referenced by any notification anymore."""
+
+        return self.filter(notifications__isnull=True)
+
+    def delete_unused(self, pks: Iterable[int]) -> int:
+        """Delete the payloads having the given primary keys that are still unused,
+        and return the number of deleted payloads. The usage is checked by the DELETE
+        itself, as a notification may have been created with one of them since they
+        were selected.
+
+        :param pks: The primary keys of the payloads.
+        :return: The number of deleted payloads."""
+
+        from osis_notification.models import Notification
+
+        # Not through delete(), which would look up the notifications of the payloads
+        # beforehand, to protect them
+        return self.filter(pk__in=pks).filter(
+            ~Exists(Notification.objects.filter(stored_payload=OuterRef("pk")))
+        )._raw_delete(self.db)
+
+
+class NotificationPayload(models.Model):
+    """Content of notifications, stored only once for all the notifications having
+    the same content (e.g. when notifying a whole cohort)."""
+
+    digest = models.CharField(max_length=64, unique=True, editable=False)
+    content = CompressedTextField(_("Content"))
+
+    objects = NotificationPayloadManager()
+
+    @staticmethod
+    def digest_for(content: str) -> str:
+        return hashlib.sha256(content.encode("utf-8")).hexdigest()
@@ -1,24 +1,35 @@
-from django.db import models
+from typing import Iterable, List, Optional, Tuple
+from uuid import UUID
+
+from django.db import connections, models, transaction
+from django.db.models import Count, Max, Q
+from django.utils.timezone import now
 from django.utils.translation import gettext_lazy as _
 
-from osis_notification.models import Notification
-from osis_notification.models.enums import NotificationStates, NotificationTypes
+from osis_notification.models import Notification, NotificationPayload
+from osis_notification.models.enums import NotificationPriorities, NotificationStates, NotificationTypes
+from osis_notification.models.notification_counter import NotificationCounter
 
 
 class WebNotificationManager(models.Manager):
     def get_queryset(self):
-        return super().get_queryset().filter(type=NotificationTypes.WEB_TYPE.name)
+        return (
+            super()
+            .get_queryset()
+            .filter(type=NotificationTypes.WEB_TYPE.name)
+            .select_related("stored_payload")
+        )
 
     def order_by_sent_first(self):
         """Notifications with SENT_STATE will come first"""
         return self.get_queryset().order_by("-state", "created_at")
 
     def pending(self):
-        """Returns all the pending web notifications."""
+        """Returns all the pending web notifications that are due to be sent, by priority."""
         return (
             self.get_queryset()
-            .filter(state=NotificationStates.PENDING_STATE.name)
-            .order_by("created_at")
+            .filter(state=NotificationStates.PENDING_STATE.name, send_after__lte=now())
+            .order_by("-priority", "created_at")
         )
 
     def sent(self):
@@ -30,12 +41,82 @@ class WebNotificationManager(models.Manager):
             ],
         )
 
+    def counts(self, person_id: int) -> Tuple[int, int, Optional[str]]:
+        """Return the number of sent notifications of the person, how many are unread,
+        and a version of these notifications which changes whenever one of them is
+        sent, read or deleted."""
+
+        if NotificationCounter.objects.enabled():
+            count, unread_count, updated_at = NotificationCounter.objects.get_counts(person_id)
+            return count, unread_count, updated_at.isoformat()
+
+        # Use a single queryset for both counts
+        count_queryset = (
+            self.sent()
+            .filter(person_id=person_id)
+            .values("person_id")
+            .annotate(
+                count=Count("id"),
+                unread_count=Count("id", filter=Q(state=NotificationStates.SENT_STATE.name)),
+                last_sent_at=Max("sent_at"),
+                last_read_at=Max("read_at"),
+            )
+            .order_by()
+            .values("count", "unread_count", "last_sent_at", "last_read_at")
+        )
+        if count_queryset:
+            counts = count_queryset[0]
+            return counts["count"], counts["unread_count"], f"{counts['last_sent_at']}|{counts['last_read_at']}"
+        return 0, 0, None
+
+    def change_state(self, person_id: int, state: str, uuids: Optional[Iterable[UUID]] = None) -> List[UUID]:
+        """Mark the given notifications of the person (all of them by default) as read
+        (`READ_STATE`) or unread (`SENT_STATE`), with a single conditional UPDATE
+        statement, without loading them.
+
+        :return: The uuids of the changed notifications, the other ones being already in
+            this state, not sent or not belonging to the person."""
+
+        if state == NotificationStates.READ_STATE.name:
+            previous_state, read_at = NotificationStates.SENT_STATE.name, now()
+        elif state == NotificationStates.SENT_STATE.name:
+            previous_state, read_at = NotificationStates.READ_STATE.name, None
+        else:
+            raise ValueError(f"Invalid notification state: {state}")
+        if uuids is not None:
+            uuids = [str(uuid) for uuid in uuids]
+
+        connection = connections[self.db]
+        if connection.vendor == "postgresql":
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    f"UPDATE {connection.ops.quote_name(self.model._meta.db_table)} SET state = %s, read_at = %s "
+                    f"WHERE type = %s AND person_id = %s AND state = %s"
+                    f"{'' if uuids is None else ' AND uuid = ANY(%s::uuid[])'} RETURNING uuid",
+                    [state, read_at, NotificationTypes.WEB_TYPE.name, person_id, previous_state]
+                    + ([] if uuids is None else [uuids]),
+                )
+                return [UUID(str(row[0])) for row in cursor.fetchall()]
+
+        # Without RETURNING, lock the notifications so that the uuids are the updated ones
+        queryset = self.filter(person_id=person_id, state=previous_state)
+        if uuids is not None:
+            queryset = queryset.filter(uuid__in=uuids)
+        with transaction.atomic(using=self.db):
+            changed_uuids = list(queryset.select_for_update().values_list("uuid", flat=True))
+            queryset.filter(uuid__in=changed_uuids).update(state=state, read_at=read_at)
+        return changed_uuids
+
     def create(self, **kwargs):
         """Create the Web Notification with the given person and payload.
 
         :param kwargs: See below ;
             person (Person): The Person object to send the notification to.
             payload (str): The payload of the notification.
+            priority (int): The priority of the notification (see NotificationPriorities).
+            send_after (datetime): The date from which the notification can be sent.
+            state (str): The state of the notification (default to pending).
+            sent_at (datetime): The date the notification has been sent, if already sent.
 
         :return: The newly created WebNotification object.
         """
@@ -44,6 +125,40 @@ class WebNotificationManager(models.Manager):
             type=NotificationTypes.WEB_TYPE.name,
             person=kwargs.get("person"),
             payload=kwargs.get("payload"),
+            priority=kwargs.get("priority", NotificationPriorities.NORMAL),
+            send_after=kwargs.get("send_after") or now(),
+            state=kwargs.get("state", NotificationStates.PENDING_STATE.name),
+            sent_at=kwargs.get("sent_at"),
+        )
+
+    def create_many(self, notifications: List[dict], batch_size: Optional[int] = None):
+        """Create several Web Notifications at once, with one query per batch.
+
+        :param notifications: The notifications to create, each one described by a
+            dictionary with the same keys as the `create` kwargs.
+        :param batch_size: The number of notifications inserted per query.
+
+        :return: The newly created WebNotification objects.
+        """
+
+        payloads = NotificationPayload.objects.get_or_create_many(
+            (notification["payload"] for notification in notifications),
+            batch_size=batch_size,
+        )
+        return self.bulk_create(
+            [
+                self.model(
+                    type=NotificationTypes.WEB_TYPE.name,
+                    person=notification.get("person"),
+                    stored_payload=payloads[notification["payload"]],
+                    priority=notification.get("priority", NotificationPriorities.NORMAL),
+                    send_after=notification.get("send_after") or now(),
+                    state=notification.get("state", NotificationStates.PENDING_STATE.name),
+                    sent_at=notification.get("sent_at"),
+                )
+                for notification in notifications
+            ],
+            batch_size=batch_size,
         )
 
 
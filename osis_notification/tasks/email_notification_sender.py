@@ -5,7 +5,8 @@ from backoffice.celery import app as celery_app
 
 @celery_app.task
 def run():
-    """This job will launch the Django command that will send all the pending email
-    notifications."""
+    """This job will launch the Django commands that will group the digest email
+    notifications, then send all the pending email notifications."""
 
+    call_command("build_email_digests")
     call_command("send_email_notifications")
@@ -0,0 +1,13 @@
+from django.core.management import call_command
+
+from backoffice.celery import app as celery_app
+from osis_notification.contrib import partitioning
+
+
+@celery_app.task
+def run():
+    """This job will launch the Django command that will create the partitions of the
+    notification table for the coming months, if the table is partitioned."""
+
+    if partitioning.is_partitioned():
+        call_command("create_notification_partitions")
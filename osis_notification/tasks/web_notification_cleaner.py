@@ -4,8 +4,9 @@ from backoffice.celery import app as celery_app
 
 
 @celery_app.task
-def run():
+def run(**options):
     """This job will launch the Django command that will clean all the old web
-    notifications."""
+    notifications. The options (e.g. `batch_size`, `sleep` or `time_budget`) are
+    given to the command."""
 
-    call_command("clean_web_notifications")
+    call_command("clean_web_notifications", **options)
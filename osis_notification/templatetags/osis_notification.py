@@ -24,6 +24,7 @@
 #
 # ##############################################################################
 from django import template
+from django.conf import settings
 from django.shortcuts import resolve_url
 from django.utils.html import escapejs
 from django.utils.safestring import mark_safe
@@ -34,6 +35,8 @@ register = template.Library()
 @register.simple_tag
 def notification_viewer(**kwargs):
     attrs = {'data-base-url': resolve_url("osis_notification:notification-list")}
+    if getattr(settings, 'OSIS_NOTIFICATION_STREAM_URL', None):
+        attrs['data-stream-url'] = settings.OSIS_NOTIFICATION_STREAM_URL
     for name, value in kwargs.items():
         attrs['data-' + "-".join(name.lower().split("_"))] = escapejs(value)
     return mark_safe(
@@ -1,19 +1,33 @@
-from datetime import timedelta
+import json
+import os
+import tempfile
+import uuid
+from datetime import datetime, timedelta, timezone
+from io import StringIO
+from unittest import skipUnless
 from unittest.mock import patch
 
 from django.conf import settings
-from django.core.management import call_command
-from django.test import override_settings
+from django.core.management import CommandError, call_command
+from django.db import connection, transaction
+from django.test import TransactionTestCase, override_settings
 from django.utils.timezone import now
 
 from base.tests.factories.person import PersonFactory
+from osis_notification.contrib import archive, partitioning
 from osis_notification.contrib.handlers import EmailNotificationHandler
 from osis_notification.contrib.notification import (
     EmailNotification as EmailNotificationType,
 )
 from osis_notification.contrib.exceptions import EmailNotificationSendingException
-from osis_notification.models import EmailNotification, WebNotification, Notification
-from osis_notification.models.enums import NotificationStates
+from osis_notification.models import (
+    EmailNotification,
+    Notification,
+    NotificationCounter,
+    NotificationPayload,
+    WebNotification,
+)
+from osis_notification.models.enums import NotificationPriorities, NotificationStates
 from osis_notification.tests import TestCase
 from osis_notification.tests.factories import (
     EmailNotificationFactory,
@@ -21,6 +35,7 @@ from osis_notification.tests.factories import (
 )
 
 from osis_common.messaging.mail_sender_classes import MessageHistorySender
+from osis_common.models.message_history import MessageHistory
 
 
 class SendNotificationsTest(TestCase):
@@ -37,7 +52,7 @@ class SendNotificationsTest(TestCase):
         email_notification = EmailNotificationType(**email_notification_data)
         email_message = EmailNotificationHandler.build(email_notification)
         self.email_notification = EmailNotificationFactory(
-            payload=email_message.as_string(),
+            payload=EmailNotificationHandler.serialize(email_message),
             person=email_notification_data["recipient"],
         )
 
@@ -47,7 +62,9 @@ class SendNotificationsTest(TestCase):
             self.email_notification.state,
             NotificationStates.PENDING_STATE.name,
         )
-        with self.assertNumQueriesLessThan(6):
+        # Claiming takes 2 lookups and an update, sending renews the claim beforehand and
+        # sends the notifications grouped in it along
+        with self.assertNumQueriesLessThan(12):
             call_command("send_email_notifications")
         self.email_notification.refresh_from_db()
         # now email notification should be in sent state
@@ -87,6 +104,167 @@ class SendNotificationsTest(TestCase):
                 third_email_notification.refresh_from_db()
                 self.assertEqual(second_email_notification.state, NotificationStates.PENDING_STATE.name)
 
+    @override_settings(EMAIL_NOTIFICATIONS_MAX_ATTEMPTS=2, EMAIL_NOTIFICATIONS_RETRY_DELAY_SECONDS=60)
+    def test_send_email_notifications_retries_with_backoff_then_fails(self):
+        with patch.object(EmailNotificationHandler, 'process', side_effect=ValueError('Invalid address')):
+            with self.assertRaises(EmailNotificationSendingException):
+                call_command("send_email_notifications")
+            self.email_notification.refresh_from_db()
+            self.assertEqual(self.email_notification.state, NotificationStates.PENDING_STATE.name)
+            self.assertEqual(self.email_notification.attempts, 1)
+            self.assertGreater(self.email_notification.next_attempt_at, now() + timedelta(seconds=50))
+
+            # The notification is not due yet, so it is not sent again
+            self.assertFalse(EmailNotification.objects.pending().exists())
+            call_command("send_email_notifications")
+
+            EmailNotification.objects.filter(pk=self.email_notification.pk).update(next_attempt_at=now())
+            with self.assertRaises(EmailNotificationSendingException):
+                call_command("send_email_notifications")
+        self.email_notification.refresh_from_db()
+        self.assertEqual(self.email_notification.state, NotificationStates.FAILED_STATE.name)
+        self.assertEqual(self.email_notification.attempts, 2)
+
+    def test_rescheduled_notifications_are_not_sent(self):
+        # Failed after the sending date was stored
+        EmailNotification.objects.filter(pk=self.email_notification.pk).update(sent_at=now())
+        EmailNotificationHandler.reschedule(self.email_notification)
+        self.email_notification.refresh_from_db()
+        self.assertEqual(self.email_notification.state, NotificationStates.PENDING_STATE.name)
+        self.assertIsNone(self.email_notification.sent_at)
+
+    def test_send_email_notifications_skips_notifications_claimed_by_another_worker(self):
+        EmailNotification.objects.filter(pk=self.email_notification.pk).update(
+            state=NotificationStates.PROCESSING_STATE.name,
+            claimed_at=now(),
+        )
+        call_command("send_email_notifications")
+        self.email_notification.refresh_from_db()
+        self.assertEqual(self.email_notification.state, NotificationStates.PROCESSING_STATE.name)
+
+    @override_settings(EMAIL_NOTIFICATIONS_LEASE_SECONDS=60)
+    def test_send_email_notifications_reclaims_expired_claims(self):
+        EmailNotification.objects.filter(pk=self.email_notification.pk).update(
+            state=NotificationStates.PROCESSING_STATE.name,
+            claimed_at=now() - timedelta(seconds=61),
+        )
+        call_command("send_email_notifications")
+        self.email_notification.refresh_from_db()
+        self.assertEqual(self.email_notification.state, NotificationStates.SENT_STATE.name)
+        self.assertEqual(self.email_notification.attempts, 1)
+
+    @override_settings(EMAIL_NOTIFICATIONS_MAX_ATTEMPTS=2)
+    def test_claim_counts_reclaiming_an_expired_claim_as_an_attempt(self):
+        lease = timedelta(seconds=60)
+        for attempts in range(2):
+            EmailNotification.objects.filter(pk=self.email_notification.pk).update(
+                state=NotificationStates.PROCESSING_STATE.name,
+                claimed_at=now() - timedelta(seconds=61),
+            )
+            claimed = EmailNotification.objects.claim(1, lease)
+            self.email_notification.refresh_from_db()
+            self.assertEqual(self.email_notification.attempts, attempts + 1)
+        # The worker crashed as many times as the maximum number of attempts
+        self.assertEqual(claimed, [])
+        self.assertEqual(self.email_notification.state, NotificationStates.FAILED_STATE.name)
+
+    def test_send_notifications_scheduled_later_only_when_due(self):
+        self.email_notification.send_after = now() + timedelta(hours=1)
+        self.email_notification.save()
+        self.web_notification.send_after = now() + timedelta(hours=1)
+        self.web_notification.save()
+        self.assertFalse(EmailNotification.objects.pending().exists())
+        self.assertFalse(WebNotification.objects.pending().exists())
+
+        call_command("send_email_notifications")
+        call_command("send_web_notifications")
+        self.email_notification.refresh_from_db()
+        self.web_notification.refresh_from_db()
+        self.assertEqual(self.email_notification.state, NotificationStates.PENDING_STATE.name)
+        self.assertEqual(self.web_notification.state, NotificationStates.PENDING_STATE.name)
+
+        Notification.objects.update(send_after=now())
+        call_command("send_email_notifications")
+        call_command("send_web_notifications")
+        self.email_notification.refresh_from_db()
+        self.web_notification.refresh_from_db()
+        self.assertEqual(self.email_notification.state, NotificationStates.SENT_STATE.name)
+        self.assertEqual(self.web_notification.state, NotificationStates.SENT_STATE.name)
+
+    def test_claim_high_priority_notifications_first(self):
+        high_priority_notification = EmailNotificationHandler.create(
+            EmailNotificationHandler.build(EmailNotificationType(
+                recipient=self.email_notification.person,
+                subject="Password reset",
+                plain_text_content="Reset your password",
+                html_content="<p>Reset your password</p>",
+            )),
+            priority=NotificationPriorities.HIGH,
+        )
+        self.assertEqual(
+            EmailNotification.objects.claim(1, timedelta(minutes=10)),
+            [high_priority_notification],
+        )
+
+    @override_settings(EMAIL_NOTIFICATIONS_HIGH_PRIORITY_SHARE=0.5)
+    def test_claim_reserves_a_share_of_the_batch_for_high_priority_notifications(self):
+        payload = self.email_notification.payload
+        person = self.email_notification.person
+        low_priority_notification = EmailNotification.objects.create(
+            payload=payload, person=person, priority=NotificationPriorities.LOW
+        )
+        normal_notification = EmailNotificationFactory(payload=payload, person=person)
+        high_priority_notifications = [
+            EmailNotification.objects.create(payload=payload, person=person, priority=NotificationPriorities.HIGH)
+            for _ in range(3)
+        ]
+        self.assertEqual(
+            EmailNotification.objects.claim(4, timedelta(minutes=10)),
+            # Half of the batch for the high priority lane, the rest for the others by priority
+            high_priority_notifications[:2] + [self.email_notification, normal_notification],
+        )
+        self.assertEqual(
+            EmailNotification.objects.claim(4, timedelta(minutes=10)),
+            # The remaining ones, the high priority one first
+            [high_priority_notifications[2], low_priority_notification],
+        )
+
+    def test_notifications_claimed_again_by_another_worker_are_not_sent(self):
+        [notification] = EmailNotification.objects.claim(1, timedelta(minutes=10))
+        # Claimed again by another worker once the lease expired
+        EmailNotification.objects.filter(pk=notification.pk).update(claimed_at=now() + timedelta(seconds=1))
+        with self.settings(MAIL_SENDER_CLASSES=["osis_common.messaging.mail_sender_classes.MessageHistorySender"]):
+            with patch.object(MessageHistorySender, "send_mail") as send_mail:
+                EmailNotificationHandler.process_many([notification])
+        send_mail.assert_not_called()
+        notification.refresh_from_db()
+        self.assertEqual(notification.state, NotificationStates.PROCESSING_STATE.name)
+
+    def test_claim_is_renewed_before_sending(self):
+        [notification] = EmailNotification.objects.claim(1, timedelta(minutes=10))
+        claimed_at = notification.claimed_at
+        with self.settings(MAIL_SENDER_CLASSES=[]):
+            EmailNotificationHandler.process(notification)
+        self.assertGreater(notification.claimed_at, claimed_at)
+        notification.refresh_from_db()
+        self.assertEqual(notification.state, NotificationStates.SENT_STATE.name)
+
+    def test_explain_notification_queries_explains_the_claim_queries(self):
+        out = StringIO()
+        call_command("explain_notification_queries", stdout=out)
+        self.assertIn("abandoned email notifications claim", out.getvalue())
+        self.assertIn("pending email notifications claim", out.getvalue())
+
+    def test_claim_does_not_return_the_same_notifications_twice(self):
+        second_email_notification = EmailNotificationFactory(
+            payload=self.email_notification.payload,
+            person=self.email_notification.person,
+        )
+        first_batch = EmailNotification.objects.claim(1, timedelta(minutes=10))
+        second_batch = EmailNotification.objects.claim(1, timedelta(minutes=10))
+        self.assertEqual(first_batch, [self.email_notification])
+        self.assertEqual(second_batch, [second_email_notification])
+        self.assertEqual(EmailNotification.objects.claim(1, timedelta(minutes=10)), [])
 
     def test_send_web_notifications(self):
         # ensure web notification is in pending state after creation
@@ -103,6 +281,140 @@ class SendNotificationsTest(TestCase):
             NotificationStates.SENT_STATE.name,
         )
 
+    def test_send_web_notifications_in_batches(self):
+        WebNotificationFactory.create_batch(2)
+        # One update per batch, until a batch is not full
+        with self.assertNumQueries(2):
+            call_command("send_web_notifications", batch_size=2)
+        self.assertFalse(WebNotification.objects.exclude(state=NotificationStates.SENT_STATE.name).exists())
+        self.assertFalse(WebNotification.objects.filter(sent_at__isnull=True).exists())
+
+
+@override_settings(EMAIL_NOTIFICATIONS_DIGEST_WINDOW_MINUTES=60)
+class BuildEmailDigestsTest(TestCase):
+    def setUp(self):
+        self.person = PersonFactory()
+        self.email_notifications = [
+            EmailNotificationHandler.create(
+                EmailNotificationHandler.build(
+                    EmailNotificationType(
+                        recipient=self.person,
+                        subject=f"Subject {i}",
+                        plain_text_content=f"Content {i}",
+                        html_content=f"<p>Content {i}</p>",
+                    )
+                ),
+                self.person,
+                digest=True,
+            )
+            for i in range(3)
+        ]
+
+    def test_digest_notifications_are_not_sent_individually(self):
+        self.assertFalse(EmailNotification.objects.pending().exists())
+
+    def test_build_email_digests_waits_for_the_window(self):
+        call_command("build_email_digests")
+        self.assertEqual(EmailNotification.objects.count(), 3)
+
+    def test_build_email_digests_groups_notifications_of_a_person(self):
+        EmailNotification.objects.update(created_at=now() - timedelta(minutes=61))
+        call_command("build_email_digests")
+
+        digest_notification = EmailNotification.objects.pending().get()
+        self.assertEqual(digest_notification.person, self.person)
+        content = json.loads(digest_notification.payload)
+        self.assertEqual(content["subject"], "3 new notifications")
+        for i in range(3):
+            self.assertIn(f"<h3>Subject {i}</h3><p>Content {i}</p>", content["html_content"])
+        self.assertEqual(
+            EmailNotification.objects.filter(
+                pk__in=[notification.pk for notification in self.email_notifications],
+                state=NotificationStates.PENDING_STATE.name,
+                grouped_in=digest_notification.uuid,
+            ).count(),
+            3,
+        )
+        # Not grouped again
+        call_command("build_email_digests")
+        self.assertEqual(EmailNotification.objects.count(), 4)
+
+    @override_settings(MAIL_SENDER_CLASSES=['osis_notification.tests.test_handlers.DummyMailSender'])
+    def test_grouped_notifications_are_sent_with_their_digest(self):
+        EmailNotification.objects.update(created_at=now() - timedelta(minutes=61))
+        call_command("build_email_digests")
+        call_command("send_email_notifications")
+        self.assertEqual(
+            EmailNotification.objects.filter(state=NotificationStates.SENT_STATE.name).count(),
+            4,
+        )
+        digest_notification = EmailNotification.objects.get(digest=False)
+        for notification in self.email_notifications:
+            notification.refresh_from_db()
+            self.assertEqual(notification.grouped_in, digest_notification.uuid)
+            self.assertEqual(notification.sent_at, digest_notification.sent_at)
+
+    @override_settings(EMAIL_NOTIFICATIONS_MAX_ATTEMPTS=1)
+    def test_grouped_notifications_fail_with_their_digest(self):
+        EmailNotification.objects.update(created_at=now() - timedelta(minutes=61))
+        call_command("build_email_digests")
+        digest_notification = EmailNotification.objects.get(digest=False)
+        EmailNotificationHandler.reschedule(digest_notification)
+        self.assertEqual(
+            EmailNotification.objects.filter(state=NotificationStates.FAILED_STATE.name).count(),
+            4,
+        )
+
+    def test_build_email_digests_groups_notifications_by_recipients(self):
+        mail = EmailNotificationHandler.build(
+            EmailNotificationType(
+                recipient="other@example.org",
+                subject="Other subject",
+                plain_text_content="Other content",
+                html_content="<p>Other content</p>",
+            )
+        )
+        [other_recipient_notification] = EmailNotificationHandler.create_many([mail], [self.person], digest=True)
+        EmailNotification.objects.update(created_at=now() - timedelta(minutes=61))
+        call_command("build_email_digests")
+
+        self.assertEqual(
+            {json.loads(notification.payload)["to"] for notification in EmailNotification.objects.pending()},
+            {self.person.email, "other@example.org"},
+        )
+        other_recipient_notification.refresh_from_db()
+        self.assertFalse(other_recipient_notification.digest)
+        with self.assertRaises(ValueError):
+            EmailNotificationHandler.create_digest([self.email_notifications[0], other_recipient_notification])
+
+    def test_build_email_digests_sends_a_single_notification_as_is(self):
+        EmailNotification.objects.exclude(pk=self.email_notifications[0].pk).delete()
+        EmailNotification.objects.update(created_at=now() - timedelta(minutes=61))
+        call_command("build_email_digests")
+        self.assertEqual(list(EmailNotification.objects.pending()), [self.email_notifications[0]])
+
+
+@override_settings(MAIL_SENDER_CLASSES=['osis_common.messaging.mail_sender_classes.MessageHistorySender'])
+class ConcurrentSendEmailNotificationsTest(TransactionTestCase):
+    def test_send_email_notifications_with_several_threads(self):
+        person = PersonFactory()
+        email_message = EmailNotificationHandler.build(
+            EmailNotificationType(
+                recipient=person,
+                subject="Email notification test subject",
+                plain_text_content="Email notification test content as plain text",
+                html_content="<b>Email notification</b> test content as <i>html</i>",
+            )
+        )
+        for _ in range(10):
+            EmailNotificationHandler.create(email_message, person)
+
+        call_command("send_email_notifications", concurrency=3, batch_size=2)
+
+        self.assertFalse(EmailNotification.objects.exclude(state=NotificationStates.SENT_STATE.name).exists())
+        # Each notification has been sent exactly once
+        self.assertEqual(MessageHistory.objects.count(), 10)
+
 
 @override_settings(WEB_NOTIFICATIONS_RETENTION_DAYS=10)
 class CleanWebNotificationsTest(TestCase):
@@ -125,6 +437,41 @@ class CleanWebNotificationsTest(TestCase):
         call_command("clean_web_notifications")
         self.assertEqual(WebNotification.objects.count(), 1)
 
+    @override_settings(OSIS_NOTIFICATION_COUNTERS=True)
+    def test_restored_notifications_are_counted_again(self):
+        NotificationCounter.objects.recount()
+        with tempfile.TemporaryDirectory() as archive_dir:
+            call_command("clean_web_notifications", archive_dir=archive_dir, stdout=StringIO())
+            self.assertEqual(NotificationCounter.objects.filter(total=0).count(), 1)
+            archives = [os.path.join(archive_dir, name) for name in os.listdir(archive_dir)]
+            call_command("restore_notifications", *archives, stdout=StringIO())
+        self.assertEqual(WebNotification.objects.count(), 2)
+        self.assertEqual(
+            list(NotificationCounter.objects.values_list("total", "unread")),
+            [(1, 0), (1, 0)],
+        )
+
+    @override_settings(OSIS_NOTIFICATION_COUNTERS=True)
+    def test_notifications_changed_since_selected_are_not_deleted(self):
+        NotificationCounter.objects.recount()
+        atomic = transaction.atomic
+
+        def mark_as_unread_then_atomic(*args, **kwargs):
+            # As another transaction would between the selection and the deletion
+            WebNotification.objects.filter(state=NotificationStates.READ_STATE.name).update(
+                state=NotificationStates.SENT_STATE.name,
+                read_at=None,
+            )
+            return atomic(*args, **kwargs)
+
+        with patch("osis_notification.management.base.transaction.atomic", side_effect=mark_as_unread_then_atomic):
+            call_command("clean_web_notifications", stdout=StringIO())
+        self.assertEqual(WebNotification.objects.count(), 2)
+        self.assertEqual(
+            list(NotificationCounter.objects.values_list("total", "unread")),
+            [(1, 0), (1, 0)],
+        )
+
 
 @override_settings(EMAIL_NOTIFICATIONS_RETENTION_DAYS=10)
 class CleanEmailNotificationsTest(TestCase):
@@ -146,3 +493,204 @@ class CleanEmailNotificationsTest(TestCase):
         self.assertEqual(EmailNotification.objects.count(), 2)
         call_command("clean_email_notifications")
         self.assertEqual(EmailNotification.objects.count(), 1)
+
+    def test_clean_email_notifications_removes_unused_payloads(self):
+        email_notification = EmailNotificationFactory(payload="other payload")
+        email_notification.sent_at = now() - timedelta(days=settings.EMAIL_NOTIFICATIONS_RETENTION_DAYS + 1)
+        email_notification.state = NotificationStates.SENT_STATE.name
+        email_notification.save()
+        self.assertEqual(NotificationPayload.objects.count(), 2)
+        call_command("clean_email_notifications")
+        # The payload shared with the remaining notification is kept
+        self.assertEqual(list(NotificationPayload.objects.values_list('content', flat=True)), ["test payload"])
+
+    def test_payloads_used_again_since_selected_are_not_deleted(self):
+        unused_payload = NotificationPayload.objects.get_or_create_for("unused payload")
+        used_payload = NotificationPayload.objects.get_or_create_for("used payload")
+        # Used by a new notification after being selected as unused
+        EmailNotificationFactory(payload="used payload")
+        self.assertEqual(NotificationPayload.objects.delete_unused([unused_payload.pk, used_payload.pk]), 1)
+        self.assertTrue(NotificationPayload.objects.filter(pk=used_payload.pk).exists())
+        self.assertFalse(NotificationPayload.objects.filter(pk=unused_payload.pk).exists())
+
+    def test_clean_email_notifications_in_batches(self):
+        for _ in range(4):
+            email_notification = EmailNotificationFactory(payload="test payload")
+            email_notification.sent_at = now() - timedelta(days=settings.EMAIL_NOTIFICATIONS_RETENTION_DAYS + 1)
+            email_notification.state = NotificationStates.SENT_STATE.name
+            email_notification.save()
+        self.assertEqual(EmailNotification.objects.count(), 6)
+        call_command("clean_email_notifications", batch_size=2)
+        self.assertEqual(EmailNotification.objects.count(), 1)
+
+    def test_clean_email_notifications_stops_after_time_budget(self):
+        call_command("clean_email_notifications", time_budget=0)
+        self.assertEqual(EmailNotification.objects.count(), 2)
+
+    def test_clean_email_notifications_archives_then_restores(self):
+        old_notification = EmailNotification.objects.get(sent_at__lte=now() - timedelta(days=10))
+        with tempfile.TemporaryDirectory() as archive_dir:
+            call_command("clean_email_notifications", archive_dir=archive_dir, stdout=StringIO())
+            self.assertEqual(EmailNotification.objects.count(), 1)
+            archives = [os.path.join(archive_dir, name) for name in os.listdir(archive_dir)]
+            self.assertEqual(len(archives), 1)
+
+            call_command("restore_notifications", *archives, stdout=StringIO())
+            self.assertEqual(EmailNotification.objects.count(), 2)
+            restored_notification = EmailNotification.objects.get(uuid=old_notification.uuid)
+            self.assertEqual(restored_notification.payload, "test payload")
+            self.assertEqual(restored_notification.created_at, old_notification.created_at)
+            self.assertEqual(restored_notification.sent_at, old_notification.sent_at)
+
+            # Restoring the archive again does not duplicate the notifications
+            call_command("restore_notifications", *archives, stdout=StringIO())
+            self.assertEqual(EmailNotification.objects.count(), 2)
+
+    def test_restore_archives_written_before_fields_were_added(self):
+        notification = {
+            "uuid": str(uuid.uuid4()),
+            "type": "EMAIL_TYPE",
+            "person_id": None,
+            "state": NotificationStates.SENT_STATE.name,
+            "created_at": "2026-01-01T10:00:00Z",
+            "sent_at": "2026-01-01T10:05:00Z",
+            "read_at": None,
+            "payload": "old payload",
+        }
+        with tempfile.TemporaryDirectory() as archive_dir:
+            path = os.path.join(archive_dir, "notifications.jsonl.gz")
+            with archive.open_archive(path, "wt") as archive_file:
+                # Archived twice, e.g. when its partition could not be dropped
+                archive_file.write(json.dumps(notification) + "\n" + json.dumps(notification) + "\n")
+            out = StringIO()
+            call_command("restore_notifications", path, stdout=out)
+        self.assertIn("1 notifications restored, 1 skipped", out.getvalue())
+        restored_notification = EmailNotification.objects.get(uuid=notification["uuid"])
+        self.assertEqual(restored_notification.payload, "old payload")
+        self.assertEqual(restored_notification.priority, NotificationPriorities.NORMAL)
+        self.assertEqual(restored_notification.attempts, 0)
+        self.assertFalse(restored_notification.digest)
+        self.assertIsNone(restored_notification.grouped_in)
+        self.assertEqual(restored_notification.created_at, datetime(2026, 1, 1, 10, tzinfo=timezone.utc))
+
+    def test_restore_redated_notifications_are_kept_by_the_next_cleaning(self):
+        with tempfile.TemporaryDirectory() as archive_dir:
+            call_command("clean_email_notifications", archive_dir=archive_dir, stdout=StringIO())
+            archives = [os.path.join(archive_dir, name) for name in os.listdir(archive_dir)]
+            call_command("restore_notifications", *archives, redate=True, stdout=StringIO())
+        call_command("clean_email_notifications", stdout=StringIO())
+        self.assertEqual(EmailNotification.objects.count(), 2)
+
+    def test_clean_email_notifications_syncs_the_archive_before_deleting(self):
+        def assert_not_deleted(fileno):
+            self.assertEqual(EmailNotification.objects.count(), 2)
+
+        with tempfile.TemporaryDirectory() as archive_dir, patch("os.fsync", side_effect=assert_not_deleted) as fsync:
+            call_command("clean_email_notifications", archive_dir=archive_dir, stdout=StringIO())
+        fsync.assert_called_once()
+        self.assertEqual(EmailNotification.objects.count(), 1)
+
+    def test_clean_email_notifications_dry_run(self):
+        out = StringIO()
+        call_command("clean_email_notifications", dry_run=True, stdout=out)
+        self.assertEqual(EmailNotification.objects.count(), 2)
+        self.assertIn("1 notifications would be deleted", out.getvalue())
+
+
+class CreateNotificationPartitionsTest(TestCase):
+    def test_month_ranges(self):
+        start = datetime(2026, 11, 15, tzinfo=timezone.utc)
+        self.assertEqual(
+            list(partitioning.month_ranges(start, start + timedelta(days=60))),
+            [
+                (datetime(2026, 11, 1, tzinfo=timezone.utc), datetime(2026, 12, 1, tzinfo=timezone.utc)),
+                (datetime(2026, 12, 1, tzinfo=timezone.utc), datetime(2027, 1, 1, tzinfo=timezone.utc)),
+                (datetime(2027, 1, 1, tzinfo=timezone.utc), datetime(2027, 2, 1, tzinfo=timezone.utc)),
+            ],
+        )
+        self.assertEqual(
+            partitioning.partition_name(datetime(2027, 1, 1, tzinfo=timezone.utc)),
+            "osis_notification_notification_p202701",
+        )
+
+    def test_create_partitions_requires_a_partitioned_table(self):
+        with self.assertRaises(CommandError):
+            call_command("create_notification_partitions")
+
+    @patch("osis_notification.tasks.notification_partition_creator.call_command")
+    def test_partition_creator_task_does_nothing_without_a_partitioned_table(self, call_command_mock):
+        from osis_notification.tasks import notification_partition_creator
+
+        notification_partition_creator.run()
+        call_command_mock.assert_not_called()
+
+    @override_settings(OSIS_NOTIFICATION_PARTITIONING=True)
+    def test_clean_notifications_without_partitions(self):
+        web_notification = WebNotificationFactory()
+        web_notification.read_at = now() - timedelta(days=settings.WEB_NOTIFICATIONS_RETENTION_DAYS + 1)
+        web_notification.state = NotificationStates.READ_STATE.name
+        web_notification.save()
+        call_command("clean_web_notifications")
+        self.assertFalse(WebNotification.objects.exists())
+
+
+@skipUnless(connection.vendor == "postgresql", "Partitioning requires PostgreSQL")
+class PartitionedNotificationsTest(TestCase):
+    def setUp(self):
+        self.old_notification = EmailNotificationFactory()
+        old_date = now() - timedelta(days=settings.EMAIL_NOTIFICATIONS_RETENTION_DAYS + 400)
+        Notification.objects.filter(pk=self.old_notification.pk).update(
+            created_at=old_date,
+            sent_at=old_date,
+            state=NotificationStates.SENT_STATE.name,
+        )
+        self.old_notification.refresh_from_db()
+        self.notification = WebNotificationFactory()
+
+    def partition_of(self, notification):
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"SELECT tableoid::regclass::text FROM {partitioning.TABLE} WHERE uuid = %s",
+                [notification.uuid],
+            )
+            return cursor.fetchone()[0]
+
+    def test_convert_keeps_the_notifications(self):
+        call_command("create_notification_partitions", convert=True, months_ahead=1, stdout=StringIO())
+        self.assertTrue(partitioning.is_partitioned())
+        self.assertEqual(Notification.objects.count(), 2)
+        self.assertEqual(
+            self.partition_of(self.old_notification),
+            partitioning.partition_name(self.old_notification.created_at),
+        )
+        self.assertEqual(self.partition_of(self.notification), partitioning.partition_name(now()))
+        # The identifiers go on from the last one
+        self.assertGreater(WebNotificationFactory().pk, self.notification.pk)
+
+    def test_create_partitions_moves_the_notifications_of_the_default_partition(self):
+        partitioning.partition_table(months_ahead=1)
+        future_date = now() + timedelta(days=31 * 6)
+        future_notification = WebNotificationFactory()
+        Notification.objects.filter(pk=future_notification.pk).update(created_at=future_date)
+        self.assertEqual(self.partition_of(future_notification), partitioning.DEFAULT_PARTITION)
+
+        self.assertEqual(
+            partitioning.create_partitions(future_date, future_date),
+            [partitioning.partition_name(future_date)],
+        )
+        self.assertEqual(self.partition_of(future_notification), partitioning.partition_name(future_date))
+        self.assertEqual(Notification.objects.count(), 3)
+
+    @override_settings(OSIS_NOTIFICATION_PARTITIONING=True)
+    def test_clean_notifications_drops_the_expired_partitions(self):
+        partitioning.partition_table(months_ahead=1)
+        old_partition = partitioning.partition_name(self.old_notification.created_at)
+        call_command("clean_email_notifications", stdout=StringIO())
+        self.assertNotIn(old_partition, [name for name, _, _ in partitioning.get_partitions()])
+        self.assertEqual(list(Notification.objects.values_list("uuid", flat=True)), [self.notification.uuid])
+
+    def test_partitions_with_notifications_to_keep_are_not_dropped(self):
+        Notification.objects.filter(pk=self.old_notification.pk).update(state=NotificationStates.PENDING_STATE.name)
+        partitioning.partition_table(months_ahead=1)
+        self.assertEqual(partitioning.drop_expired_partitions(), [])
+        self.assertEqual(Notification.objects.count(), 2)
@@ -24,22 +24,32 @@
 #
 # ##############################################################################
 
+import json
+import zlib
+from datetime import timedelta
 from email.message import EmailMessage
 from unittest.mock import ANY, patch
 
 from django.conf import settings
-from django.db import IntegrityError
+from django.core import mail
+from django.db import IntegrityError, connection
 from django.test import TestCase, override_settings
+from django.utils.timezone import now
 
 from base.tests.factories.person import PersonFactory
 from osis_common.messaging.mail_sender_classes import MailSenderInterface
 from osis_common.models import message_history
-from osis_notification.contrib.handlers import EmailNotificationHandler, WebNotificationHandler
+from osis_notification.contrib.handlers import (
+    EmailNotificationHandler,
+    WebNotificationHandler,
+    get_mail_sender_classes,
+)
+from osis_notification.contrib.mail_backends import persistent_connection
 from osis_notification.contrib.notification import (
     EmailNotification as EmailNotificationType,
     WebNotification as WebNotificationType,
 )
-from osis_notification.models import EmailNotification, WebNotification
+from osis_notification.models import EmailNotification, NotificationCounter, NotificationPayload, WebNotification
 from osis_notification.models.enums import NotificationStates
 from osis_notification.tests.factories import WebNotificationFactory
 
@@ -76,6 +86,94 @@ class HandlersTest(TestCase):
         self.assertEqual(web_notification.person, self.web_notification_data["recipient"])
         self.assertEqual(web_notification.payload, self.web_notification_data["content"])
 
+    def test_web_notification_handler_creates_delivered_notification(self):
+        web_notification = WebNotificationHandler.create(self.web_notification, deliver_immediately=True)
+        self.assertEqual(web_notification.state, NotificationStates.SENT_STATE.name)
+        self.assertIsNotNone(web_notification.sent_at)
+        self.assertFalse(WebNotification.objects.pending().exists())
+        self.assertEqual(list(WebNotification.objects.sent()), [web_notification])
+
+    def test_web_notification_handler_refuses_to_deliver_a_scheduled_notification(self):
+        web_notifications_count = WebNotification.objects.count()
+        send_after = now() + timedelta(days=1)
+        with self.assertRaises(ValueError):
+            WebNotificationHandler.create(self.web_notification, send_after=send_after, deliver_immediately=True)
+        with self.assertRaises(ValueError):
+            WebNotificationHandler.create_many([self.web_notification], send_after=send_after, deliver_immediately=True)
+        self.assertEqual(WebNotification.objects.count(), web_notifications_count)
+
+    def test_payload_is_stored_compressed(self):
+        web_notification = WebNotificationHandler.create(self.web_notification)
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"SELECT content FROM {NotificationPayload._meta.db_table} WHERE id = %s",
+                [web_notification.stored_payload_id],
+            )
+            stored_payload = bytes(cursor.fetchone()[0])
+        self.assertEqual(zlib.decompress(stored_payload).decode(), self.web_notification_data["content"])
+        web_notification.refresh_from_db()
+        self.assertEqual(web_notification.payload, self.web_notification_data["content"])
+
+    def test_handlers_create_scheduled_notifications(self):
+        send_after = now() + timedelta(days=1)
+        web_notification = WebNotificationHandler.create(self.web_notification, send_after=send_after)
+        email_notification = EmailNotificationHandler.create(
+            EmailNotificationHandler.build(self.email_notification),
+            send_after=send_after,
+        )
+        self.assertEqual(web_notification.send_after, send_after)
+        self.assertEqual(email_notification.send_after, send_after)
+        self.assertFalse(WebNotification.objects.pending().exists())
+        self.assertFalse(EmailNotification.objects.pending().exists())
+
+    def test_web_notification_handler_creates_many_objects(self):
+        persons = PersonFactory.create_batch(3)
+        # Payloads lookup, insert and lookup again, notifications insert
+        with self.assertNumQueries(4):
+            web_notifications = WebNotificationHandler.create_many(
+                [WebNotificationType(recipient=person, content="Same content") for person in persons]
+            )
+        self.assertEqual(WebNotification.objects.count(), 3)
+        self.assertEqual([notification.person for notification in web_notifications], persons)
+        self.assertEqual(NotificationPayload.objects.count(), 1)
+        self.assertEqual(WebNotification.objects.first().payload, "Same content")
+
+    def test_email_notification_handler_creates_many_objects(self):
+        recipient = self.email_notification_data["recipient"]
+        email_messages = [
+            EmailNotificationHandler.build(self.email_notification),
+            EmailNotificationHandler.build(EmailNotificationType(
+                recipient="johndoe@example.org",
+                subject="Email notification test subject",
+                plain_text_content="Email notification test as plain text",
+                html_content="<b>Email notification</b> test content as <i>html</i>",
+            )),
+        ]
+        # Persons lookup, payloads lookup, insert and lookup again, notifications insert
+        with self.assertNumQueries(5):
+            email_notifications = EmailNotificationHandler.create_many(email_messages)
+        self.assertEqual([notification.person for notification in email_notifications], [recipient, None])
+        self.assertEqual(EmailNotification.objects.count(), 2)
+
+    def test_email_notification_handler_requires_a_person_per_mail(self):
+        email_message = EmailNotificationHandler.build(self.email_notification)
+        with self.assertRaises(ValueError):
+            EmailNotificationHandler.create_many(
+                [email_message, email_message],
+                [self.email_notification_data["recipient"]],
+            )
+        self.assertFalse(EmailNotification.objects.exists())
+
+    def test_identical_payloads_are_stored_once(self):
+        first_notification = WebNotificationHandler.create(self.web_notification)
+        second_notification = WebNotificationHandler.create(
+            WebNotificationType(recipient=PersonFactory(), content=self.web_notification_data["content"])
+        )
+        self.assertEqual(first_notification.stored_payload_id, second_notification.stored_payload_id)
+        self.assertEqual(NotificationPayload.objects.count(), 1)
+        second_notification = WebNotification.objects.get(pk=second_notification.pk)
+        self.assertEqual(second_notification.payload, self.web_notification_data["content"])
+
     @override_settings(MAIL_SENDER_CLASSES=['osis_notification.tests.test_handlers.DummyMailSender'])
     @patch('osis_notification.tests.test_handlers.DummyMailSender')
     def test_email_notification_handler_creates_object_with_correct_values(self, sender_class):
@@ -204,3 +302,155 @@ class HandlersTest(TestCase):
             sent_web_notification.state,
             NotificationStates.READ_STATE.name,
         )
+
+    @override_settings(MAIL_SENDER_CLASSES=['osis_notification.tests.test_handlers.DummyMailSender'])
+    def test_mail_sender_classes_are_imported_once(self):
+        with patch('osis_notification.contrib.handlers.import_string') as import_string:
+            get_mail_sender_classes()
+            get_mail_sender_classes()
+        import_string.assert_called_once_with('osis_notification.tests.test_handlers.DummyMailSender')
+
+    def test_email_notification_handler_process_many_collects_exceptions(self):
+        email_message = EmailNotificationHandler.build(self.email_notification)
+        email_notification = EmailNotificationHandler.create(email_message)
+        failing_notification = EmailNotificationHandler.create(email_message)
+        with patch.object(EmailNotificationHandler, 'process', side_effect=[None, ValueError('Invalid value')]):
+            exceptions = EmailNotificationHandler.process_many([email_notification, failing_notification])
+        self.assertEqual(list(exceptions), [failing_notification.uuid])
+
+    def test_email_notification_handler_stores_the_parsed_message(self):
+        email_message = EmailNotificationHandler.build(self.email_notification)
+        email_message["Cc"] = "cc@example.org"
+        email_notification = EmailNotificationHandler.create(email_message)
+        self.assertEqual(
+            json.loads(email_notification.payload),
+            {
+                "subject": self.email_notification_data["subject"],
+                "to": self.email_notification_data["recipient"].email,
+                "cc": "cc@example.org",
+                "from": settings.DEFAULT_FROM_EMAIL,
+                "plain_text_content": self.email_notification_data["plain_text_content"],
+                "html_content": self.email_notification_data["html_content"],
+            },
+        )
+
+
+@override_settings(EMAIL_BACKEND='osis_notification.contrib.mail_backends.PersistentSMTPEmailBackend')
+class PersistentSMTPEmailBackendTest(TestCase):
+    def send_mails(self, count):
+        for i in range(count):
+            mail.EmailMessage(f"Subject {i}", "Body", "from@example.org", ["to@example.org"]).send()
+
+    @patch('django.core.mail.backends.smtp.smtplib.SMTP')
+    def test_connection_is_reused_inside_persistent_connection_block(self, smtp):
+        smtp.return_value.noop.return_value = (250, b'OK')
+        with persistent_connection():
+            self.send_mails(3)
+            smtp.return_value.quit.assert_not_called()
+        self.assertEqual(smtp.call_count, 1)
+        self.assertEqual(smtp.return_value.sendmail.call_count, 3)
+        smtp.return_value.quit.assert_called_once()
+
+    @patch('django.core.mail.backends.smtp.smtplib.SMTP')
+    def test_a_new_connection_is_opened_for_each_mail_outside_persistent_connection_block(self, smtp):
+        self.send_mails(3)
+        self.assertEqual(smtp.call_count, 3)
+
+    @patch('django.core.mail.backends.smtp.smtplib.SMTP')
+    def test_dead_connection_is_replaced(self, smtp):
+        smtp.return_value.noop.return_value = (421, b'Timeout')
+        with persistent_connection():
+            self.send_mails(2)
+        self.assertEqual(smtp.call_count, 2)
+
+
+@override_settings(OSIS_NOTIFICATION_COUNTERS=True)
+class NotificationCounterTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.person = PersonFactory()
+
+    def assertCounts(self, total, unread):
+        counter = NotificationCounter.objects.get(person=self.person)
+        self.assertEqual((counter.total, counter.unread), (total, unread))
+
+    def test_handlers_update_the_counters(self):
+        web_notification = WebNotificationFactory(person=self.person)
+        WebNotificationHandler.process(web_notification)
+        self.assertCounts(1, 1)
+        WebNotificationHandler.toggle_state(web_notification)
+        self.assertCounts(1, 0)
+        WebNotificationHandler.toggle_state(web_notification)
+        self.assertCounts(1, 1)
+        WebNotificationHandler.mark_as_read(web_notification)
+        self.assertCounts(1, 0)
+
+        WebNotificationHandler.create(
+            WebNotificationType(recipient=self.person, content="Foo"),
+            deliver_immediately=True,
+        )
+        WebNotificationFactory(person=self.person)
+        WebNotificationHandler.process_pending(batch_size=10)
+        self.assertCounts(3, 2)
+        WebNotificationHandler.mark_all_as_read(list(WebNotification.objects.filter(person=self.person)))
+        self.assertCounts(3, 0)
+        WebNotificationHandler.toggle_state(web_notification)
+        self.assertCounts(3, 1)
+        self.assertEqual(WebNotificationHandler.mark_all_as_read_of_person(self.person.pk), [web_notification.uuid])
+        self.assertCounts(3, 0)
+        WebNotificationHandler.change_state_of_person(
+            self.person.pk,
+            NotificationStates.SENT_STATE.name,
+            [web_notification.uuid],
+        )
+        self.assertCounts(3, 1)
+
+    def test_mark_as_read_a_notification_in_any_state(self):
+        web_notification = WebNotificationFactory(person=self.person)
+        WebNotificationHandler.mark_as_read(web_notification)
+        self.assertEqual(web_notification.state, NotificationStates.READ_STATE.name)
+        self.assertCounts(1, 0)
+        WebNotificationHandler.mark_as_read(web_notification)
+        self.assertEqual(web_notification.state, NotificationStates.READ_STATE.name)
+        self.assertCounts(1, 0)
+
+        # Marked as unread in the meantime
+        stale_copy = WebNotification.objects.get(pk=web_notification.pk)
+        WebNotificationHandler.mark_as_unread(web_notification)
+        self.assertCounts(1, 1)
+        WebNotificationHandler.mark_as_read(stale_copy)
+        self.assertEqual(stale_copy.state, NotificationStates.READ_STATE.name)
+        self.assertCounts(1, 0)
+
+    def test_mark_as_unread_only_changes_read_notifications(self):
+        web_notification = WebNotificationFactory(person=self.person)
+        WebNotificationHandler.mark_as_unread(web_notification)
+        self.assertEqual(web_notification.state, NotificationStates.PENDING_STATE.name)
+        self.assertFalse(NotificationCounter.objects.filter(person=self.person).exists())
+
+    def test_stale_notifications_are_only_counted_once(self):
+        web_notification = WebNotificationFactory(person=self.person)
+        stale_copy = WebNotification.objects.get(pk=web_notification.pk)
+        WebNotificationHandler.process(web_notification)
+        WebNotificationHandler.process(stale_copy)
+        self.assertCounts(1, 1)
+        self.assertEqual(stale_copy.state, NotificationStates.SENT_STATE.name)
+
+        stale_copy = WebNotification.objects.get(pk=web_notification.pk)
+        WebNotificationHandler.toggle_state(web_notification)
+        WebNotificationHandler.toggle_state(stale_copy)
+        self.assertCounts(1, 0)
+        self.assertEqual(stale_copy.state, NotificationStates.READ_STATE.name)
+
+    def test_recount_fixes_drifted_counters(self):
+        web_notification = WebNotificationFactory(person=self.person)
+        WebNotificationHandler.process(web_notification)
+        NotificationCounter.objects.filter(person=self.person).update(total=5, unread=0)
+        other_person_notification = WebNotificationFactory()
+        other_person_notification.state = NotificationStates.SENT_STATE.name
+        other_person_notification.save()
+
+        self.assertEqual(NotificationCounter.objects.recount(), 2)
+        self.assertCounts(1, 1)
+        self.assertEqual(NotificationCounter.objects.get_counts(other_person_notification.person_id)[:2], (1, 1))
+        self.assertEqual(NotificationCounter.objects.recount(), 0)
@@ -0,0 +1,178 @@
+# ##############################################################################
+#
+#  OSIS stands for Open Student Information System. It's an application
+#  designed to manage the core business of higher education institutions,
+#  such as universities, faculties, institutes and professional schools.
+#  The core business involves the administration of students, teachers,
+#  courses, programs and so on.
+#
+#  Copyright (C) 2015-2026 Université catholique de Louvain (http://www.uclouvain.be)
+#
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  A copy of this license - GNU General Public License - is available
+#  at the root of the source code of this program.  If not,
+#  see http://www.gnu.org/licenses/.
+#
+import asyncio
+from unittest import TestCase as SimpleTestCase
+from unittest.mock import patch
+
+from django.conf import settings
+from django.test import TestCase, override_settings
+
+from base.tests.factories.person import PersonFactory
+from osis_notification.api.stream import format_event, notification_stream
+from osis_notification.contrib.handlers import WebNotificationHandler
+from osis_notification.contrib.notification import WebNotification as WebNotificationType
+from osis_notification.contrib.push import COUNTS_EVENT, NOTIFICATION_EVENT, InProcessBroker, get_broker
+from osis_notification.models.enums import NotificationStates
+from osis_notification.tests.factories import WebNotificationFactory
+
+
+class InProcessBrokerTest(SimpleTestCase):
+    def test_events_are_only_received_by_the_subscribers_of_the_person(self):
+        broker = InProcessBroker()
+
+        async def scenario():
+            async with broker.subscribe(1) as queue, broker.subscribe(2) as other_queue:
+                broker.publish(1, COUNTS_EVENT)
+                self.assertEqual(await asyncio.wait_for(queue.get(), 1), (COUNTS_EVENT, None))
+                self.assertTrue(other_queue.empty())
+            # Unsubscribed
+            broker.publish(1, COUNTS_EVENT)
+            self.assertEqual(broker._subscribers, {})
+
+        asyncio.run(scenario())
+
+    def test_stream_requires_authentication(self):
+        messages = []
+
+        async def receive():
+            return {"type": "http.request"}
+
+        async def send(message):
+            messages.append(message)
+
+        with override_settings(OSIS_NOTIFICATION_PUSH_BROKER="osis_notification.contrib.push.InProcessBroker"):
+            asyncio.run(notification_stream({"type": "http", "headers": []}, receive, send))
+        self.assertEqual(messages[0]["status"], 403)
+
+
+@override_settings(OSIS_NOTIFICATION_PUSH_BROKER="osis_notification.contrib.push.InProcessBroker")
+class PushTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.person = PersonFactory()
+
+    def published_events(self, callbacks):
+        events = []
+        with patch.object(
+            get_broker(),
+            "publish",
+            side_effect=lambda person_id, event, data=None: events.append((person_id, event, data)),
+        ):
+            for callback in callbacks:
+                callback()
+        return events
+
+    def test_sent_notifications_are_pushed_on_commit(self):
+        with self.captureOnCommitCallbacks() as callbacks:
+            notification = WebNotificationHandler.create(
+                WebNotificationType(recipient=self.person, content="Pushed"),
+                deliver_immediately=True,
+            )
+        [(person_id, event, data)] = self.published_events(callbacks)
+        self.assertEqual((person_id, event), (self.person.pk, NOTIFICATION_EVENT))
+        self.assertEqual(data["uuid"], str(notification.uuid))
+
+    def test_pending_notifications_push_the_counts_of_their_persons(self):
+        WebNotificationFactory.create_batch(2, person=self.person)
+        with self.captureOnCommitCallbacks() as callbacks:
+            self.assertEqual(WebNotificationHandler.process_pending(batch_size=10), 2)
+        self.assertEqual(self.published_events(callbacks), [(self.person.pk, COUNTS_EVENT, None)])
+
+    def test_broker_errors_are_logged(self):
+        WebNotificationFactory(person=self.person)
+        with self.captureOnCommitCallbacks() as callbacks:
+            WebNotificationHandler.process_pending(batch_size=10)
+        with patch.object(get_broker(), "publish", side_effect=ConnectionError), self.assertLogs(
+            "osis_notification.contrib.push", "ERROR"
+        ):
+            for callback in callbacks:
+                callback()
+
+    def test_nothing_is_pushed_without_broker(self):
+        with override_settings(OSIS_NOTIFICATION_PUSH_BROKER=None):
+            with self.captureOnCommitCallbacks() as callbacks:
+                WebNotificationHandler.process(WebNotificationFactory(person=self.person))
+        self.assertEqual(callbacks, [])
+
+
+@override_settings(OSIS_NOTIFICATION_PUSH_BROKER="osis_notification.contrib.push.InProcessBroker")
+class NotificationStreamTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.person = PersonFactory()
+        notification = WebNotificationFactory(person=cls.person)
+        notification.state = NotificationStates.SENT_STATE.name
+        notification.save()
+
+    def setUp(self):
+        self.client.force_login(self.person.user)
+        session_cookie = self.client.cookies[settings.SESSION_COOKIE_NAME]
+        self.scope = {
+            "type": "http",
+            "headers": [(b"cookie", f"{settings.SESSION_COOKIE_NAME}={session_cookie.value}".encode())],
+        }
+        # As the test client does, not to close the connection of the test transaction
+        patcher = patch("osis_notification.api.stream.close_old_connections")
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        # Not to share the subscribers of the broker with the other tests
+        self.addCleanup(get_broker.cache_clear)
+
+    async def test_stream_sends_the_counts_then_the_published_events(self):
+        messages = asyncio.Queue()
+        disconnected = asyncio.Event()
+
+        async def receive():
+            await disconnected.wait()
+            return {"type": "http.disconnect"}
+
+        async def send(message):
+            messages.put_nowait(message)
+
+        async def next_message():
+            return await asyncio.wait_for(messages.get(), 5)
+
+        stream = asyncio.ensure_future(notification_stream(self.scope, receive, send))
+        self.assertEqual((await next_message())["status"], 200)
+        self.assertEqual(
+            (await next_message())["body"],
+            b"retry: 5000\n\n" + format_event(COUNTS_EVENT, {"count": 1, "unread_count": 1}),
+        )
+
+        # Received together, the changes of the counts are coalesced
+        broker = get_broker()
+        broker.publish(self.person.pk, NOTIFICATION_EVENT, {"uuid": "pushed"})
+        broker.publish(self.person.pk, COUNTS_EVENT)
+        broker.publish(self.person.pk, COUNTS_EVENT)
+        self.assertEqual(
+            (await next_message())["body"],
+            format_event(NOTIFICATION_EVENT, {"uuid": "pushed"})
+            + format_event(COUNTS_EVENT, {"count": 1, "unread_count": 1}),
+        )
+
+        disconnected.set()
+        await asyncio.wait_for(stream, 5)
+        self.assertTrue(messages.empty())
+        self.assertEqual(broker._subscribers, {})
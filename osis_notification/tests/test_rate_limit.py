@@ -0,0 +1,209 @@
+# ##############################################################################
+#
+#  OSIS stands for Open Student Information System. It's an application
+#  designed to manage the core business of higher education institutions,
+#  such as universities, faculties, institutes and professional schools.
+#  The core business involves the administration of students, teachers,
+#  courses, programs and so on.
+#
+#  Copyright (C) 2015-2026 Université catholique de Louvain (http://www.uclouvain.be)
+#
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  A copy of this license - GNU General Public License - is available
+#  at the root of the source code of this program.  If not,
+#  see http://www.gnu.org/licenses/.
+#
+# ##############################################################################
+from unittest import TestCase as SimpleTestCase
+from unittest.mock import patch
+
+from django.core import mail
+from django.core.cache.backends.locmem import LocMemCache
+from django.test import TestCase, override_settings
+
+from base.tests.factories.person import PersonFactory
+from osis_common.messaging.mail_sender_classes import MailSenderInterface
+from osis_notification.contrib.handlers import EmailNotificationHandler
+from osis_notification.contrib.notification import EmailNotification as EmailNotificationType
+from osis_notification.contrib.rate_limit import CacheBucket, RateLimiter, TokenBucket
+
+
+class FakeClock:
+    def __init__(self):
+        self.time = 0.0
+        self.sleeps = []
+
+    def __call__(self):
+        return self.time
+
+    def sleep(self, duration):
+        self.sleeps.append(duration)
+        self.time += duration
+
+
+class TokenBucketTest(SimpleTestCase):
+    def setUp(self):
+        self.clock = FakeClock()
+
+    def test_burst_up_to_capacity_then_wait(self):
+        bucket = TokenBucket(rate=2, capacity=2, clock=self.clock, sleep=self.clock.sleep)
+        bucket.acquire()
+        bucket.acquire()
+        self.assertEqual(self.clock.sleeps, [])
+        bucket.acquire()
+        self.assertEqual(self.clock.sleeps, [0.5])
+
+    def test_sustained_rate(self):
+        bucket = TokenBucket(rate=10, capacity=1, clock=self.clock, sleep=self.clock.sleep)
+        for _ in range(101):
+            bucket.acquire()
+        self.assertAlmostEqual(self.clock.time, 10)
+
+    def test_tokens_are_refilled_over_time(self):
+        bucket = TokenBucket(rate=1, capacity=1, clock=self.clock, sleep=self.clock.sleep)
+        bucket.acquire()
+        self.clock.time += 1
+        bucket.acquire()
+        self.assertEqual(self.clock.sleeps, [])
+
+
+class CacheBucketTest(SimpleTestCase):
+    def setUp(self):
+        self.clock = FakeClock()
+        self.cache = LocMemCache("rate_limit", {})
+
+    def bucket(self, rate):
+        return CacheBucket(self.cache, "bucket", rate, clock=self.clock, sleep=self.clock.sleep)
+
+    def test_acquisitions_are_shared_by_the_buckets_of_the_cache(self):
+        first_bucket, second_bucket = self.bucket(rate=2), self.bucket(rate=2)
+        first_bucket.acquire()
+        second_bucket.acquire()
+        self.assertEqual(self.clock.sleeps, [])
+        first_bucket.acquire()
+        self.assertEqual(self.clock.sleeps, [1])
+
+    def test_rate_below_one_per_second(self):
+        bucket = self.bucket(rate=0.5)
+        for _ in range(3):
+            bucket.acquire()
+        self.assertEqual(self.clock.sleeps, [2, 2])
+
+
+class RateLimiterTest(SimpleTestCase):
+    def test_only_configured_domains_are_limited(self):
+        limiter = RateLimiter({}, {"Example.org": 1})
+        with patch.object(TokenBucket, "acquire") as acquire:
+            limiter.wait_for_recipients("John Doe <john.doe@example.ORG>")
+            limiter.wait_for_recipients("jane.doe@example.com", None)
+        acquire.assert_called_once_with()
+
+    def test_each_recipient_domain_is_limited_once(self):
+        limiter = RateLimiter({}, {"example.org": 1, "example.com": 1, "example.net": 1})
+        with patch.object(TokenBucket, "acquire") as acquire:
+            limiter.wait_for_recipients(
+                "john.doe@example.org",
+                '"Doe, Jane" <jane.doe@example.com>, jim.doe@example.org, jack.doe@example.be',
+            )
+        self.assertEqual(acquire.call_count, 2)
+
+    def test_rate_of_zero_disables_the_limit(self):
+        limiter = RateLimiter({"Sender": 0}, {"example.org": 0})
+        self.assertEqual((limiter.sender_buckets, limiter.domain_buckets), ({}, {}))
+        limiter.wait_for_sender("Sender")
+        limiter.wait_for_recipients("john.doe@example.org")
+
+    def test_buckets_are_shared_through_the_cache(self):
+        cache = LocMemCache("rate_limit", {})
+        limiter = RateLimiter({"Sender": 10}, {"example.org": 1}, cache=cache)
+        self.assertIsInstance(limiter.sender_buckets["Sender"], CacheBucket)
+        self.assertIsInstance(limiter.domain_buckets["example.org"], CacheBucket)
+
+
+class RecordingMailSender(MailSenderInterface):
+    sent = []
+
+    def send_mail(self):
+        self.sent.append(self)
+
+
+@override_settings(
+    MAIL_SENDER_CLASSES=['osis_notification.tests.test_rate_limit.RecordingMailSender'],
+    EMAIL_NOTIFICATIONS_RATE_LIMITS={'osis_notification.tests.test_rate_limit.RecordingMailSender': 5},
+)
+class ProcessRateLimitTest(TestCase):
+    def test_sending_is_throttled_per_mail_sender_class(self):
+        recipient = PersonFactory()
+        email_message = EmailNotificationHandler.build(
+            EmailNotificationType(
+                recipient=recipient,
+                subject="Subject",
+                plain_text_content="Content",
+                html_content="<p>Content</p>",
+            )
+        )
+        notifications = EmailNotificationHandler.create_many([email_message] * 7, [recipient] * 7)
+
+        RecordingMailSender.sent = []
+        with patch('osis_notification.contrib.rate_limit.time.sleep') as sleep:
+            EmailNotificationHandler.process_many(notifications)
+        self.assertEqual(len(RecordingMailSender.sent), 7)
+        # A burst of 5 messages is allowed, then the sending is throttled
+        self.assertEqual(sleep.call_count, 2)
+
+
+class SMTPMailSender(MailSenderInterface):
+    """Send the messages through the Django email backend."""
+
+    def __init__(self, receivers, subject, message, from_email, cc=None, **kwargs):
+        self.message = mail.EmailMessage(
+            subject,
+            message,
+            from_email,
+            [receiver["receiver_email"] for receiver in receivers],
+            cc=[person.email for person in cc or []],
+        )
+
+    def send_mail(self):
+        self.message.send()
+
+
+@override_settings(
+    EMAIL_BACKEND='osis_notification.contrib.mail_backends.PersistentSMTPEmailBackend',
+    MAIL_SENDER_CLASSES=['osis_notification.tests.test_rate_limit.SMTPMailSender'],
+    EMAIL_NOTIFICATIONS_DOMAIN_RATE_LIMITS={'example.org': 1, 'example.com': 1},
+)
+class ProcessDomainRateLimitTest(TestCase):
+    @patch('django.core.mail.backends.smtp.smtplib.SMTP')
+    def test_sending_is_throttled_for_each_recipient_domain(self, smtp):
+        smtp.return_value.noop.return_value = (250, b'OK')
+        notifications = []
+        for _ in range(3):
+            email_message = EmailNotificationHandler.build(
+                EmailNotificationType(
+                    recipient="john.doe@example.org",
+                    subject="Subject",
+                    plain_text_content="Content",
+                    html_content="<p>Content</p>",
+                )
+            )
+            email_message["Cc"] = "jane.doe@example.com"
+            notifications.append(EmailNotificationHandler.create(email_message, None))
+
+        with patch('osis_notification.contrib.rate_limit.time.sleep') as sleep:
+            self.assertEqual(EmailNotificationHandler.process_many(notifications), {})
+        self.assertEqual(
+            [call.args[1] for call in smtp.return_value.sendmail.call_args_list],
+            [["john.doe@example.org", "jane.doe@example.com"]] * 3,
+        )
+        # Each message after the first one waits for both domains
+        self.assertEqual(sleep.call_count, 4)
@@ -24,6 +24,9 @@
 #
 # ##############################################################################
 
+from io import StringIO
+
+from django.core.management import call_command
 from django.test import override_settings
 from django.shortcuts import resolve_url
 from django.utils.timezone import now
@@ -31,7 +34,9 @@ from rest_framework import status
 from rest_framework.test import APITestCase
 
 from base.tests.factories.person import PersonFactory
-from osis_notification.models import WebNotification
+from osis_notification.contrib.cache import CacheStats, get_cache, stats
+from osis_notification.contrib.handlers import WebNotificationHandler
+from osis_notification.models import NotificationCounter, WebNotification
 from osis_notification.models.enums import NotificationStates
 from osis_notification.tests.factories import WebNotificationFactory
 
@@ -84,6 +89,142 @@ class SentNotificationListViewTest(NotificationTestCase):
         # the result should be the same as the notification is for another person
         self.assertEqual(response.json()["count"], 2)
 
+    def test_unchanged_notifications_are_not_sent_again(self):
+        self.web_notification.state = NotificationStates.SENT_STATE.name
+        self.web_notification.save()
+        response = self.client.get(self.url)
+        etag = response["ETag"]
+        # Only the counts are queried
+        with self.assertNumQueries(1):
+            response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(response["ETag"], etag)
+
+        # Another page has another version
+        response = self.client.get(self.url, {"limit": 5}, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        self.web_notification.state = NotificationStates.READ_STATE.name
+        self.web_notification.read_at = now()
+        self.web_notification.save()
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotEqual(response["ETag"], etag)
+
+    def test_paginate_notifications_by_cursor(self):
+        notifications = [self.web_notification] + WebNotificationFactory.create_batch(2, person=self.person)
+        for notification in notifications:
+            notification.state = NotificationStates.SENT_STATE.name
+            notification.save()
+        with self.assertNumQueries(2):
+            response = self.client.get(self.url, {"cursor": "", "limit": 2})
+        first_page = response.json()
+        self.assertEqual(first_page["count"], 3)
+        self.assertEqual(len(first_page["results"]), 2)
+        self.assertIsNone(first_page["previous"])
+        self.assertIn("cursor=", first_page["next"])
+
+        # A new notification does not shift the next page
+        new_notification = WebNotificationFactory(person=self.person)
+        new_notification.state = NotificationStates.SENT_STATE.name
+        new_notification.save()
+        response = self.client.get(first_page["next"])
+        second_page = response.json()
+        self.assertIsNone(second_page["next"])
+        self.assertEqual(
+            {result["uuid"] for result in first_page["results"] + second_page["results"]},
+            {str(notification.uuid) for notification in notifications},
+        )
+
+    def test_invalid_cursor(self):
+        response = self.client.get(self.url, {"cursor": "invalid"})
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    @override_settings(OSIS_NOTIFICATION_COUNTERS=True)
+    def test_counts_are_read_from_the_counters(self):
+        self.web_notification.state = NotificationStates.SENT_STATE.name
+        self.web_notification.save()
+        NotificationCounter.objects.recount([self.person.pk])
+        with self.assertNumQueries(2):
+            response = self.client.get(self.url)
+        self.assertEqual(response.json()["count"], 1)
+        self.assertEqual(response.json()["unread_count"], 1)
+
+
+@override_settings(
+    ROOT_URLCONF="osis_notification.api.urls_v1",
+    CACHES={
+        "default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"},
+        "notifications": {
+            "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+            "LOCATION": "osis-notification-tests",
+        },
+    },
+    OSIS_NOTIFICATION_CACHE="notifications",
+)
+class CachedSentNotificationListViewTest(NotificationTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.person = PersonFactory()
+        cls.web_notification = WebNotificationFactory(person=cls.person)
+        cls.web_notification.state = NotificationStates.SENT_STATE.name
+        cls.web_notification.save()
+        cls.url = resolve_url("notification-list")
+
+    def setUp(self):
+        self.client.force_authenticate(user=self.person.user)
+        stats.flush(get_cache())
+        get_cache().clear()
+
+    def test_first_page_is_cached_until_the_notifications_change(self):
+        with self.assertNumQueries(2):
+            response = self.client.get(self.url)
+        with self.assertNumQueries(0):
+            cached_response = self.client.get(self.url)
+        self.assertEqual(cached_response.json(), response.json())
+        self.assertEqual(cached_response["ETag"], response["ETag"])
+
+        # The other pages are not cached
+        with self.assertNumQueries(1):
+            self.client.get(self.url, {"offset": 1})
+
+        with self.captureOnCommitCallbacks(execute=True):
+            WebNotificationHandler.mark_as_read(self.web_notification)
+        with self.assertNumQueries(2):
+            response = self.client.get(self.url)
+        self.assertEqual(response.json()["unread_count"], 0)
+        self.assertEqual(response.json()["results"][0]["state"], NotificationStates.READ_STATE.name)
+
+        # Report the lookups of this process without waiting for the next 100 ones
+        stats.flush(get_cache())
+        stdout = StringIO()
+        call_command("notification_cache_stats", "--reset", stdout=stdout)
+        self.assertEqual(stdout.getvalue(), "3 hits, 4 misses, hit rate: 42.9%\n")
+        self.assertEqual(CacheStats.totals(get_cache()), (0, 0))
+
+
+@override_settings(ROOT_URLCONF="osis_notification.api.urls_v1")
+class NotificationCountsViewTest(NotificationTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.person = PersonFactory()
+        cls.web_notification = WebNotificationFactory(person=cls.person)
+        cls.web_notification.state = NotificationStates.SENT_STATE.name
+        cls.web_notification.save()
+        cls.url = resolve_url("notification-counts")
+
+    def setUp(self):
+        self.client.force_authenticate(user=self.person.user)
+
+    def test_retrieve_the_counts(self):
+        with self.assertNumQueries(1):
+            response = self.client.get(self.url)
+        self.assertEqual(response.json(), {"count": 1, "unread_count": 1})
+
+        with self.assertNumQueries(1):
+            response = self.client.get(self.url, HTTP_IF_NONE_MATCH=response["ETag"])
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
 
 @override_settings(ROOT_URLCONF="osis_notification.api.urls_v1")
 class MarkNotificationAsReadViewTest(NotificationTestCase):
@@ -151,10 +292,83 @@ class MarkAllNotificationsAsReadViewTest(NotificationTestCase):
             WebNotification.objects.filter(state=NotificationStates.SENT_STATE.name).count(),
             self.sent_notification_count,
         )
-        with self.assertNumQueries(2):
+        # A single UPDATE statement
+        with self.assertNumQueries(1):
             response = self.client.put(self.url)
         self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.json()["count"], self.sent_notification_count)
+        self.assertEqual(
+            set(response.json()["uuids"]),
+            {str(uuid) for uuid in WebNotification.objects.values_list("uuid", flat=True)},
+        )
         self.assertEqual(
             WebNotification.objects.filter(state=NotificationStates.READ_STATE.name).count(),
             self.sent_notification_count,
         )
+
+        response = self.client.put(self.url)
+        self.assertEqual(response.json(), {"count": 0, "uuids": []})
+
+    def test_return_the_marked_notifications_if_requested(self):
+        response = self.client.put(self.url + "?full=true")
+        self.assertEqual(len(response.json()), self.sent_notification_count)
+        self.assertEqual(
+            {notification["state"] for notification in response.json()},
+            {NotificationStates.READ_STATE.name},
+        )
+
+
+@override_settings(ROOT_URLCONF="osis_notification.api.urls_v1")
+class NotificationStatesViewTest(NotificationTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.person = PersonFactory()
+        cls.notifications = WebNotificationFactory.create_batch(3, person=cls.person)
+        for notification in cls.notifications:
+            notification.state = NotificationStates.SENT_STATE.name
+            notification.save()
+        cls.other_person_notification = WebNotificationFactory()
+        cls.other_person_notification.state = NotificationStates.SENT_STATE.name
+        cls.other_person_notification.save()
+        cls.url = resolve_url("notification-states")
+
+    def setUp(self):
+        self.client.force_authenticate(user=self.person.user)
+
+    def test_change_the_state_of_several_notifications(self):
+        uuids = [str(notification.uuid) for notification in self.notifications[:2]]
+        # A single UPDATE statement
+        with self.assertNumQueries(1):
+            response = self.client.put(
+                self.url,
+                {"uuids": uuids + [str(self.other_person_notification.uuid)], "state": "READ_STATE"},
+                format="json",
+            )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        # The notifications of the other users are left untouched
+        self.assertEqual(response.json()["count"], 2)
+        self.assertEqual(set(response.json()["uuids"]), set(uuids))
+        self.assertEqual(
+            set(WebNotification.objects.filter(state=NotificationStates.READ_STATE.name).values_list("pk", flat=True)),
+            {notification.pk for notification in self.notifications[:2]},
+        )
+
+        # Only the read notifications are marked as unread
+        response = self.client.put(
+            self.url,
+            {"uuids": [str(notification.uuid) for notification in self.notifications], "state": "SENT_STATE"},
+            format="json",
+        )
+        self.assertEqual(response.json()["count"], 2)
+        self.assertFalse(WebNotification.objects.filter(state=NotificationStates.READ_STATE.name).exists())
+        self.assertFalse(WebNotification.objects.filter(read_at__isnull=False).exists())
+
+    def test_invalid_state_change(self):
+        response = self.client.put(
+            self.url,
+            {"uuids": [str(self.notifications[0].uuid)], "state": "PENDING_STATE"},
+            format="json",
+        )
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        response = self.client.put(self.url, {"uuids": [], "state": "READ_STATE"}, format="json")
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
@@ -29,6 +29,8 @@ from osis_notification.api.utils import proxy_view
 from osis_notification.api.views import (
     MarkAllNotificationsAsReadView,
     MarkNotificationAsReadView,
+    NotificationCountsView,
+    NotificationStatesView,
     SentNotificationListView,
 )
 
@@ -42,6 +44,8 @@ def proxy_path(pattern, view, name=None):
 app_name = "osis_notification"
 urlpatterns = [
     proxy_path("", SentNotificationListView),
+    proxy_path("counts", NotificationCountsView),
     proxy_path("mark_all_as_read", MarkAllNotificationsAsReadView),
+    proxy_path("states", NotificationStatesView),
     proxy_path("<uuid:notification_uuid>", MarkNotificationAsReadView),
 ]